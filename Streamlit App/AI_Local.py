@@ -1,26 +1,31 @@
 import streamlit as st
 import streamlit.components.v1 as components
 import pandas as pd
+import numpy as np
 from pathlib import Path
 import tempfile
 import requests
 import base64
+import hashlib
+from io import BytesIO
+from urllib.parse import quote
+from PIL import Image
 import os
 import re
+import time
+import datetime
+import decimal
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager, closing
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
 from dotenv import load_dotenv
-import pypyodbc as odbc
-import google.generativeai as genai
-import joblib
-from catboost import CatBoostClassifier, Pool
 import json  # Added for dashboard generator
-import plotly.express as px  # Added for dashboard generator
+# The heavy libraries (google.generativeai, pypyodbc, joblib/catboost, plotly) are
+# imported where they are used, so a cold start only pays for the tab being opened.
+# Run profile_startup.py to check the startup cost.
 
-# Try to import pbixray
-try:
-    from pbixray import PBIXRay
-except ImportError:
-    st.error("Could not import `pbixray`. Please install it using: `pip install pbixray`")
-    st.stop()
+rerun_started = time.perf_counter()
 
 # --- Page setup (set ONCE) ---
 st.set_page_config(
@@ -32,49 +37,123 @@ st.set_page_config(
 # ------------------------------
 # BACKGROUND IMAGE SETUP
 # ------------------------------
-def get_base64_of_bin_file(bin_file):
+APP_DIR = Path(__file__).parent
+STATIC_DIR = APP_DIR / "static" # Served at app/static/ when server.enableStaticServing is on
+BACKGROUND_FILE = "ITI_Background17601951402362703.png"
+LOGO_FILE = "Gemini_Generated_Image_pwn1v3p13472503787887624.png"
+
+# "static": reference images by URL so the browser downloads them once and caches them
+# "inline": embed them in the page as base64 data URIs
+ASSET_MODE = os.getenv("ASSET_MODE", "static")
+ASSET_SIZE_BUDGET_KB = int(os.getenv("ASSET_SIZE_BUDGET_KB", "512")) # Per image, as sent to the browser
+
+def read_asset_bytes(file_name):
+    return (STATIC_DIR / file_name).read_bytes()
+
+def encode_webp(data, max_width):
     try:
-        with open(bin_file, 'rb') as f:
-            data = f.read()
-        return base64.b64encode(data).decode()
-    except FileNotFoundError:
-        st.warning(f"Background image file not found: {bin_file}. Skipping background.")
+        img = Image.open(BytesIO(data))
+        img.thumbnail((max_width, max_width * 4)) # Keeps aspect ratio, never upscales
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=80)
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Could not re-encode image as WebP, serving the original: {e}")
         return None
 
-def set_background(png_file):
-    bin_str = get_base64_of_bin_file(png_file)
-    if bin_str:
-        page_bg_img = f"""
-        <style>
-        .stApp {{
-            background-image: url("data:image/png;base64,{bin_str}");
-            background-size: cover;
-            background-position: center;
-            background-repeat: no-repeat;
-            background-attachment: fixed;
-        }}
-        </style>
-        """
-        st.markdown(page_bg_img, unsafe_allow_html=True)
+@st.cache_resource(show_spinner=False)
+def load_image_asset(file_name, max_width):
+    """Resolve an image once per process into something a page can reference.
+
+    In static mode the downscaled WebP is written next to the original under a
+    content-hashed name, so its URL never changes meaning and browsers can keep it.
+    Otherwise the image is inlined as a data URI. Returns (src, size_bytes) and
+    raises FileNotFoundError if the image is missing.
+    """
+    data = read_asset_bytes(file_name)
+    webp = encode_webp(data, max_width)
+
+    if ASSET_MODE == "static" and st.get_option("server.enableStaticServing"):
+        if webp:
+            hashed_name = f"{Path(file_name).stem}.{hashlib.sha256(webp).hexdigest()[:12]}.webp"
+            try:
+                if not (STATIC_DIR / hashed_name).exists():
+                    (STATIC_DIR / hashed_name).write_bytes(webp)
+                return f"app/static/{hashed_name}", len(webp)
+            except OSError as e:
+                print(f"Could not write {hashed_name}, serving the original: {e}")
+        if (STATIC_DIR / file_name).exists():
+            return f"app/static/{quote(file_name)}?v={hashlib.sha256(data).hexdigest()[:12]}", len(data)
+
+    payload, mime = (webp, "image/webp") if webp else (data, "image/png")
+    return f"data:{mime};base64,{base64.b64encode(payload).decode()}", len(payload)
+
+def check_asset_budget(file_name, size):
+    # Fail fast instead of quietly shipping an oversized image to every visitor
+    if size > ASSET_SIZE_BUDGET_KB * 1024:
+        st.error(f"Asset {file_name} is {size / 1024:.0f} KB, over the {ASSET_SIZE_BUDGET_KB} KB budget (ASSET_SIZE_BUDGET_KB).")
+        st.stop()
 
-set_background("ITI_Background17601951402362703.png")
+def set_background(file_name):
+    try:
+        bg_src, bg_size = load_image_asset(file_name, max_width=1920)
+    except FileNotFoundError:
+        st.warning(f"Background image file not found: {file_name}. Skipping background.")
+        return
+    check_asset_budget(file_name, bg_size)
+    page_bg_img = f"""
+    <style>
+    .stApp {{
+        background-image: url("{bg_src}");
+        background-size: cover;
+        background-position: center;
+        background-repeat: no-repeat;
+        background-attachment: fixed;
+    }}
+    </style>
+    """
+    st.markdown(page_bg_img, unsafe_allow_html=True)
+
+set_background(BACKGROUND_FILE)
 
 # ------------------------------
-# LOGO SETUP
+# RERUN TIMING
 # ------------------------------
-def get_base64_image(image_path):
-    try:
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-    except FileNotFoundError:
-        st.warning(f"Logo file not found: {image_path}. Skipping logo.")
-        return None
+RERUN_TIMING_LOG = os.getenv("RERUN_TIMING_LOG", "0") == "1" # Print one line per rerun and show a summary at the bottom
+
+@st.cache_resource
+def get_rerun_timings():
+    # Shared by all sessions: (tab, ms) for the most recent reruns
+    return deque(maxlen=500)
+
+def record_rerun_timing(tab_name):
+    """Record how long this rerun took. Reruns cut short by st.stop()/st.rerun() are not counted."""
+    elapsed_ms = (time.perf_counter() - rerun_started) * 1000
+    get_rerun_timings().append((tab_name, elapsed_ms))
+    if RERUN_TIMING_LOG:
+        print(f"Rerun [{tab_name}]: {elapsed_ms:.1f} ms")
+
+def rerun_timing_report():
+    df = pd.DataFrame(list(get_rerun_timings()), columns=["Tab", "ms"])
+    if df.empty:
+        return df
+    return df.groupby("Tab")["ms"].agg(
+        Reruns="count", Mean_ms="mean", P95_ms=lambda s: s.quantile(0.95), Max_ms="max"
+    ).round(1).reset_index()
 
-logo_path = "Gemini_Generated_Image_pwn1v3p13472503787887624.png"
-logo_base64 = get_base64_image(logo_path)
+
+# ------------------------------
+# LOGO SETUP
+# ------------------------------
+try:
+    logo_src, logo_size = load_image_asset(LOGO_FILE, max_width=480) # Shown at 160px high
+    check_asset_budget(LOGO_FILE, logo_size)
+except FileNotFoundError:
+    st.warning(f"Logo file not found: {LOGO_FILE}. Skipping logo.")
+    logo_src = None
 
 # --- Header ---
-if logo_base64:
+if logo_src:
     st.markdown(
         f"""
         <style>
@@ -99,7 +178,7 @@ if logo_base64:
         </style>
 
         <div class="header-container">
-            <img src="data:image/png;base64,{logo_base64}" alt="Logo">
+            <img src="{logo_src}" alt="Logo">
             <div class="header-title">🎓 ITI Examination System Web Application</div>
         </div>
         """,
@@ -132,36 +211,712 @@ if not GOOGLE_API_KEY:
     st.warning("Please provide your Gemini API key to continue.")
     st.stop()
 
-genai.configure(api_key=GOOGLE_API_KEY)
-
 # ============================================
 # ⚙️ Helper Functions
 # ============================================
-@st.cache_resource
-def load_gemini_model():
-    return genai.GenerativeModel("models/gemini-2.5-pro")
+GEMINI_MODEL = "models/gemini-2.5-pro"
 
-def get_gemini_response(prompt, input_text):
-    model = load_gemini_model()
-    response = model.generate_content([prompt, input_text])
+@st.cache_resource
+def load_gemini_model(api_key):
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(GEMINI_MODEL)
+
+def get_gemini_response(prompt, input_text, generation_config=None):
+    model = load_gemini_model(GOOGLE_API_KEY)
+    response = model.generate_content([prompt, input_text], generation_config=generation_config)
     return response.text.strip()
 
-def read_sql_query(query, database):
-    """Connect dynamically to either ITIExaminationSystem or ITI_DW"""
-    DRIVER_NAME = 'SQL Server'
-    SERVER_NAME = 'HIMA' # <!> IMPORTANT: Make sure this server name is correct
-    CONNECTION_STRING = f'DRIVER={{{DRIVER_NAME}}};SERVER={SERVER_NAME};DATABASE={database};Trusted_Connection=yes;'
+def stream_gemini_response(prompt, input_text):
+    """Yield the response text chunk by chunk as Gemini generates it."""
+    model = load_gemini_model(GOOGLE_API_KEY)
+    for chunk in model.generate_content([prompt, input_text], stream=True):
+        try:
+            yield chunk.text
+        except ValueError:
+            continue # A chunk without text parts, e.g. the final finish-reason chunk
+
+class StreamingJsonArray:
+    """Iterate over the objects of a JSON array while its text is still streaming in.
+
+    Each object is yielded as soon as its closing brace arrives, so work on the
+    first items can start before the model has finished writing the rest. Text
+    before the opening bracket (e.g. a ```json fence) is skipped; `text` holds
+    everything received so far, for error messages.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.text = ""
+
+    def __iter__(self):
+        decoder = json.JSONDecoder()
+        pos = None
+        for chunk in self.chunks:
+            self.text += chunk
+            if pos is None:
+                start = self.text.find("[")
+                if start < 0:
+                    continue
+                pos = start + 1
+            if "}" not in chunk:
+                continue # An object can only have completed if a closing brace arrived
+            while True:
+                while pos < len(self.text) and self.text[pos] in " \t\r\n,":
+                    pos += 1
+                if pos >= len(self.text) or self.text[pos] == "]":
+                    break
+                try:
+                    obj, pos = decoder.raw_decode(self.text, pos)
+                except json.JSONDecodeError:
+                    break # Not complete yet
+                yield obj
+        if pos is None:
+            raise ValueError("The response did not contain a JSON array.")
+        if not self.text[pos:].lstrip(" \t\r\n,").startswith("]"):
+            raise ValueError("The response ended before the JSON array was complete.")
 
+# ============================================
+# 🧠 NL→SQL Translation Cache
+# ============================================
+NL_SQL_CACHE_FILE = Path(os.getenv("NL_SQL_CACHE_FILE", APP_DIR / "nl_sql_cache.json"))
+NL_SQL_CACHE_MAX_ENTRIES = int(os.getenv("NL_SQL_CACHE_MAX_ENTRIES", "2000"))
+NL_SQL_EMBEDDING_MODEL = os.getenv("NL_SQL_EMBEDDING_MODEL", "")          # e.g. all-MiniLM-L6-v2; empty = exact match only
+NL_SQL_SIMILARITY = float(os.getenv("NL_SQL_SIMILARITY", "0.92"))          # cosine similarity for a near-duplicate hit
+
+# Punctuation is noise, except comparison operators and decimal points: "grade > 3.5" must not match "grade < 35"
+QUESTION_NOISE_RE = re.compile(r"(?!(?<=\d)\.(?=\d))[^\w\s<>=!]")
+QUESTION_OPERATOR_RE = re.compile(r"[<>=!]+")
+QUESTION_KEY_VERSION = 2 # Bump when normalize_question changes, so keys saved by the old one are dropped
+
+def normalize_question(question):
+    text = QUESTION_NOISE_RE.sub(" ", question.casefold())
+    text = QUESTION_OPERATOR_RE.sub(lambda m: f" {m.group(0)} ", text) # "grade>=90" == "grade >= 90"
+    return " ".join(text.split())
+
+@st.cache_resource(show_spinner=False)
+def load_embedding_model(name):
+    # Optional dependency: without sentence-transformers the cache does exact matches only
     try:
-        connection = odbc.connect(CONNECTION_STRING)
-        df = pd.read_sql(query, connection)
-        connection.close()
-        return df
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence-transformers is not installed; NL->SQL cache uses exact matches only.")
+        return None
+    return SentenceTransformer(name)
+
+class TranslationCache:
+    """Question -> generated SQL, persisted to a JSON file across restarts.
+
+    Lookups try the normalized question first and then, if an embedding model is
+    configured, the most similar cached question. A near-duplicate only counts if
+    it mentions the same numbers, so "top 5" never reuses the SQL for "top 10".
+    Entries are tagged with a hash of the prompt and model; when the schema prompt
+    changes, entries made with the old one are dropped on load.
+    """
+
+    def __init__(self, path, prompt_hash, max_entries, embedder=None, similarity=1.0):
+        self.path = path
+        self.prompt_hash = prompt_hash
+        self.max_entries = max_entries
+        self.embedder = embedder
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._entries = {}  # normalized question -> {"question", "sql", "used_at", "embedding"}
+        try:
+            saved = json.loads(path.read_text(encoding="utf-8"))
+            if saved.get("prompt_hash") == prompt_hash:
+                self._entries = saved.get("entries", {})
+        except (OSError, ValueError) as e:
+            if path.exists():
+                print(f"Could not read NL->SQL cache {path}: {e}")
+
+    def lookup(self, question):
+        """Return (sql, matched_question) or (None, None)."""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None and self.embedder is not None and self._entries:
+                entry = self._nearest(key)
+            if entry is None:
+                return None, None
+            entry["used_at"] = time.time()
+            return entry["sql"], entry["question"]
+
+    def _nearest(self, key):
+        numbers = re.findall(r"\d+", key)
+        candidates = [e for k, e in self._entries.items() if e.get("embedding") and re.findall(r"\d+", k) == numbers]
+        if not candidates:
+            return None
+        query = self._embed(key)
+        matrix = np.array([e["embedding"] for e in candidates])
+        scores = matrix @ query
+        best = int(scores.argmax())
+        return candidates[best] if scores[best] >= self.similarity else None
+
+    def _embed(self, text):
+        return np.asarray(self.embedder.encode(text, normalize_embeddings=True), dtype=float)
+
+    def store(self, question, sql):
+        key = normalize_question(question)
+        entry = {"question": question, "sql": sql, "used_at": time.time()}
+        if self.embedder is not None:
+            entry["embedding"] = self._embed(key).round(5).tolist()
+        with self._lock:
+            self._entries[key] = entry
+            if len(self._entries) > self.max_entries:
+                oldest = sorted(self._entries, key=lambda k: self._entries[k]["used_at"])
+                for k in oldest[:len(self._entries) - self.max_entries]:
+                    del self._entries[k]
+            self._save()
+
+    def forget(self, question):
+        with self._lock:
+            if self._entries.pop(normalize_question(question), None) is not None:
+                self._save()
+
+    def _save(self):
+        # Called with the lock held; write then rename so a crash never leaves half a file
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps({"prompt_hash": self.prompt_hash, "entries": self._entries}), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"Could not save NL->SQL cache {self.path}: {e}")
+
+@st.cache_resource
+def get_translation_cache(prompt):
+    prompt_hash = hashlib.sha256(f"{GEMINI_MODEL}\n{QUESTION_KEY_VERSION}\n{prompt}".encode("utf-8")).hexdigest()
+    embedder = load_embedding_model(NL_SQL_EMBEDDING_MODEL) if NL_SQL_EMBEDDING_MODEL else None
+    return TranslationCache(NL_SQL_CACHE_FILE, prompt_hash, NL_SQL_CACHE_MAX_ENTRIES, embedder, NL_SQL_SIMILARITY)
+
+# ============================================
+# 🗄️ SQL Server Connection Pool
+# ============================================
+DRIVER_NAME = 'SQL Server'
+SERVER_NAME = 'HIMA' # <!> IMPORTANT: Make sure this server name is correct
+SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "8"))               # open connections per database
+SQL_POOL_IDLE_SECONDS = float(os.getenv("SQL_POOL_IDLE_SECONDS", "300"))   # close connections unused this long
+SQL_POOL_CHECK_SECONDS = float(os.getenv("SQL_POOL_CHECK_SECONDS", "30"))  # ping a connection idle this long before reuse
+SQL_POOL_WAIT_SECONDS = float(os.getenv("SQL_POOL_WAIT_SECONDS", "30"))    # max wait for a free connection
+
+def connection_string(database):
+    return f'DRIVER={{{DRIVER_NAME}}};SERVER={SERVER_NAME};DATABASE={database};Trusted_Connection=yes;'
+
+def open_sql_connection(database):
+    import pypyodbc as odbc
+    return odbc.connect(connection_string(database))
+
+class ConnectionPool:
+    """Process-wide pool of database connections, kept separately per database.
+
+    Borrowing reuses the most recently returned connection, so each one pays the
+    Windows-auth handshake once instead of once per query. A connection that has
+    been idle for a while is pinged before reuse, one idle past `idle_seconds` is
+    closed, and at most `max_size` connections per database are open at a time;
+    further borrowers wait up to `wait_seconds` for one to come back.
+    """
+
+    def __init__(self, connect, max_size, idle_seconds, check_seconds, wait_seconds):
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_seconds = idle_seconds
+        self.check_seconds = check_seconds
+        self.wait_seconds = wait_seconds
+        self._idle = {}  # database -> [(connection, last_used)], most recent last
+        self._open = {}  # database -> open connections, idle or borrowed
+        self._stats = {}
+        self._available = threading.Condition()
+
+    @contextmanager
+    def connection(self, database):
+        conn = self._acquire(database)
+        healthy = False
+        try:
+            yield conn
+            healthy = True
+        finally:
+            # Runs on every exit, including GeneratorExit when a caller stops reading a
+            # result early, so the connection always comes back. A failed or abandoned
+            # query usually leaves it usable; keep it only if it still answers.
+            if not healthy:
+                healthy = self._rollback(conn) and self._ping(conn)
+            self._release(database, conn, healthy=healthy)
+
+    def _acquire(self, database):
+        deadline = time.monotonic() + self.wait_seconds
+        with self._available:
+            while True:
+                self._evict_idle()
+                idle = self._idle.setdefault(database, [])
+                if idle:
+                    conn, last_used = idle.pop()
+                    break
+                if self._open.get(database, 0) < self.max_size:
+                    self._open[database] = self._open.get(database, 0) + 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free connection to {database} after {self.wait_seconds:g}s")
+                self._count(database, "waits")
+                self._available.wait(remaining)
+
+        if conn is not None:
+            if time.monotonic() - last_used < self.check_seconds or self._ping(conn):
+                self._count(database, "reused")
+                return conn
+            self._close(conn)
+            self._count(database, "discarded")
+        try:
+            conn = self._connect(database)
+        except Exception:
+            with self._available:
+                self._open[database] -= 1
+                self._available.notify()
+            raise
+        self._count(database, "created")
+        return conn
+
+    def _release(self, database, conn, healthy):
+        with self._available:
+            if healthy:
+                self._idle.setdefault(database, []).append((conn, time.monotonic()))
+            else:
+                self._open[database] -= 1
+            self._available.notify()
+        if not healthy:
+            self._close(conn)
+            self._count(database, "discarded")
+
+    def _evict_idle(self):
+        # Called with the lock held; idle lists are oldest first
+        cutoff = time.monotonic() - self.idle_seconds
+        for database, idle in self._idle.items():
+            while idle and idle[0][1] < cutoff:
+                conn, _ = idle.pop(0)
+                self._open[database] -= 1
+                self._close(conn)
+                self._count(database, "evicted")
+
+    def _ping(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _rollback(self, conn):
+        try:
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception as e:
+            print(f"Error closing pooled connection: {e}")
+
+    def _count(self, database, event):
+        with self._available: # Re-entrant, so safe to call with the lock already held
+            s = self._stats.setdefault(database, {"created": 0, "reused": 0, "discarded": 0, "evicted": 0, "waits": 0})
+            s[event] += 1
+
+    def stats(self):
+        with self._available:
+            rows = [
+                {"database": db, "open": self._open.get(db, 0), "idle": len(self._idle.get(db, [])), **s}
+                for db, s in self._stats.items()
+            ]
+        return pd.DataFrame(rows)
+
+SQL_QUERY_WORKERS = int(os.getenv("SQL_QUERY_WORKERS", "4"))           # concurrent dashboard queries, process-wide
+SQL_QUERY_TIMEOUT = float(os.getenv("SQL_QUERY_TIMEOUT", "30"))        # per chart query, seconds
+
+@st.cache_resource
+def get_sql_pool():
+    return ConnectionPool(open_sql_connection, SQL_POOL_MAX_SIZE, SQL_POOL_IDLE_SECONDS,
+                          SQL_POOL_CHECK_SECONDS, SQL_POOL_WAIT_SECONDS)
+
+# ============================================
+# 🗃️ Query Result Cache
+# ============================================
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "600"))                 # seconds; 0 disables the cache
+SQL_CACHE_MAX_MB = float(os.getenv("SQL_CACHE_MAX_MB", "256"))            # Parquet bytes held, process-wide
+SQL_CACHE_STAMP_FILE = Path(os.getenv("SQL_CACHE_STAMP_FILE", APP_DIR / "sql_cache.stamp")) # touch after a warehouse load
+
+SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\[[^\]]*\]|\"[^\"]*\"|(?:--[^\n]*|/\*.*?\*/|\s+)+", re.DOTALL)
+
+def normalize_sql(query):
+    """Drop comments, collapse whitespace and trailing semicolons; quoted text is kept as-is."""
+    def token(m):
+        text = m.group(0)
+        return text if text[0] in "'[\"" else " "
+    return SQL_TOKEN_RE.sub(token, query).strip().rstrip(";").strip()
+
+class QueryResultCache:
+    """Process-wide LRU of query results, keyed by database and normalized SQL.
+
+    Results are stored as Parquet bytes, which are several times smaller than the
+    DataFrames and give every reader its own copy. Entries expire after `ttl`
+    seconds and the least recently used ones are dropped once `max_bytes` is
+    reached. Touching `stamp_file` (e.g. at the end of the warehouse load)
+    clears everything cached before it.
+    """
+
+    def __init__(self, ttl, max_bytes, stamp_file):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stamp_file = stamp_file
+        self._entries = OrderedDict()  # (database, sql_hash) -> (parquet_bytes, stored_at)
+        self._bytes = 0
+        self._stamp = self._read_stamp()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(query, database):
+        return database, hashlib.sha256(normalize_sql(query).encode("utf-8")).hexdigest()
+
+    def get(self, query, database):
+        self._check_stamp()
+        key = self.key(query, database)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] > self.ttl:
+                self._drop(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return pd.read_parquet(BytesIO(entry[0]))
+
+    def put(self, query, database, df):
+        try:
+            buffer = BytesIO()
+            df.to_parquet(buffer, index=False)
+            data = buffer.getvalue()
+        except Exception as e:
+            print(f"Query result not cached, could not serialize it: {e}")
+            data = None
+        key = self.key(query, database)
+        with self._lock:
+            if data is None or len(data) > self.max_bytes:
+                self._stats["skipped"] += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (data, time.time())
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats["evicted"] += 1
+
+    def invalidate(self, database=None):
+        """Forget every cached result, or only those for `database`."""
+        with self._lock:
+            for key in [k for k in self._entries if database is None or k[0] == database]:
+                self._drop(key)
+
+    def _drop(self, key):
+        data, _ = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def _read_stamp(self):
+        try:
+            return self.stamp_file.stat().st_mtime
+        except OSError:
+            return None
+
+    def _check_stamp(self):
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self.invalidate()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "mb_held": round(self._bytes / 2**20, 2),
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else None,
+                **self._stats,
+            }
+
+@st.cache_resource
+def get_query_cache():
+    return QueryResultCache(SQL_CACHE_TTL, SQL_CACHE_MAX_MB * 2**20, SQL_CACHE_STAMP_FILE)
+
+# ============================================
+# 📥 Bounded Result Fetch
+# ============================================
+SQL_FETCH_ROWS = int(os.getenv("SQL_FETCH_ROWS", "5000"))      # rows per fetchmany() round-trip
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "100000"))        # rows kept in memory per result
+SQL_MAX_MB = float(os.getenv("SQL_MAX_MB", "64"))              # in-memory size kept per result
+SQL_PAGE_ROWS = int(os.getenv("SQL_PAGE_ROWS", "500"))         # rows sent to the browser per page
+SQL_EXPORT_DIR = Path(os.getenv("SQL_EXPORT_DIR", APP_DIR / "exports"))
+SQL_EXPORT_DOWNLOAD_MB = float(os.getenv("SQL_EXPORT_DOWNLOAD_MB", "200")) # larger exports are only saved to disk
+
+def iter_sql_chunks(query, database, chunk_rows=SQL_FETCH_ROWS, timeout=None):
+    """Yield (cursor.description, DataFrame) pairs of up to `chunk_rows` rows, straight off the cursor.
+
+    Only one chunk is in memory at a time. The first chunk is always yielded, even
+    when empty, so callers get the columns. The pooled connection is held until
+    the generator is exhausted or closed.
+    """
+    with get_sql_pool().connection(database) as connection:
+        if timeout:
+            connection.timeout = max(1, int(timeout)) # pypyodbc applies it to new cursors
+        cursor = connection.cursor()
+        try:
+            cursor.execute(query)
+            columns = [d[0] for d in cursor.description or []]
+            first = True
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows and not first:
+                    break
+                # coerce_float turns Decimal into float, as pd.read_sql did
+                yield cursor.description, pd.DataFrame.from_records([tuple(r) for r in rows], columns=columns, coerce_float=True)
+                first = False
+                if not rows:
+                    break
+        finally:
+            cursor.close()
+            if timeout:
+                connection.timeout = 0
+
+def run_sql_query(query, database, timeout=None, use_cache=True):
+    """Run a query on either ITIExaminationSystem or ITI_DW with a pooled connection.
+
+    Raises on failure and never touches the UI, so it is safe to call from worker threads.
+    `timeout` (seconds) is enforced by the server as the query timeout. At most
+    SQL_MAX_ROWS rows / SQL_MAX_MB are fetched; if more were left behind,
+    df.attrs["truncated"] is True. Results are served from and saved to the query
+    result cache unless `use_cache` is False.
+    """
+    cache = get_query_cache() if use_cache and SQL_CACHE_TTL > 0 else None
+    if cache is not None:
+        df = cache.get(query, database)
+        if df is not None:
+            return df
+
+    chunks, rows, size, truncated = [], 0, 0, False
+    with closing(iter_sql_chunks(query, database, timeout=timeout)) as result:
+        for _, chunk in result:
+            if rows >= SQL_MAX_ROWS or size >= SQL_MAX_MB * 2**20:
+                truncated = True # Stop reading; the rest of the result is never fetched
+                break
+            if len(chunk) > SQL_MAX_ROWS - rows:
+                chunk = chunk.iloc[:SQL_MAX_ROWS - rows]
+                truncated = True # The rest of this chunk is dropped
+            chunks.append(chunk)
+            rows += len(chunk)
+            size += int(chunk.memory_usage(deep=True).sum())
+            if truncated:
+                break
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    df.attrs["truncated"] = truncated
+
+    if cache is not None:
+        cache.put(query, database, df)
+    return df
+
+def arrow_schema(description, sample):
+    """Arrow schema for an export, from the cursor's column types or else the first chunk's.
+
+    Returns (schema, loose_columns): columns whose type couldn't be known (all NULL
+    in the first chunk) are written as strings and must be converted chunk by chunk.
+    """
+    import pyarrow as pa
+    arrow_types = {
+        int: pa.int64(), float: pa.float64(), decimal.Decimal: pa.float64(), bool: pa.bool_(), str: pa.string(),
+        datetime.datetime: pa.timestamp("us"), datetime.date: pa.date32(), datetime.time: pa.time64("us"),
+        bytes: pa.binary(), bytearray: pa.binary(),
+    }
+    fields, loose_columns = [], []
+    for i, field in enumerate(pa.Schema.from_pandas(sample, preserve_index=False)):
+        type_code = description[i][1] if description and i < len(description) else None
+        arrow_type = arrow_types.get(type_code, field.type)
+        if pa.types.is_null(arrow_type):
+            arrow_type = pa.string()
+            loose_columns.append(field.name)
+        fields.append(pa.field(field.name, arrow_type))
+    return pa.schema(fields), loose_columns
+
+def export_sql_to_parquet(query, database, progress=None):
+    """Stream the full result of `query` into a Parquet file in SQL_EXPORT_DIR, one chunk at a time.
+
+    Memory stays at one SQL_FETCH_ROWS chunk however large the result is.
+    Returns (path, rows).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    SQL_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"{database}_{hashlib.sha256(normalize_sql(query).encode('utf-8')).hexdigest()[:12]}_{time.strftime('%Y%m%d_%H%M%S')}"
+    path = SQL_EXPORT_DIR / f"{name}.parquet"
+    part = path.with_suffix(".parquet.part")
+    writer, rows = None, 0
+    try:
+        with closing(iter_sql_chunks(query, database)) as result:
+            for description, chunk in result:
+                if writer is None:
+                    schema, loose_columns = arrow_schema(description, chunk)
+                    writer = pq.ParquetWriter(part, schema)
+                for col in loose_columns:
+                    chunk[col] = chunk[col].map(lambda v: None if pd.isna(v) else str(v))
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows)
+        writer.close()
+        os.replace(part, path)
+        return path, rows
+    except Exception:
+        if writer is not None:
+            writer.close()
+        part.unlink(missing_ok=True)
+        raise
+
+def read_sql_query(query, database):
+    """Run a query on either ITIExaminationSystem or ITI_DW, reporting errors in the UI"""
+    try:
+        return run_sql_query(query, database)
     except Exception as e:
         st.error(f"Database Error: {e}")
-        st.info(f"Connection String Used: {CONNECTION_STRING}")
+        st.info(f"Connection String Used: {connection_string(database)}")
         return None
 
+@st.cache_resource
+def get_query_executor():
+    # Shared by all sessions, so a busy dashboard can't open more than SQL_QUERY_WORKERS queries at once
+    return ThreadPoolExecutor(max_workers=SQL_QUERY_WORKERS, thread_name_prefix="sql-query")
+
+class QueryBatch:
+    """Queries running on the shared worker pool, collected as they finish.
+
+    Queries can be submitted at any time, even while earlier ones are still
+    running. Each has its own `timeout`, counted from when it starts running; one
+    that goes over is reported as a TimeoutError without holding up the rest.
+    """
+
+    def __init__(self, database, timeout=SQL_QUERY_TIMEOUT):
+        self.database = database
+        self.timeout = timeout
+        self.pending = {}  # future -> index
+        self._started = {}
+        self._executor = get_query_executor()
+
+    def submit(self, i, query):
+        self.pending[self._executor.submit(self._run, i, query)] = i
+
+    def _run(self, i, query):
+        self._started[i] = time.monotonic()
+        return run_sql_query(query, self.database, self.timeout)
+
+    def results(self, wait_seconds=0.0):
+        """Yield (index, df, error) for every query that finished or timed out, waiting up to `wait_seconds` for one."""
+        if not self.pending:
+            return
+        done, _ = wait(self.pending, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+        for future in done:
+            i = self.pending.pop(future)
+            try:
+                yield i, future.result(), None
+            except Exception as e:
+                yield i, None, e
+        now = time.monotonic()
+        for future, i in list(self.pending.items()):
+            if i in self._started and now - self._started[i] > self.timeout:
+                del self.pending[future]
+                yield i, None, TimeoutError(f"Query ran longer than {self.timeout:g}s")
+
+def run_queries_concurrently(queries, database, timeout=SQL_QUERY_TIMEOUT):
+    """Run all queries at once on the worker pool and yield (index, df, error) as each finishes."""
+    batch = QueryBatch(database, timeout)
+    for i, query in enumerate(queries):
+        batch.submit(i, query)
+    while batch.pending:
+        yield from batch.results(wait_seconds=0.2)
+
+# ============================================
+# 🛰️ Model Inference Service
+# ============================================
+INFERENCE_URL = os.getenv("INFERENCE_URL", "").rstrip("/")       # e.g. http://127.0.0.1:8502; empty = score in this process
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "30"))   # seconds per scoring call
+INFERENCE_RETRY_SECONDS = float(os.getenv("INFERENCE_RETRY_SECONDS", "30")) # after a failure, score locally this long
+
+class InferenceClient:
+    """Thin client for inference_server.py, which holds one copy of each model for every worker.
+
+    predict() returns None when the server can't answer (down, model not loaded,
+    timeout) and the caller scores with its own model instead. After a failure
+    the server is skipped for `retry_seconds`, so a dead server doesn't add a
+    timeout to every rerun. Bad input is raised as ValueError, like the local
+    scoring functions do.
+    """
+
+    def __init__(self, url, timeout=INFERENCE_TIMEOUT, retry_seconds=INFERENCE_RETRY_SECONDS):
+        self.url = url
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.session = requests.Session()
+        self.down_until = 0.0
+        self.served = self.fallbacks = 0
+        self.last_error = ""
+
+    def predict(self, model, df):
+        if time.monotonic() < self.down_until:
+            self.fallbacks += 1
+            return None
+        try:
+            response = self.session.post(
+                f"{self.url}/predict/{model}", data=df.to_json(orient="split", index=False, date_format="iso"),
+                headers={"Content-Type": "application/json"}, timeout=self.timeout,
+            )
+            if response.status_code == 400:
+                raise ValueError(response.json().get("error", "Bad request"))
+            response.raise_for_status()
+            predictions = response.json()
+        except requests.RequestException as e:
+            self.fallbacks += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.down_until = time.monotonic() + self.retry_seconds
+            print(f"Inference server unavailable, scoring locally for {self.retry_seconds:g}s: {self.last_error}")
+            return None
+        self.served += 1
+        scored = df.copy()
+        scored[predictions["columns"]] = pd.DataFrame(predictions["data"], columns=predictions["columns"], index=df.index)
+        return scored
+
+    def stats(self):
+        return {
+            "url": self.url,
+            "served": self.served,
+            "local_fallbacks": self.fallbacks,
+            "up": time.monotonic() >= self.down_until,
+            "last_error": self.last_error,
+        }
+
+@st.cache_resource
+def get_inference_client():
+    return InferenceClient(INFERENCE_URL) if INFERENCE_URL else None
+
+def predict_with_service(model, df, local):
+    """Score `df` on the inference server when INFERENCE_URL is set; otherwise, or if it can't answer, with `local()`"""
+    client = get_inference_client()
+    scored = client.predict(model, df) if client is not None else None
+    return scored if scored is not None else local()
+
 # ============================================
 # 📚 Schema Definitions (for AI Context)
 # ============================================
@@ -214,16 +969,137 @@ DimCompany(CompanyKey, Company_Name)
 DimDate(DateKey, FullDate)
 """
 
+# ============================================
+# ✅ SQL Validation & Repair
+# ============================================
+SQL_REPAIR_CANDIDATES = int(os.getenv("SQL_REPAIR_CANDIDATES", "3")) # parallel Gemini repairs when validation fails
+
+def parse_schema(schema_text):
+    """Map lower-cased table name -> set of lower-cased column names, from a schema prompt."""
+    tables = {}
+    for name, columns in re.findall(r"^\s*-?\s*(\w+)\(([^)]*)\)", schema_text, re.MULTILINE):
+        tables[name.lower()] = {c.strip().lower() for c in columns.split(",") if c.strip()}
+    return tables
+
+EXAMINATION_TABLES = parse_schema(schema_examination)
+
+def clean_generated_sql(text):
+    cleaned = re.sub(r"--.*", "", text)
+    return cleaned.replace("```sql", "").replace("```", "").strip()
+
+def validate_sql(sql, tables):
+    """Check generated SQL against the schema before it is sent to SQL Server.
+
+    Returns a list of problems (empty if the query looks valid), or None when
+    sqlglot isn't installed and the query can't be checked. Only a single SELECT
+    is accepted; tables, alias-qualified columns and bare columns are checked
+    against `tables`, allowing for CTEs, subqueries and column aliases.
+    """
+    try:
+        import sqlglot
+        from sqlglot import exp
+    except ImportError:
+        return None
+
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="tsql") if s is not None]
+    except sqlglot.errors.ParseError as e:
+        return [f"Syntax error: {str(e).splitlines()[0]}"]
+    if len(statements) != 1:
+        return [f"Expected one statement, got {len(statements)}."]
+    tree = statements[0]
+    if not isinstance(tree, exp.Query):
+        return ["Only SELECT queries are allowed."]
+
+    problems = []
+    derived = {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+    derived |= {sub.alias_or_name.lower() for sub in tree.find_all(exp.Subquery) if sub.alias_or_name}
+    aliases = {}  # alias or table name -> schema table
+    for table in tree.find_all(exp.Table):
+        name = table.name.lower()
+        if name in derived:
+            continue
+        if name not in tables:
+            problems.append(f"Unknown table: {table.name}")
+            continue
+        aliases[table.alias_or_name.lower()] = name
+        aliases[name] = name
+
+    output_aliases = {a.alias.lower() for a in tree.find_all(exp.Alias)}
+    in_scope = set().union(*(tables[t] for t in aliases.values())) if aliases else set()
+    if derived: # Columns of a CTE or subquery can be any schema column it selected
+        in_scope |= set().union(*tables.values())
+    for column in tree.find_all(exp.Column):
+        if isinstance(column.this, exp.Star):
+            continue
+        name, qualifier = column.name.lower(), column.table.lower()
+        if qualifier in derived:
+            continue
+        if qualifier:
+            if qualifier not in aliases:
+                problems.append(f"Unknown table or alias: {column.table}")
+            elif name not in tables[aliases[qualifier]]:
+                problems.append(f"Unknown column: {column.table}.{column.name}")
+        elif name not in in_scope and name not in output_aliases:
+            problems.append(f"Unknown column: {column.name}")
+    return sorted(set(problems))
+
+def repair_sql(prompt, question, sql, problems, candidates):
+    """Ask Gemini for `candidates` repaired queries at once; return the first one that validates, or None."""
+    request = (
+        f"Question: {question}\n\nThis query was generated for it but does not match the schema:\n{sql}\n\n"
+        "Problems:\n" + "\n".join(f"- {p}" for p in problems) + "\n\nReturn only the corrected SQL."
+    )
+    executor = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="sql-repair")
+    futures = [
+        executor.submit(get_gemini_response, prompt, request, {"temperature": min(1.0, 0.2 + 0.3 * i)})
+        for i in range(candidates)
+    ]
+    try:
+        for future in as_completed(futures):
+            try:
+                candidate = clean_generated_sql(future.result())
+            except Exception as e:
+                print(f"SQL repair candidate failed: {e}")
+                continue
+            if not validate_sql(candidate, EXAMINATION_TABLES):
+                return candidate
+        return None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True) # Don't wait for the slower candidates
+
+@st.cache_resource
+def get_text_to_sql_log():
+    # Shared by all sessions: one record per question asked
+    return deque(maxlen=1000)
+
+def text_to_sql_report():
+    df = pd.DataFrame(list(get_text_to_sql_log()))
+    if df.empty:
+        return df
+    return pd.DataFrame([{
+        "Questions": len(df),
+        "From cache": int(df["cached"].sum()),
+        "Valid first try": int(df["valid_first_try"].sum()),
+        "Repaired": int(df["repaired"].sum()),
+        "Rejected (not run)": int(df["rejected"].sum()),
+        "Queries run": int(df["executed"].sum()),
+        "Query errors": int(df["query_error"].sum()),
+        "Median s to valid SQL": round(df["seconds_to_valid"].median(), 2),
+    }])
+
 # =====================================================================
 # --- TABS DEFINITION ---
 # =====================================================================
 
+# on_change="rerun" makes the tabs stateful: each tab's .open tells us whether it is
+# selected, so only that tab's code (and its model loader) runs on a rerun.
 tab1, tab2, tab3, tab4 = st.tabs([
     "🧠 Text-to-SQL",
     "📊 Intelligent Dashboard",
     "⚙️ Employment Predictor",
     "🤖 Grade Predictor"
-])
+], key="main_tab", on_change="rerun")
 
 
 # =====================================================================
@@ -231,14 +1107,16 @@ tab1, tab2, tab3, tab4 = st.tabs([
 # =====================================================================
 
 with tab1:
-    st.subheader("🧩 Text-to-SQL Assistant (ITIExaminationSystem)")
-
-    user_question = st.text_input("💬 Ask a question about the ITI Examination System:")
-    if st.button("Generate SQL and Execute"):
-        if not user_question.strip():
-            st.warning("Please enter a question.")
-        else:
-            sql_prompt = f"""
+    if tab1.open:
+        st.subheader("🧩 Text-to-SQL Assistant (ITIExaminationSystem)")
+
+        user_question = st.text_input("💬 Ask a question about the ITI Examination System:")
+        generate_clicked = st.button("Generate SQL and Execute")
+        if generate_clicked:
+            if not user_question.strip():
+                st.warning("Please enter a question.")
+            else:
+                sql_prompt = f"""
 You are a senior SQL Server expert helping to translate natural language questions into valid T-SQL queries.
 Rules:
 - Use SQL Server syntax only.
@@ -249,39 +1127,162 @@ Schema:
 
 {schema_examination}
 """
-            with st.spinner("Generating SQL Query..."):
-                response = get_gemini_response(sql_prompt, user_question)
-                cleaned_query = re.sub(r"--.*", "", response)
-                cleaned_query = cleaned_query.replace("```sql", "").replace("```", "").strip()
-
-            st.subheader("🧠 Generated SQL Query")
-            st.code(cleaned_query, language="sql")
-
-            try:
-                with st.spinner("Executing query..."):
-                    df = read_sql_query(cleaned_query, "ITIExaminationSystem")
-                    if df is not None:
-                        st.success("✅ Query executed successfully!")
-                        st.dataframe(df)
-            except Exception as e:
-                st.error(f"❌ Error executing SQL query: {e}")
+                started = time.perf_counter()
+                record = {"cached": False, "valid_first_try": False, "repaired": False, "rejected": False,
+                          "executed": False, "query_error": False, "seconds_to_valid": None}
+                translation_cache = get_translation_cache(sql_prompt)
+                cleaned_query, cached_question = translation_cache.lookup(user_question)
+                record["cached"] = cached_question is not None
+
+                st.subheader("🧠 Generated SQL Query")
+                if cached_question is not None:
+                    st.caption(f"⚡ Reused from the cache (asked before as: “{cached_question}”)")
+                sql_box = st.empty()
+                if cleaned_query is None:
+                    # Show the SQL as Gemini writes it
+                    response = ""
+                    for chunk in stream_gemini_response(sql_prompt, user_question):
+                        response += chunk
+                        sql_box.code(response.replace("```sql", "").replace("```", "").strip() + " ▌", language="sql")
+                    cleaned_query = clean_generated_sql(response)
+
+                    # Check it against the schema before spending a database round-trip on it
+                    problems = validate_sql(cleaned_query, EXAMINATION_TABLES)
+                    record["valid_first_try"] = problems == []
+                    if problems is None:
+                        st.warning("⚠️ `sqlglot` is not installed, so the generated SQL was not checked against the schema. Install it with: `pip install sqlglot`")
+                    if problems:
+                        sql_box.code(cleaned_query, language="sql")
+                        st.warning("⚠️ The generated SQL doesn't match the schema:\n" + "\n".join(f"- {p}" for p in problems))
+                        with st.spinner(f"Asking Gemini for {SQL_REPAIR_CANDIDATES} repaired queries..."):
+                            cleaned_query = repair_sql(sql_prompt, user_question, cleaned_query, problems, SQL_REPAIR_CANDIDATES)
+                        if cleaned_query is not None:
+                            record["repaired"] = True
+                            st.info("🔧 Using the first repaired query that passed validation:")
+                            sql_box = st.empty()
+                        else:
+                            record["rejected"] = True
+                            st.error("❌ None of the repaired queries passed validation, so nothing was sent to SQL Server. Try rephrasing the question.")
+
+                if cleaned_query is not None:
+                    record["seconds_to_valid"] = time.perf_counter() - started
+                    sql_box.code(cleaned_query, language="sql")
+                    st.caption(f"⏱️ Valid SQL after {record['seconds_to_valid']:.1f}s")
+
+                    try:
+                        with st.spinner("Executing query..."):
+                            record["executed"] = True
+                            df = read_sql_query(cleaned_query, "ITIExaminationSystem")
+                            record["query_error"] = df is None
+                            if df is not None:
+                                st.success("✅ Query executed successfully!")
+                                # Kept in the session so paging and exporting don't re-run the query
+                                st.session_state.t2s_result = {"sql": cleaned_query, "df": df}
+                                st.session_state.t2s_page = 1
+                                if cached_question is None:
+                                    translation_cache.store(user_question, cleaned_query) # Only SQL that ran is kept
+                            elif cached_question is not None:
+                                translation_cache.forget(cached_question)
+                    except Exception as e:
+                        st.error(f"❌ Error executing SQL query: {e}")
+                get_text_to_sql_log().append(record)
+
+        t2s_result = st.session_state.get("t2s_result")
+        if t2s_result is not None:
+            df = t2s_result["df"]
+            if not generate_clicked:
+                st.subheader("🧠 Generated SQL Query")
+                st.code(t2s_result["sql"], language="sql")
+            if df.attrs.get("truncated"):
+                st.warning(f"⚠️ Only the first {len(df):,} rows were fetched (limits: {SQL_MAX_ROWS:,} rows / {SQL_MAX_MB:g} MB). "
+                           "Export to Parquet to get the full result.")
+
+            # Only one page at a time goes to the browser
+            pages = max(1, -(-len(df) // SQL_PAGE_ROWS))
+            page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="t2s_page") if pages > 1 else 1
+            first = (page - 1) * SQL_PAGE_ROWS
+            st.dataframe(df.iloc[first:first + SQL_PAGE_ROWS])
+            st.caption(f"Rows {first + 1 if len(df) else 0:,}–{min(first + SQL_PAGE_ROWS, len(df)):,} of {len(df):,}"
+                       + ("+" if df.attrs.get("truncated") else "") + f" · page {page} of {pages}")
+
+            if st.button("📦 Export full result to Parquet"):
+                status = st.empty()
+                try:
+                    with st.spinner("Exporting..."):
+                        path, rows = export_sql_to_parquet(
+                            t2s_result["sql"], "ITIExaminationSystem",
+                            progress=lambda rows: status.text(f"📥 {rows:,} rows written..."),
+                        )
+                    size_mb = path.stat().st_size / 2**20
+                    status.success(f"✅ Exported {rows:,} rows ({size_mb:.1f} MB) to {path}")
+                    if size_mb <= SQL_EXPORT_DOWNLOAD_MB:
+                        with open(path, "rb") as f:
+                            st.download_button("⬇️ Download Parquet", f, file_name=path.name, mime="application/octet-stream")
+                except Exception as e:
+                    status.error(f"❌ Export failed: {e}")
 
 # =====================================================================
 # 📊 TAB 2: Intelligent Dashboard Generator
 # =====================================================================
 with tab2:
-    st.subheader("📊 Intelligent Dashboard Generator (ITI_DW)")
-
-    dashboard_description = st.text_input(
-        "📝 Describe the dashboard you want to generate:",
-        placeholder="Example: Show average student grades by department and track"
-    )
-
-    if st.button("Generate Dashboard"):
-        if not dashboard_description.strip():
-            st.warning("Please describe the dashboard.")
-        else:
-            dashboard_prompt = f"""
+    if tab2.open:
+        import plotly.express as px
+
+        def render_chart(chart, df):
+            if chart["chart_type"] == "table":
+                st.dataframe(df)
+
+            elif chart["chart_type"] == "bar":
+                fig = px.bar(df, x=df.columns[0], y=df.columns[1], title=chart['title'])
+                # --- ADDED LINES ---
+                fig.update_layout(
+                    paper_bgcolor='rgba(0,0,0,0)', # Transparent outer background
+                    plot_bgcolor='rgba(0,0,0,0)',  # Transparent plot area
+                    font_color='white'             # Text color for readability
+                )
+                # --- END ADDED LINES ---
+                st.plotly_chart(fig, use_container_width=True)
+
+            elif chart["chart_type"] == "line":
+                fig = px.line(df, x=df.columns[0], y=df.columns[1], title=chart['title'])
+                # --- ADDED LINES ---
+                fig.update_layout(
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    font_color='white'
+                )
+                # --- END ADDED LINES ---
+                st.plotly_chart(fig, use_container_width=True)
+
+            elif chart["chart_type"] == "pie":
+                fig = px.pie(df, names=df.columns[0], values=df.columns[1], title=chart['title'])
+                # --- ADDED LINES ---
+                fig.update_layout(
+                    paper_bgcolor='rgba(0,0,0,0)',
+                    plot_bgcolor='rgba(0,0,0,0)',
+                    font_color='white'
+                )
+                # --- END ADDED LINES ---
+                st.plotly_chart(fig, use_container_width=True)
+
+            elif chart["chart_type"] == "kpi":
+                # Note: st.metric doesn't support transparency, 
+                # but we can style the 'kpi' title text.
+                # For a truly transparent KPI, you'd use Plotly Indicator.
+                st.metric(label=chart["title"], value=float(df.iloc[0, 0]))
+
+        st.subheader("📊 Intelligent Dashboard Generator (ITI_DW)")
+
+        dashboard_description = st.text_input(
+            "📝 Describe the dashboard you want to generate:",
+            placeholder="Example: Show average student grades by department and track"
+        )
+
+        if st.button("Generate Dashboard"):
+            if not dashboard_description.strip():
+                st.warning("Please describe the dashboard.")
+            else:
+                dashboard_prompt = f"""
 You are an expert data visualization and SQL assistant.
 Given a database schema and a dashboard description, return ONLY valid JSON with chart definitions.
 
@@ -307,327 +1308,401 @@ Rules:
 Schema:
 {schema_dw}
 """
-            try:
-                with st.spinner("Generating dashboard definition..."):
-                    model = load_gemini_model()
-                    response = model.generate_content([dashboard_prompt, dashboard_description])
-                    content = response.text.strip().replace("```json", "").replace("```", "").strip()
-                    charts = json.loads(content)
-
-                st.success("✅ Dashboard generated successfully!")
-
-                # Layout for a true dashboard look
-                cols = st.columns(2)
-                for i, chart in enumerate(charts):
-                    with cols[i % 2]:
-                        st.markdown(f"### {chart['title']}")
-                        st.code(chart['sql'], language="sql")
-
-                        try:
-                            with st.spinner(f"Loading chart: {chart['title']}..."):
-                                df = read_sql_query(chart["sql"], "ITI_DW")
-                                
-                                if df is None:
-                                    st.error(f"Query for '{chart['title']}' failed to execute.")
-                                    continue
-
-                                if chart["chart_type"] == "table":
-                                    st.dataframe(df)
-                                    
-                                elif chart["chart_type"] == "bar":
-                                    fig = px.bar(df, x=df.columns[0], y=df.columns[1], title=chart['title'])
-                                    # --- ADDED LINES ---
-                                    fig.update_layout(
-                                        paper_bgcolor='rgba(0,0,0,0)', # Transparent outer background
-                                        plot_bgcolor='rgba(0,0,0,0)',  # Transparent plot area
-                                        font_color='white'             # Text color for readability
-                                    )
-                                    # --- END ADDED LINES ---
-                                    st.plotly_chart(fig, use_container_width=True)
-
-                                elif chart["chart_type"] == "line":
-                                    fig = px.line(df, x=df.columns[0], y=df.columns[1], title=chart['title'])
-                                    # --- ADDED LINES ---
-                                    fig.update_layout(
-                                        paper_bgcolor='rgba(0,0,0,0)',
-                                        plot_bgcolor='rgba(0,0,0,0)',
-                                        font_color='white'
-                                    )
-                                    # --- END ADDED LINES ---
-                                    st.plotly_chart(fig, use_container_width=True)
-
-                                elif chart["chart_type"] == "pie":
-                                    fig = px.pie(df, names=df.columns[0], values=df.columns[1], title=chart['title'])
-                                    # --- ADDED LINES ---
-                                    fig.update_layout(
-                                        paper_bgcolor='rgba(0,0,0,0)',
-                                        plot_bgcolor='rgba(0,0,0,0)',
-                                        font_color='white'
-                                    )
-                                    # --- END ADDED LINES ---
-                                    st.plotly_chart(fig, use_container_width=True)
-
-                                elif chart["chart_type"] == "kpi":
-                                    # Note: st.metric doesn't support transparency, 
-                                    # but we can style the 'kpi' title text.
-                                    # For a truly transparent KPI, you'd use Plotly Indicator.
-                                    st.metric(label=chart["title"], value=float(df.iloc[0, 0]))
-
-                        except Exception as e:
-                            st.error(f"⚠️ Could not execute/render chart '{chart['title']}': {e}")
-
-            except Exception as e:
-                st.error(f"⚠️ Could not parse Gemini response: {e}")
-                st.write("Raw output:")
-                st.code(response.text if 'response' in locals() else "No response received.")
+                try:
+                    status = st.empty()
+                    status.info("⏳ Generating dashboard definition...")
+
+                    # Layout for a true dashboard look. Charts are streamed out of Gemini's JSON one
+                    # by one; each chart's query starts as soon as its definition is complete, and
+                    # its placeholder is filled as soon as the query comes back
+                    cols = st.columns(2)
+                    slots = []
+                    charts = []
+                    batch = QueryBatch("ITI_DW")
+
+                    def show_results(results):
+                        for i, df, error in results:
+                            chart = charts[i]
+                            if error is not None:
+                                slots[i].error(f"⚠️ Query for '{chart['title']}' failed: {error}")
+                                continue
+                            try:
+                                with slots[i].container():
+                                    render_chart(chart, df)
+                            except Exception as e:
+                                slots[i].error(f"⚠️ Could not render chart '{chart['title']}': {e}")
+
+                    chart_stream = StreamingJsonArray(stream_gemini_response(dashboard_prompt, dashboard_description))
+                    for chart in chart_stream:
+                        i = len(charts)
+                        charts.append(chart)
+                        with cols[i % 2]:
+                            st.markdown(f"### {chart['title']}")
+                            st.code(chart['sql'], language="sql")
+                            slots.append(st.empty())
+                            slots[i].info(f"⏳ Loading chart: {chart['title']}...")
+                        batch.submit(i, chart["sql"])
+                        show_results(batch.results())
+
+                    status.success(f"✅ Dashboard generated successfully! ({len(charts)} charts)")
+                    while batch.pending:
+                        show_results(batch.results(wait_seconds=0.2))
+
+                except Exception as e:
+                    st.error(f"⚠️ Could not parse Gemini response: {e}")
+                    st.write("Raw output:")
+                    st.code(chart_stream.text if 'chart_stream' in locals() else "No response received.")
 
 # =====================================================================
 # ⚙️ TAB 3: AI Student Employment Predictor
 # =====================================================================
 with tab3:
-    # -----------------------------
-    # 2. Load trained CatBoost model
-    # -----------------------------
-    @st.cache_resource
-    def load_employment_model():
-        try:
-            return joblib.load("catboost_employment_model.pkl")
-        except FileNotFoundError:
-            st.error("Model file 'catboost_employment_model.pkl' not found.")
-            st.stop()
-
-    model = load_employment_model()
-
-    # -----------------------------
-    # 3. Define categorical mappings
-    # -----------------------------
-    categorical_features = ["student_faculty", "student_gender", "student_marital_status", "grade_bucket"]
-
-    faculty_grade_map = {'Pass': 3, 'Good': 2, 'Very Good': 1, 'Excellent': 0}
-    iti_status_map = {'Failed to Graduate': 1, 'Graduated': 0}
-
-    # -----------------------------
-    # 4. App Title
-    # -----------------------------
-    st.markdown("<h2 style='text-align:center;'>⚙️ Student Employment Predictor</h2>", unsafe_allow_html=True)
-
-    st.markdown("<p style='text-align:center;'> Predict Whether a Student is Likely To Be Employed After Completing ITI Program.</p>", unsafe_allow_html=True)
-
-    st.divider()
-
-    # -----------------------------
-    # 5. Input Section
-    # -----------------------------
-    st.header("📋 Student Details")
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        student_faculty_grade = st.selectbox("Faculty Grade", list(faculty_grade_map.keys()))
-        student_iti_status = st.selectbox("ITI Status", list(iti_status_map.keys()))
-        total_grade = st.number_input("Total Grade", min_value=0.0, max_value=100.0, step=0.1)
-        grade_bucket = st.selectbox("Grade Bucket", ['Low', 'Medium', 'High', 'Top'])
-
-    with col2:
-        student_faculty = st.selectbox("Faculty", [
-            'Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems',
-            'Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Agriculture',
-            'Faculty of Science', 'Faculty of Fine Arts', 'Faculty of Applied Arts',
-            'Faculty of Arts', 'Faculty of Economics and Political Science', 'Faculty of Education'
-        ])
-        student_gender = st.selectbox("Gender", ['Male', 'Female'])
-        student_marital_status = st.selectbox("Marital Status", ['Single', 'Married'])
-
-    st.divider()
-
-    # -----------------------------
-    # 6. Prepare input for prediction
-    # -----------------------------
-    input_dict = {
-        "student_faculty_grade": [faculty_grade_map[student_faculty_grade]],
-        "student_iti_status": [iti_status_map[student_iti_status]],
-        "total_grade": [total_grade],
-        "student_faculty": [student_faculty],
-        "student_gender": [student_gender],
-        "student_marital_status": [student_marital_status],
-        "grade_bucket": [grade_bucket]
-    }
+    if tab3.open:
+        import joblib
+        from employment_predictor import (FACULTY_GRADE_MAP, ITI_STATUS_MAP, GRADE_BUCKETS, BATCH_ROWS,
+                                          PROBABILITY_COLUMN, LABEL_COLUMN, score_frame, read_batches)
+
+        # -----------------------------
+        # 2. Load trained CatBoost model
+        # -----------------------------
+        @st.cache_resource
+        def load_employment_model():
+            try:
+                return joblib.load("catboost_employment_model.pkl")
+            except FileNotFoundError:
+                st.error("Model file 'catboost_employment_model.pkl' not found.")
+                st.stop()
+
+        def score_employment(df):
+            # The model is only loaded in this process if the inference server isn't used or can't answer
+            return predict_with_service("employment", df, lambda: score_frame(load_employment_model(), df))
+
+        # -----------------------------
+        # 3. Categorical mappings (shared with batch scoring in employment_predictor.py)
+        # -----------------------------
+        faculty_grade_map = FACULTY_GRADE_MAP
+        iti_status_map = ITI_STATUS_MAP
 
-    input_df = pd.DataFrame(input_dict)
+        # -----------------------------
+        # 4. App Title
+        # -----------------------------
+        st.markdown("<h2 style='text-align:center;'>⚙️ Student Employment Predictor</h2>", unsafe_allow_html=True)
 
-    # -----------------------------
-    # 7. Prediction Section
-    # -----------------------------
-    if st.button("🔍 Predict Employment Status", use_container_width=True):
-        with st.spinner("Analyzing student profile..."):
-            input_pool = Pool(input_df, cat_features=categorical_features)
-            prediction = model.predict(input_pool)[0]
-            prediction_proba = model.predict_proba(input_pool)[0]
+        st.markdown("<p style='text-align:center;'> Predict Whether a Student is Likely To Be Employed After Completing ITI Program.</p>", unsafe_allow_html=True)
 
         st.divider()
-        st.header("📊 Prediction Result")
 
-        if prediction == 1:
-            st.success("✅ **The student is likely to be Employed**")
-        else:
-            st.error("❌ **The student is likely to be Unemployed**")
+        # -----------------------------
+        # 5. Input Section
+        # -----------------------------
+        st.header("📋 Student Details")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            student_faculty_grade = st.selectbox("Faculty Grade", list(faculty_grade_map.keys())[::-1]) # Pass first
+            student_iti_status = st.selectbox("ITI Status", list(iti_status_map.keys()))
+            total_grade = st.number_input("Total Grade", min_value=0.0, max_value=100.0, step=0.1)
+            grade_bucket = st.selectbox("Grade Bucket", GRADE_BUCKETS)
+
+        with col2:
+            student_faculty = st.selectbox("Faculty", [
+                'Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems',
+                'Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Agriculture',
+                'Faculty of Science', 'Faculty of Fine Arts', 'Faculty of Applied Arts',
+                'Faculty of Arts', 'Faculty of Economics and Political Science', 'Faculty of Education'
+            ])
+            student_gender = st.selectbox("Gender", ['Male', 'Female'])
+            student_marital_status = st.selectbox("Marital Status", ['Single', 'Married'])
+
+        st.divider()
 
-        st.subheader("🔢 Prediction Probabilities")
-        col_a, col_b = st.columns(2)
-        col_a.metric("Employed Probability", f"{prediction_proba[1]*100:.1f} %")
-        col_b.metric("Unemployed Probability", f"{prediction_proba[0]*100:.1f} %")
+        # -----------------------------
+        # 6. Prepare input for prediction
+        # -----------------------------
+        input_dict = {
+            "student_faculty_grade": [student_faculty_grade], # Mapped by score_frame()
+            "student_iti_status": [student_iti_status],
+            "total_grade": [total_grade],
+            "student_faculty": [student_faculty],
+            "student_gender": [student_gender],
+            "student_marital_status": [student_marital_status],
+            "grade_bucket": [grade_bucket]
+        }
 
-        st.caption("⚙️ Model: CatBoostClassifier | Based on academic and demographic inputs")
+        input_df = pd.DataFrame(input_dict)
+
+        # -----------------------------
+        # 7. Prediction Section
+        # -----------------------------
+        if st.button("🔍 Predict Employment Status", use_container_width=True):
+            with st.spinner("Analyzing student profile..."):
+                scored = score_employment(input_df) # One predict_proba pass gives both the label and the probabilities
+                prediction = scored[LABEL_COLUMN].iloc[0]
+                employed_proba = scored[PROBABILITY_COLUMN].iloc[0]
+
+            st.divider()
+            st.header("📊 Prediction Result")
+
+            if prediction == 1:
+                st.success("✅ **The student is likely to be Employed**")
+            else:
+                st.error("❌ **The student is likely to be Unemployed**")
+
+            st.subheader("🔢 Prediction Probabilities")
+            col_a, col_b = st.columns(2)
+            col_a.metric("Employed Probability", f"{employed_proba*100:.1f} %")
+            col_b.metric("Unemployed Probability", f"{(1 - employed_proba)*100:.1f} %")
+
+            st.caption("⚙️ Model: CatBoostClassifier | Based on academic and demographic inputs")
+
+        # -----------------------------
+        # 8. Batch Scoring
+        # -----------------------------
+        st.divider()
+        st.header("📦 Batch Scoring")
+        st.markdown("Score a whole intake at once, from a file or straight from `ITIExaminationSystem`. "
+                    "Needs the columns `student_faculty_grade`, `student_iti_status`, `total_grade` and `grade_bucket`; "
+                    "any other columns (e.g. `student_id`) are kept in the output.")
+
+        batch_source = st.radio("Students from", ["📄 CSV / Parquet file", "🗄️ SQL query"], horizontal=True)
+        if batch_source == "📄 CSV / Parquet file":
+            uploaded = st.file_uploader("Upload students", type=["csv", "parquet"])
+            batches = (lambda: read_batches(uploaded, BATCH_ROWS)) if uploaded is not None else None
+        else:
+            # grade_bucket isn't stored in the database; quartiles of total_grade stand in for it
+            batch_sql = st.text_area("Query (ITIExaminationSystem)", height=260, value="""SELECT
+    s.Student_ID,
+    s.Student_Faculty_Grade,
+    s.Student_ITI_Status,
+    SUM(sea.Student_Grade) AS total_grade,
+    CASE NTILE(4) OVER (ORDER BY SUM(sea.Student_Grade))
+        WHEN 1 THEN 'Low' WHEN 2 THEN 'Medium' WHEN 3 THEN 'High' ELSE 'Top'
+    END AS grade_bucket
+FROM Student AS s
+INNER JOIN Student_Exam_Answer AS sea ON sea.Student_ID = s.Student_ID
+GROUP BY s.Student_ID, s.Student_Faculty_Grade, s.Student_ITI_Status""")
+            def batches():
+                # Rows are scored as they come off the cursor, BATCH_ROWS at a time
+                with closing(iter_sql_chunks(batch_sql, "ITIExaminationSystem", chunk_rows=BATCH_ROWS)) as result:
+                    for _, chunk in result:
+                        yield chunk
+
+        if st.button("🚀 Score Students", use_container_width=True, disabled=batches is None):
+            status = st.empty()
+            chunks, rows, started = [], 0, time.perf_counter()
+            try:
+                with closing(batches()) as source:
+                    for batch in source:
+                        if batch.empty:
+                            continue
+                        scored = score_employment(batch)
+                        chunks.append(scored)
+                        rows += len(scored)
+                        status.text(f"⚙️ {rows:,} students scored...")
+                status.empty()
+                if chunks:
+                    st.session_state.employment_batch = {"df": pd.concat(chunks, ignore_index=True),
+                                                         "seconds": time.perf_counter() - started}
+                else:
+                    st.warning("⚠️ No students to score.")
+            except Exception as e:
+                status.empty()
+                st.error(f"❌ Batch scoring failed: {e}")
+
+        batch = st.session_state.get("employment_batch")
+        if batch is not None:
+            batch_df = batch["df"]
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("Students Scored", f"{len(batch_df):,}")
+            col_b.metric("Likely Employed", f"{batch_df[LABEL_COLUMN].mean()*100:.1f} %")
+            col_c.metric("Throughput", f"{len(batch_df) / max(batch['seconds'], 1e-9):,.0f} rows/sec")
+            st.dataframe(batch_df.head(SQL_PAGE_ROWS))
+            st.caption(f"Showing {min(len(batch_df), SQL_PAGE_ROWS):,} of {len(batch_df):,} rows · read and scored in {batch['seconds']:.2f}s")
+
+            # The files are only built when a download button is clicked
+            col_csv, col_parquet = st.columns(2)
+            col_csv.download_button("⬇️ Download CSV", lambda: batch_df.to_csv(index=False).encode("utf-8"),
+                                    file_name="employment_scores.csv", mime="text/csv", use_container_width=True)
+            col_parquet.download_button("⬇️ Download Parquet", lambda: batch_df.to_parquet(index=False),
+                                        file_name="employment_scores.parquet", mime="application/octet-stream",
+                                        use_container_width=True)
 
 # =====================================================================
 # 🤖 TAB 4: Student Grade Predictor
 # =====================================================================
 with tab4:
-        
-    st.markdown("<h2 style='text-align:center;'>🤖 Student Grade Predictor</h2>", unsafe_allow_html=True)
-    st.markdown("<p style='text-align:center;'>Use this app to predict a student's final grade based on their academic and demographic profile.</p>", unsafe_allow_html=True)
-    st.divider()
-
-    # -----------------------------
-    # 1. Load Model
-    # -----------------------------
-    @st.cache_resource
-    def load_grade_model():
-        # Load the pipeline we just built
-        try:
-            model = joblib.load("iti_grade_predictor_pipeline.pkl")
-            return model
-        except FileNotFoundError:
-            st.error("Model file 'iti_grade_predictor_pipeline.pkl' not found.")
-            st.stop()
-        except Exception as e:
-            st.error(f"Error loading model: {e}")
-            st.stop()
+    if tab4.open:
+        import joblib
+        from grade_predictor import (FACULTY_GRADE_MAP, BRANCH_NAMES, MIN_GRADE, MAX_GRADE,
+                                     predict_grades, read_students)
 
-    model = load_grade_model()
-
-    # -----------------------------
-    # 2. Helper Functions & Mappings
-    # -----------------------------
+        st.markdown("<h2 style='text-align:center;'>🤖 Student Grade Predictor</h2>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align:center;'>Use this app to predict a student's final grade based on their academic and demographic profile.</p>", unsafe_allow_html=True)
+        st.divider()
 
-    # This mapping is CRITICAL. Our pipeline expects the mapped number.
-    FACULTY_GRADE_MAP = {'Excellent': 0, 'Very Good': 1, 'Good': 2, 'Pass': 3}
-    
-    # --- IMPORTANT: Update this list with all your real branch names ---
-    BRANCH_NAMES = ['Sohag', 'Smart Village', 'Zagazig', 'Damanhour', 'Qena', 'Tanta',
-       'El Menoufia', 'El Mansoura', 'Aswan', 'El Minia',
-       'Cairo University', 'Ismailia', 'New Capital', 'Beni Sweif',
-       'El Fayoum', 'Alexandria', 'Assiut', 'Port Said', 'New Valley',
-       'Benha', 'Al Arish']
-    
-    # This function is CRITICAL. Our pipeline expects the 'faculty_group' feature.
-    def faculty_group(faculty):
-        stem = ['Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems', 'Faculty of Science']
-        business = ['Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Economics and Political Science']
-        arts = ['Faculty of Fine Arts', 'Faculty of Applied Arts', 'Faculty of Arts']
-        applied = ['Faculty of Agriculture', 'Faculty of Education']
-        if faculty in stem:
-            return 'STEM'
-        elif faculty in business:
-            return 'Business'
-        elif faculty in arts:
-            return 'Arts'
-        elif faculty in applied:
-            return 'Applied'
-        else:
-            return 'Other'
-
-    # -----------------------------
-    # 3. Input Section (MODIFIED)
-    # -----------------------------
-    st.header("📋 Student Profile")
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-        student_faculty = st.selectbox("Faculty", [
-            'Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems',
-            'Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Agriculture',
-            'Faculty of Science', 'Faculty of Fine Arts', 'Faculty of Applied Arts',
-            'Faculty of Arts', 'Faculty of Economics and Political Science', 'Faculty of Education'
-        ], key="grade_faculty") # Added key to avoid widget collision
+        # -----------------------------
+        # 1. Load Model
+        # -----------------------------
+        @st.cache_resource
+        def load_grade_model():
+            # Load the pipeline we just built
+            try:
+                model = joblib.load("iti_grade_predictor_pipeline.pkl")
+                return model
+            except FileNotFoundError:
+                st.error("Model file 'iti_grade_predictor_pipeline.pkl' not found.")
+                st.stop()
+            except Exception as e:
+                st.error(f"Error loading model: {e}")
+                st.stop()
+
+        def predict_grade_rows(df):
+            # The pipeline is only loaded in this process if the inference server isn't used or can't answer
+            return predict_with_service("grade", df, lambda: predict_grades(load_grade_model(), df))
+
+        # -----------------------------
+        # 2. Helper Functions & Mappings
+        # -----------------------------
+        # BRANCH_NAMES and the faculty groups live in grade_predictor.py (FACULTY_GRADE_MAP in
+        # predictor_common.py), shared with batch prediction. The pipeline expects the mapped faculty grade
+        # and the 'faculty_group' feature.
+
+        # -----------------------------
+        # 3. Input Section (MODIFIED)
+        # -----------------------------
+        st.header("📋 Student Profile")
+
+        col1, col2 = st.columns(2)
+
+        with col1:
+            student_faculty = st.selectbox("Faculty", [
+                'Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems',
+                'Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Agriculture',
+                'Faculty of Science', 'Faculty of Fine Arts', 'Faculty of Applied Arts',
+                'Faculty of Arts', 'Faculty of Economics and Political Science', 'Faculty of Education'
+            ], key="grade_faculty") # Added key to avoid widget collision
         
-        student_gender = st.selectbox("Gender", ['Male', 'Female'], key="grade_gender")
+            student_gender = st.selectbox("Gender", ['Male', 'Female'], key="grade_gender")
         
-        # --- NEW INPUT ---
-        branch_name = st.selectbox("Branch Name", BRANCH_NAMES)
+            # --- NEW INPUT ---
+            branch_name = st.selectbox("Branch Name", BRANCH_NAMES)
         
-    with col2:
-        student_faculty_grade_str = st.selectbox("Faculty Grade", list(FACULTY_GRADE_MAP.keys()), key="grade_faculty_grade")
+        with col2:
+            student_faculty_grade_str = st.selectbox("Faculty Grade", list(FACULTY_GRADE_MAP.keys()), key="grade_faculty_grade")
         
-        student_marital_status = st.selectbox("Marital Status", ['Single', 'Married'], key="grade_marital_status")
+            student_marital_status = st.selectbox("Marital Status", ['Single', 'Married'], key="grade_marital_status")
 
-        year_str = st.selectbox("Year", ['2023', '2024'])
+            year_str = st.selectbox("Year", ['2023', '2024'])
 
-    st.divider()
+        st.divider()
     
-    # -----------------------------
-    # 4. Prepare input for prediction (MODIFIED)
-    # -----------------------------
-
-    try:
-        faculty_grade_num = FACULTY_GRADE_MAP[student_faculty_grade_str]
-        faculty_group_str = faculty_group(student_faculty)
-        # We don't need 'year_str = str(year_num)' anymore
-
-        # Create the dictionary that matches our pipeline's feature names
-        input_dict = {
-            "student_faculty_grade": [faculty_grade_num],
+        # -----------------------------
+        # 4. Prepare input for prediction (MODIFIED)
+        # -----------------------------
+        # Raw values; predict_grades() maps the faculty grade, adds faculty_group and makes year an integer
+        input_df = pd.DataFrame({
+            "student_faculty": [student_faculty],
+            "student_faculty_grade": [student_faculty_grade_str],
             "student_gender": [student_gender],
             "student_marital_status": [student_marital_status],
-            "faculty_group": [faculty_group_str],
-            "branch_name": [branch_name], 
-            "year": [year_str]          # --- This now uses the selectbox value directly ---
-        }
-
-        input_df = pd.DataFrame(input_dict)
-    except Exception as e:
-        st.error(f"Error preparing input data: {e}")
-        st.stop()
-
-
-    # -----------------------------
-    # 5. Prediction Section (MODIFIED)
-    # -----------------------------
-    if st.button("🔍 Predict Final Grade", use_container_width=True):
-        with st.spinner("Calculating grade..."):
-            
-            # --- DEFINE YOUR REAL MIN/MAX GRADE ---
-            TOTAL_MIN_GRADE = 0.0
-            TOTAL_MAX_GRADE = 120.0 # 12 subjects * 10 marks
-            
-            # Use the pipeline to predict. It handles all preprocessing.
-            prediction_raw = model.predict(input_df)[0] # [0] to get the single value
-
-            # --- Clamp the prediction to the realistic 0-120 range ---
-            prediction_clamped = max(TOTAL_MIN_GRADE, min(prediction_raw, TOTAL_MAX_GRADE))
-            
-            # --- Calculate percentage ---
-            prediction_percentage = (prediction_clamped / TOTAL_MAX_GRADE) * 100
-
-        st.divider()
-        st.header("📊 Predicted Grade")
-
-        # --- NEW: Show percentage and raw score in columns ---
-        col_res_1, col_res_2 = st.columns(2)
+            "branch_name": [branch_name],
+            "year": [year_str],
+        })
+
+        # -----------------------------
+        # 5. Prediction Section (MODIFIED)
+        # -----------------------------
+        if st.button("🔍 Predict Final Grade", use_container_width=True):
+            with st.spinner("Calculating grade..."):
+                try:
+                    # The pipeline handles all preprocessing; the result is clamped to the realistic 0-120 range
+                    prediction = predict_grade_rows(input_df).iloc[0]
+                except Exception as e:
+                    st.error(f"Error preparing input data: {e}")
+                    st.stop()
+                prediction_raw = prediction["raw_grade"]
+                prediction_clamped = prediction["predicted_grade"]
+                prediction_percentage = prediction["predicted_percentage"]
+
+            st.divider()
+            st.header("📊 Predicted Grade")
+
+            # --- NEW: Show percentage and raw score in columns ---
+            col_res_1, col_res_2 = st.columns(2)
         
-        with col_res_1:
-            # Display the percentage result in a clean metric box
-            st.metric(label="Predicted Grade (Percentage)", value=f"{prediction_percentage:.1f} %")
+            with col_res_1:
+                # Display the percentage result in a clean metric box
+                st.metric(label="Predicted Grade (Percentage)", value=f"{prediction_percentage:.1f} %")
         
-        with col_res_2:
-            # Display the raw score
-            st.metric(label="Predicted Score (out of 120)", value=f"{prediction_clamped:.1f} pts")
+            with col_res_2:
+                # Display the raw score
+                st.metric(label="Predicted Score (out of 120)", value=f"{prediction_clamped:.1f} pts")
 
         
-        st.success(f"The model predicts a final grade of **{prediction_clamped:.1f} / {TOTAL_MAX_GRADE}**.")
+            st.success(f"The model predicts a final grade of **{prediction_clamped:.1f} / {MAX_GRADE}**.")
 
-        # Show a warning if the model's raw prediction was unrealistic
-        if prediction_raw != prediction_clamped:
-            st.warning(f"Note: The model's raw prediction was {prediction_raw:.1f}, "
-                       f"but it has been capped to the realistic range of {TOTAL_MIN_GRADE}-{TOTAL_MAX_GRADE}.")
\ No newline at end of file
+            # Show a warning if the model's raw prediction was unrealistic
+            if prediction_raw != prediction_clamped:
+                st.warning(f"Note: The model's raw prediction was {prediction_raw:.1f}, "
+                           f"but it has been capped to the realistic range of {MIN_GRADE}-{MAX_GRADE}.")
+
+        # -----------------------------
+        # 6. Batch Prediction
+        # -----------------------------
+        st.divider()
+        st.header("📦 Batch Prediction")
+        st.markdown("Upload one row per student with `student_faculty`, `student_faculty_grade`, `student_gender`, "
+                    "`student_marital_status`, `branch_name` and `year`; any other columns (e.g. `student_id`) are kept.")
+
+        grade_upload = st.file_uploader("Upload students", type=["csv", "parquet"], key="grade_upload")
+        if st.button("🚀 Predict Grades", use_container_width=True, disabled=grade_upload is None):
+            try:
+                with st.spinner("Predicting grades..."):
+                    started = time.perf_counter()
+                    st.session_state.grade_batch = {"df": predict_grade_rows(read_students(grade_upload)),
+                                                    "seconds": time.perf_counter() - started}
+            except Exception as e:
+                st.error(f"❌ Batch prediction failed: {e}")
+
+        batch = st.session_state.get("grade_batch")
+        if batch is not None:
+            batch_df = batch["df"]
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("Students Predicted", f"{len(batch_df):,}")
+            col_b.metric("Average Predicted Grade", f"{batch_df['predicted_grade'].mean():.1f} / {MAX_GRADE:g}")
+            col_c.metric("Throughput", f"{len(batch_df) / max(batch['seconds'], 1e-9):,.0f} rows/sec")
+            clamped = int((batch_df["raw_grade"] != batch_df["predicted_grade"]).sum())
+            if clamped:
+                st.warning(f"Note: {clamped:,} predictions were capped to the realistic range of {MIN_GRADE}-{MAX_GRADE}.")
+            st.dataframe(batch_df.head(SQL_PAGE_ROWS))
+            st.caption(f"Showing {min(len(batch_df), SQL_PAGE_ROWS):,} of {len(batch_df):,} rows · read and predicted in {batch['seconds']:.2f}s")
+
+            # The files are only built when a download button is clicked
+            col_csv, col_parquet = st.columns(2)
+            col_csv.download_button("⬇️ Download CSV", lambda: batch_df.to_csv(index=False).encode("utf-8"),
+                                    file_name="grade_predictions.csv", mime="text/csv", use_container_width=True,
+                                    key="grade_csv")
+            col_parquet.download_button("⬇️ Download Parquet", lambda: batch_df.to_parquet(index=False),
+                                        file_name="grade_predictions.parquet", mime="application/octet-stream",
+                                        use_container_width=True, key="grade_parquet")
+
+
+record_rerun_timing(st.session_state.get("main_tab", ""))
+if RERUN_TIMING_LOG:
+    with st.expander("⏱️ Rerun timings"):
+        st.dataframe(rerun_timing_report(), use_container_width=True)
+        st.markdown("**SQL connection pool**")
+        st.dataframe(get_sql_pool().stats(), use_container_width=True)
+        st.markdown("**Text-to-SQL pipeline**")
+        st.dataframe(text_to_sql_report(), use_container_width=True)
+        if get_inference_client() is not None:
+            st.markdown("**Model inference service**")
+            st.dataframe(pd.DataFrame([get_inference_client().stats()]), use_container_width=True)
+        st.markdown("**Query result cache**")
+        st.dataframe(pd.DataFrame([get_query_cache().stats()]), use_container_width=True)
+        col_exam, col_dw = st.columns(2)
+        if col_exam.button("🧹 Clear ITIExaminationSystem results"):
+            get_query_cache().invalidate("ITIExaminationSystem")
+        if col_dw.button("🧹 Clear ITI_DW results"):
+            get_query_cache().invalidate("ITI_DW")
@@ -4,7 +4,13 @@ import pandas as pd
 from pathlib import Path
 import tempfile
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import base64
+import hashlib
+from io import BytesIO
+from urllib.parse import quote
+from PIL import Image
 import os
 import re
 #from dotenv import load_dotenv
@@ -14,9 +20,14 @@ import re
 import time
 import random
 import json
-from pbixray import PBIXRay
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 
 
+rerun_started = time.perf_counter()
+
 # --- Page setup (set ONCE) ---
 st.set_page_config(
     page_title="ITI Examination System Dashboard",
@@ -27,33 +38,80 @@ st.set_page_config(
 # ------------------------------
 # BACKGROUND IMAGE SETUP
 # ------------------------------
-def get_base64_of_bin_file(bin_file):
-    if bin_file.startswith(("http://", "https://")):
-        # If it's a URL, download the content
-        try:
-            response = requests.get(bin_file)
-            response.raise_for_status() # Raise exception for bad status codes
-            data = response.content
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error: Could not download background image from URL: {e}")
-            return None
-    else:
-        # If it's a local path
-        if not os.path.exists(bin_file):
-            st.error(f"Error: Background image file not found at {bin_file}")
-            return None
-        with open(bin_file, 'rb') as f:
-            data = f.read()
+APP_DIR = Path(__file__).parent
+STATIC_DIR = APP_DIR / "static" # Served at app/static/ when server.enableStaticServing is on
+ASSET_BASE_URL = "https://raw.githubusercontent.com/ibrahim-98-7/ITI-App-/main/Streamlit%20App/static/"
+BACKGROUND_FILE = "ITI_Background17601951402362703.png"
+LOGO_FILE = "Gemini_Generated_Image_pwn1v3p13472503787887624.png"
+
+# "static": reference images by URL so the browser downloads them once and caches them
+# "inline": embed them in the page as base64 data URIs
+ASSET_MODE = os.getenv("ASSET_MODE", "static")
+ASSET_SIZE_BUDGET_KB = int(os.getenv("ASSET_SIZE_BUDGET_KB", "512")) # Per image, as sent to the browser
+
+def read_asset_bytes(file_name):
+    # Uses the copy in ./static and only falls back to GitHub when the app was deployed without its images
+    local_path = STATIC_DIR / file_name
+    if local_path.exists():
+        return local_path.read_bytes()
+    response = requests.get(ASSET_BASE_URL + quote(file_name), timeout=10)
+    response.raise_for_status() # Raise exception for bad status codes
+    return response.content
+
+def encode_webp(data, max_width):
+    try:
+        img = Image.open(BytesIO(data))
+        img.thumbnail((max_width, max_width * 4)) # Keeps aspect ratio, never upscales
+        buffer = BytesIO()
+        img.save(buffer, format="WEBP", quality=80)
+        return buffer.getvalue()
+    except Exception as e:
+        print(f"Could not re-encode image as WebP, serving the original: {e}")
+        return None
+
+@st.cache_resource(show_spinner=False)
+def load_image_asset(file_name, max_width):
+    """Resolve an image once per process into something a page can reference.
+
+    In static mode the downscaled WebP is written next to the original under a
+    content-hashed name, so its URL never changes meaning and browsers can keep it.
+    Otherwise the image is inlined as a data URI. Returns (src, size_bytes).
+    """
+    data = read_asset_bytes(file_name)
+    webp = encode_webp(data, max_width)
+
+    if ASSET_MODE == "static" and st.get_option("server.enableStaticServing"):
+        if webp:
+            hashed_name = f"{Path(file_name).stem}.{hashlib.sha256(webp).hexdigest()[:12]}.webp"
+            try:
+                if not (STATIC_DIR / hashed_name).exists():
+                    (STATIC_DIR / hashed_name).write_bytes(webp)
+                return f"app/static/{hashed_name}", len(webp)
+            except OSError as e:
+                print(f"Could not write {hashed_name}, serving the original: {e}")
+        if (STATIC_DIR / file_name).exists():
+            return f"app/static/{quote(file_name)}?v={hashlib.sha256(data).hexdigest()[:12]}", len(data)
+
+    payload, mime = (webp, "image/webp") if webp else (data, "image/png")
+    return f"data:{mime};base64,{base64.b64encode(payload).decode()}", len(payload)
+
+def check_asset_budget(file_name, size):
+    # Fail fast instead of quietly shipping an oversized image to every visitor
+    if size > ASSET_SIZE_BUDGET_KB * 1024:
+        st.error(f"Asset {file_name} is {size / 1024:.0f} KB, over the {ASSET_SIZE_BUDGET_KB} KB budget (ASSET_SIZE_BUDGET_KB).")
+        st.stop()
 
-    return base64.b64encode(data).decode()
-def set_background(png_file):
-    bin_str = get_base64_of_bin_file(png_file)
-    if bin_str is None:
+def set_background(file_name):
+    try:
+        bg_src, bg_size = load_image_asset(file_name, max_width=1920)
+    except (OSError, requests.exceptions.RequestException) as e:
+        st.error(f"Error: Could not load background image {file_name}: {e}")
         return
+    check_asset_budget(file_name, bg_size)
     page_bg_img = f"""
     <style>
     .stApp {{
-        background-image: url("data:image/png;base64,{bin_str}");
+        background-image: url("{bg_src}");
         background-size: cover;
         background-position: center;
         background-repeat: no-repeat;
@@ -64,7 +122,7 @@ def set_background(png_file):
     st.markdown(page_bg_img, unsafe_allow_html=True)
 
 
-set_background("https://raw.githubusercontent.com/ibrahim-98-7/ITI-App-/main/Streamlit%20App/ITI_Background17601951402362703.png")
+set_background(BACKGROUND_FILE)
 # ------------------------------
 # UNIFIED CSS STYLING
 # ------------------------------
@@ -121,38 +179,44 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# Try to import pbixray
-try:
-    from pbixray import PBIXRay
-except ImportError:
-    st.error("Could not import `pbixray`. Please install it using: `pip install pbixray`")
-    st.stop()
+# ------------------------------
+# RERUN TIMING
+# ------------------------------
+RERUN_TIMING_LOG = os.getenv("RERUN_TIMING_LOG", "0") == "1" # Print one line per rerun to the server log
+
+@st.cache_resource
+def get_rerun_timings():
+    # Shared by all sessions: (tab, ms) for the most recent reruns
+    return deque(maxlen=500)
+
+def record_rerun_timing(tab_name):
+    """Record how long this rerun took. Reruns cut short by st.stop()/st.rerun() are not counted."""
+    elapsed_ms = (time.perf_counter() - rerun_started) * 1000
+    get_rerun_timings().append((tab_name, elapsed_ms))
+    if RERUN_TIMING_LOG:
+        print(f"Rerun [{tab_name}]: {elapsed_ms:.1f} ms")
+
+def rerun_timing_report():
+    df = pd.DataFrame(list(get_rerun_timings()), columns=["Tab", "ms"])
+    if df.empty:
+        return df
+    return df.groupby("Tab")["ms"].agg(
+        Reruns="count", Mean_ms="mean", P95_ms=lambda s: s.quantile(0.95), Max_ms="max"
+    ).round(1).reset_index()
+
 
 # ------------------------------
 # LOGO SETUP
 # ------------------------------
-def get_base64_image(image_path):
-    if image_path.startswith(("http://", "https://")):
-        try:
-            response = requests.get(image_path)
-            response.raise_for_status()
-            return base64.b64encode(response.content).decode()
-        except requests.exceptions.RequestException as e:
-            st.error(f"Error: Could not download logo from URL: {e}")
-            return ""
-    else:
-        # Local file path logic
-        if not os.path.exists(image_path):
-            st.error(f"Error: Logo file not found at {image_path}")
-            return ""
-        with open(image_path, "rb") as img_file:
-            return base64.b64encode(img_file.read()).decode()
-
-logo_path = "https://raw.githubusercontent.com/ibrahim-98-7/ITI-App-/main/Streamlit%20App/Gemini_Generated_Image_pwn1v3p13472503787887624.png"
-logo_base64 = get_base64_image(logo_path)
+try:
+    logo_src, logo_size = load_image_asset(LOGO_FILE, max_width=480) # Shown at 160px high
+    check_asset_budget(LOGO_FILE, logo_size)
+except (OSError, requests.exceptions.RequestException) as e:
+    st.error(f"Error: Could not load logo {LOGO_FILE}: {e}")
+    logo_src = ""
 
 # --- Header ---
-if logo_base64: # Only show header if logo was found
+if logo_src: # Only show header if logo was found
     st.markdown(
         f"""
         <style>
@@ -177,7 +241,7 @@ if logo_base64: # Only show header if logo was found
         </style>
 
         <div class="header-container">
-            <img src="data:image/png;base64,{logo_base64}" alt="Logo">
+            <img src="{logo_src}" alt="Logo">
             <div class="header-title">🎓 ITI Examination System Web Application</div>
         </div>
         """,
@@ -185,217 +249,517 @@ if logo_base64: # Only show header if logo was found
     )
 
 # --- Session state ---
-if 'pbi_model' not in st.session_state:
-    st.session_state.pbi_model = None
+if 'pbi_tables' not in st.session_state:
+    st.session_state.pbi_tables = None
 if 'file_path' not in st.session_state:
     st.session_state.file_path = ""
 
 # --- Tabs ---
+# on_change="rerun" makes the tabs stateful: each tab's .open tells us whether it is
+# selected, so only that tab's code (and its loaders) runs on a rerun.
 FireBase, SSRS_Report, tab_dashboard, tab_inspector = st.tabs([
     "✏️ Examination ",
     "📝 SSRS Report",
     "📊 Visualization Dashboards",
     "🧩 PBIX Inspector"
     
-])
+], key="main_tab", on_change="rerun")
 
 # =====================================================================
 # 🔷 COMBINED TAB 1: Power BI & Tableau (with toggle)
 # =====================================================================
 with tab_dashboard:
-    st.markdown("<h2 style='text-align:center;'>📊 ITI Examination System Dashboards</h2>", unsafe_allow_html=True)
-    st.divider()
-
-    # Let the user choose which dashboard to view
-    dashboard_choice = st.radio(
-        "Select a dashboard to view:",
-        ("Power BI Dashboard", "Tableau Dashboard"),
-        horizontal=True
-    )
-
-    # POWER BI SECTION
-    if dashboard_choice == "Power BI Dashboard":
-        st.markdown("<h3 style='text-align:center;'>📊 Power BI Dashboard</h3>", unsafe_allow_html=True)
-        report_url = "https://app.powerbi.com/reportEmbed?reportId=f4db1c94-1880-4411-9985-631532e8a5db&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107"
-        components.iframe(report_url, height=850, scrolling=True)
-        st.info("This is a live Power BI report. You can interact with filters and visuals directly.")
-
-    # ========================
-    # --- TABLEAU SECTION ---
-    # ========================
-    elif dashboard_choice == "Tableau Dashboard":
-        st.markdown("<h3 style='text-align:center;'>📈 Tableau Dashboards</h3>", unsafe_allow_html=True)
-        
-        # --- Nested selection for the three Tableau dashboards ---
-        tableau_selection = st.selectbox(
-            "Select a Tableau dashboard to display:",
-            ( "Failure Dashboard", "Employee And Freelance")
+    if tab_dashboard.open:
+        st.markdown("<h2 style='text-align:center;'>📊 ITI Examination System Dashboards</h2>", unsafe_allow_html=True)
+        st.divider()
+
+        # Let the user choose which dashboard to view
+        dashboard_choice = st.radio(
+            "Select a dashboard to view:",
+            ("Power BI Dashboard", "Tableau Dashboard"),
+            horizontal=True
         )
 
-        # --- 2. Failure Dashboard (Responsive-Width) ---
-        if tableau_selection == "Failure Dashboard":
-            # URL from your embed code's 'path' parameter
-            tableau_url = "https://public.tableau.com/shared/Y6FYPWHXT?:showVizHome=no&:embed=true"
-            # Height based on your embed script's min/max values (887-987)
-            DASH_HEIGHT = 900 
-
-            iframe_html = f"""
+        # POWER BI SECTION
+        if dashboard_choice == "Power BI Dashboard":
+            st.markdown("<h3 style='text-align:center;'>📊 Power BI Dashboard</h3>", unsafe_allow_html=True)
+            report_url = "https://app.powerbi.com/reportEmbed?reportId=f4db1c94-1880-4411-9985-631532e8a5db&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107"
+            components.iframe(report_url, height=850, scrolling=True)
+            st.info("This is a live Power BI report. You can interact with filters and visuals directly.")
+
+        # ========================
+        # --- TABLEAU SECTION ---
+        # ========================
+        elif dashboard_choice == "Tableau Dashboard":
+            st.markdown("<h3 style='text-align:center;'>📈 Tableau Dashboards</h3>", unsafe_allow_html=True)
+        
+            # --- Nested selection for the three Tableau dashboards ---
+            tableau_selection = st.selectbox(
+                "Select a Tableau dashboard to display:",
+                ( "Failure Dashboard", "Employee And Freelance")
+            )
+
+            # --- 2. Failure Dashboard (Responsive-Width) ---
+            if tableau_selection == "Failure Dashboard":
+                # URL from your embed code's 'path' parameter
+                tableau_url = "https://public.tableau.com/shared/Y6FYPWHXT?:showVizHome=no&:embed=true"
+                # Height based on your embed script's min/max values (887-987)
+                DASH_HEIGHT = 900 
+
+                iframe_html = f"""
             <div style="width:100%; height:{DASH_HEIGHT}px; border-radius:12px; overflow:hidden;">
                 <iframe src="{tableau_url}" width="100%" height="100%" frameborder="0" style="border-radius:12px;"></iframe>
             </div>
             """
-            components.html(iframe_html, height=DASH_HEIGHT + 20)
-            st.info("This view is published from Tableau Public.")
+                components.html(iframe_html, height=DASH_HEIGHT + 20)
+                st.info("This view is published from Tableau Public.")
 
-        # --- 3. Employee And Freelance (Responsive-Width) ---
-        elif tableau_selection == "Employee And Freelance":
-            # URL from your embed code's 'name' parameter
-            tableau_url = "https://public.tableau.com/views/ITIGraduationProject/EmployeeAndFreelance?:showVizHome=no&:embed=true"
-            # Height based on your embed script's min/max values
-            DASH_HEIGHT = 900 
+            # --- 3. Employee And Freelance (Responsive-Width) ---
+            elif tableau_selection == "Employee And Freelance":
+                # URL from your embed code's 'name' parameter
+                tableau_url = "https://public.tableau.com/views/ITIGraduationProject/EmployeeAndFreelance?:showVizHome=no&:embed=true"
+                # Height based on your embed script's min/max values
+                DASH_HEIGHT = 900 
 
-            iframe_html = f"""
+                iframe_html = f"""
             <div style="width:100%; height:{DASH_HEIGHT}px; border-radius:12px; overflow:hidden;">
                 <iframe src="{tableau_url}" width="100%" height="100%" frameborder="0" style="border-radius:12px;"></iframe>
             </div>
             """
-            components.html(iframe_html, height=DASH_HEIGHT + 20)
-            st.info("This view is published from Tableau Public.")
+                components.html(iframe_html, height=DASH_HEIGHT + 20)
+                st.info("This view is published from Tableau Public.")
 
 # =====================================================================
 # 🧩 TAB 2: PBIX Inspector
 # =====================================================================
 with tab_inspector:
-    st.markdown("<h2 style='text-align:center;'>🧠 PBIX Model Inspector</h2>", unsafe_allow_html=True)
-    st.markdown("<p style='text-align:center;'>Automatically analyzes your ITI Examination System Power BI model.</p>", unsafe_allow_html=True)
-    st.divider()
-    github_pbix_url = (
-        "https://github.com/Ahmed-Arab95734/Graduation-Project-ITI-Examination-System/"
-        "raw/main/Ibrahim/Streamlit%20Application/ITI_Dashboard_Graduaton_Project.pbix"
-    )
+    if tab_inspector.open:
+        st.markdown("<h2 style='text-align:center;'>🧠 PBIX Model Inspector</h2>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align:center;'>Automatically analyzes your ITI Examination System Power BI model.</p>", unsafe_allow_html=True)
+        st.divider()
+        github_pbix_url = (
+            "https://github.com/Ahmed-Arab95734/Graduation-Project-ITI-Examination-System/"
+            "raw/main/Ibrahim/Streamlit%20Application/ITI_Dashboard_Graduaton_Project.pbix"
+        )
 
-    def auto_load_pbix(url):
-        try:
-            with st.spinner("📥 Downloading PBIX file from GitHub..."):
-                response = requests.get(url)
-                response.raise_for_status()
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pbix") as tmp_file:
-                    tmp_file.write(response.content)
-                    tmp_path = Path(tmp_file.name)
-            with st.spinner("🔍 Analyzing PBIX file..."):
-                model = PBIXRay(tmp_path)
-                st.session_state.pbi_model = model
-                st.session_state.file_path = str(tmp_path)
-            st.success("✅ PBIX file loaded successfully!")
-        except Exception as e:
-            st.error(f"❌ Error loading PBIX file: {e}")
-
-    if st.session_state.pbi_model is None:
-        auto_load_pbix(github_pbix_url)
-
-    if not st.session_state.pbi_model:
-        st.warning("⚠️ PBIX model could not be loaded.")
-    else:
-        model = st.session_state.pbi_model
-        st.success("✅ PBIX model analyzed successfully!")
-
-        # --- DAX Measures ---
-        with st.expander("🧮 DAX Measures", expanded=True):
+        # --- PBIX Caches ---
+        # The PBIX is downloaded once per ETag into a content-addressed disk cache and
+        # parsed once per process, so a new browser session never re-downloads or re-parses it.
+        PBIX_CACHE_DIR = Path(os.getenv("PBIX_CACHE_DIR", Path(tempfile.gettempdir()) / "iti_pbix_cache"))
+        PBIX_CHECK_TTL = int(os.getenv("PBIX_CHECK_TTL", "3600"))  # seconds between ETag checks
+        PBIX_STALE_SECONDS = 24 * 3600
+        PBIX_CHUNK_SIZE = 1024 * 1024
+        PBIX_SHA256 = os.getenv("PBIX_SHA256", "")  # Optional expected hash of the PBIX
+        PBIX_TABLES = ["dax_measures", "power_query", "schema", "relationships"]
+        # Written by extract_pbix_metadata.py; when present, pbixray is never imported
+        PBIX_SIDECAR_DIR = APP_DIR / "pbix_metadata"
+
+        def cleanup_stale_pbix_files(keep):
+            now = time.time()
+            candidates = list(PBIX_CACHE_DIR.glob("*.pbix*"))
+            # Earlier versions leaked one NamedTemporaryFile per session
+            candidates += list(Path(tempfile.gettempdir()).glob("tmp*.pbix"))
+            for path in candidates:
+                try:
+                    if path != keep and now - path.stat().st_mtime > PBIX_STALE_SECONDS:
+                        path.unlink()
+                except OSError as e:
+                    print(f"Could not remove stale PBIX file '{path}': {e}")
+
+        @st.cache_data(ttl=PBIX_CHECK_TTL, show_spinner=False)
+        def resolve_pbix(url):
+            """Map `url` to its cache path for the current ETag. Returns (path, expected_size or None, etag or None)."""
+            PBIX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            url_key = hashlib.sha256(url.encode()).hexdigest()[:16]
             try:
-                dax_df = model.dax_measures
-                st.dataframe(dax_df if not dax_df.empty else pd.DataFrame(["No DAX measures found."]), use_container_width=True)
-            except Exception as e:
-                st.error(f"Error reading DAX: {e}")
-
-        # --- Power Query ---
-        with st.expander("⚙️ Power Query (M) Code"):
+                head = requests.head(url, allow_redirects=True, timeout=10, headers={"Accept-Encoding": "identity"})
+                head.raise_for_status()
+                etag = head.headers.get("ETag", "")
+                size = int(head.headers["Content-Length"]) if "Content-Length" in head.headers else None
+            except requests.exceptions.RequestException as e:
+                # Offline: fall back to the newest copy we already have
+                cached = sorted(PBIX_CACHE_DIR.glob(f"{url_key}-*.pbix"), key=lambda p: p.stat().st_mtime)
+                if cached:
+                    print(f"Could not check PBIX ETag, using cached copy: {e}")
+                    return str(cached[-1]), None, None
+                raise
+
+            path = PBIX_CACHE_DIR / f"{url_key}-{hashlib.sha256(etag.encode()).hexdigest()[:16]}.pbix"
+            cleanup_stale_pbix_files(keep=path)
+            return str(path), size, etag
+
+        @st.cache_resource
+        def get_pbix_download_lock():
+            return threading.Lock()
+
+        def download_pbix(url, path, expected_size, progress=None):
+            """Stream `url` to `path` in chunks, resuming a partial download if one exists.
+
+            Memory stays at one chunk however big the file is. The result is checked
+            against the expected size and, if PBIX_SHA256 is set, its hash before it is
+            moved into place.
+            """
+            part = path.with_suffix(".pbix.part")
+            done = part.stat().st_size if part.exists() else 0
+            if expected_size and done > expected_size:
+                done = 0
+            headers = {"Accept-Encoding": "identity"}
+            if done:
+                headers["Range"] = f"bytes={done}-"
+
+            if not (expected_size and done == expected_size): # Otherwise the .part is already complete
+                with requests.get(url, stream=True, timeout=(10, 60), headers=headers) as response:
+                    if response.status_code == 416 and done:
+                        # The range starts at the end: the .part already holds the whole file,
+                        # unless the server reports a different size (e.g. the file was replaced)
+                        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+                        if total.isdigit() and int(total) != done:
+                            part.unlink(missing_ok=True)
+                            raise IOError(f"Partial PBIX download ({done} bytes) does not match the file ({total} bytes); discarded it, please retry")
+                        expected_size = expected_size or done
+                    else:
+                        response.raise_for_status()
+                        if response.status_code != 206: # Server ignored the range; start over
+                            done = 0
+                        total = expected_size or (done + int(response.headers.get("Content-Length", 0))) or None
+                        with open(part, "ab" if done else "wb") as f:
+                            for chunk in response.iter_content(chunk_size=PBIX_CHUNK_SIZE):
+                                f.write(chunk)
+                                done += len(chunk)
+                                if progress is not None:
+                                    text = f"📥 Downloading PBIX file from GitHub... {done / 2**20:.1f} MB"
+                                    if total:
+                                        progress.progress(min(done / total, 1.0), text=f"{text} of {total / 2**20:.1f} MB")
+                                    else:
+                                        progress.progress(0.0, text=text)
+
+            problem = None
+            if expected_size and done != expected_size:
+                problem = f"size mismatch ({done} bytes, expected {expected_size})"
+            elif PBIX_SHA256:
+                digest = hashlib.sha256()
+                with open(part, "rb") as f:
+                    for chunk in iter(lambda: f.read(PBIX_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                if digest.hexdigest() != PBIX_SHA256.lower():
+                    problem = "SHA-256 mismatch"
+            if problem:
+                part.unlink(missing_ok=True)
+                raise IOError(f"Downloaded PBIX failed the integrity check: {problem}")
+            os.replace(part, path) # Atomic, so concurrent readers never see a half-written file
+
+        @st.cache_resource(show_spinner=False)
+        def load_pbix_tables(path):
+            """Parse the PBIX once per process and keep only the tables the inspector shows."""
+            from pbixray import PBIXRay # Imported here so the sidecar path never pays for it
+            model = PBIXRay(path)
+            tables = {}
+            for name in PBIX_TABLES:
+                try:
+                    tables[name] = getattr(model, name)
+                except Exception as e:
+                    tables[name] = e # Re-raised when that expander is rendered
+            return tables
+
+        @st.cache_resource(show_spinner=False)
+        def load_pbix_sidecar():
+            """(tables, manifest) from PBIX_SIDECAR_DIR, or None if it hasn't been extracted."""
+            if not all((PBIX_SIDECAR_DIR / f"{name}.parquet").exists() for name in PBIX_TABLES):
+                return None
+            manifest_path = PBIX_SIDECAR_DIR / "manifest.json"
+            manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+            return {name: pd.read_parquet(PBIX_SIDECAR_DIR / f"{name}.parquet") for name in PBIX_TABLES}, manifest
+
+        def pbix_sidecar_is_current(manifest, url):
+            # Only a sidecar extracted from this URL has an ETag to compare; one from a local file is trusted
+            if not manifest.get("etag") or manifest.get("source") != url:
+                return True
             try:
-                m_df = model.power_query
-                st.dataframe(m_df if not m_df.empty else pd.DataFrame(["No Power Query found."]), use_container_width=True)
-            except Exception as e:
-                st.error(f"Error reading Power Query: {e}")
-
-        # --- Schema ---
-        with st.expander("🧱 Data Model Schema"):
+                etag = resolve_pbix(url)[2]
+            except requests.exceptions.RequestException:
+                return True # Offline: the sidecar is the best copy there is
+            return etag is None or etag == manifest["etag"]
+
+        def get_pbix_table(tables, name):
+            value = tables[name]
+            if isinstance(value, Exception):
+                raise value
+            return value
+
+        def auto_load_pbix(url):
+            sidecar = load_pbix_sidecar()
+            if sidecar is not None:
+                sidecar_tables, manifest = sidecar
+                if pbix_sidecar_is_current(manifest, url):
+                    st.session_state.pbi_tables = sidecar_tables
+                    st.session_state.file_path = str(PBIX_SIDECAR_DIR)
+                    return
+                print(f"PBIX sidecar extracted {manifest.get('extracted_at')} is stale (ETag changed); parsing the live PBIX")
+                st.info(f"ℹ️ The PBIX changed after `{PBIX_SIDECAR_DIR.name}/` was extracted ({manifest.get('extracted_at', 'unknown date')}). "
+                        "Parsing the live file instead; re-run `extract_pbix_metadata.py` to refresh it.")
             try:
-                schema_df = model.schema
-                st.dataframe(schema_df if not schema_df.empty else pd.DataFrame(["No Schema found."]), use_container_width=True)
+                path, expected_size, _ = resolve_pbix(url)
+                if not Path(path).exists():
+                    with get_pbix_download_lock():
+                        if not Path(path).exists(): # Another session may have just finished it
+                            progress = st.progress(0.0, text="📥 Downloading PBIX file from GitHub...")
+                            download_pbix(url, Path(path), expected_size, progress)
+                            progress.empty()
+                with st.spinner("🔍 Analyzing PBIX file..."):
+                    st.session_state.pbi_tables = load_pbix_tables(path)
+                    st.session_state.file_path = path
+            except ImportError:
+                st.error("Could not import `pbixray`. Please install it using: `pip install pbixray`")
             except Exception as e:
-                st.error(f"Error reading Schema: {e}")
+                st.error(f"❌ Error loading PBIX file: {e}")
 
-        # --- Relationships ---
-        with st.expander("🔗 Model Relationships", expanded=True):
-            try:
-                rel_df = model.relationships
-                if rel_df is not None and not rel_df.empty:
-                    st.dataframe(rel_df, use_container_width=True)
-                else:
-                    st.info("No relationships found in this PBIX model.")
-            except Exception as e:
-                st.error(f"Error reading relationships: {e}")
+        if st.session_state.pbi_tables is None:
+            auto_load_pbix(github_pbix_url)
+
+        if not st.session_state.pbi_tables:
+            st.warning("⚠️ PBIX model could not be loaded.")
+        else:
+            tables = st.session_state.pbi_tables
+            st.success("✅ PBIX model analyzed successfully!")
+            if st.session_state.file_path == str(PBIX_SIDECAR_DIR):
+                extracted_at = load_pbix_sidecar()[1].get("extracted_at", "an unknown date")
+                st.caption(f"📦 Loaded from `{PBIX_SIDECAR_DIR.name}/`, extracted on {extracted_at}.")
+
+            # --- DAX Measures ---
+            with st.expander("🧮 DAX Measures", expanded=True):
+                try:
+                    dax_df = get_pbix_table(tables, "dax_measures")
+                    st.dataframe(dax_df if not dax_df.empty else pd.DataFrame(["No DAX measures found."]), use_container_width=True)
+                except Exception as e:
+                    st.error(f"Error reading DAX: {e}")
+
+            # --- Power Query ---
+            with st.expander("⚙️ Power Query (M) Code"):
+                try:
+                    m_df = get_pbix_table(tables, "power_query")
+                    st.dataframe(m_df if not m_df.empty else pd.DataFrame(["No Power Query found."]), use_container_width=True)
+                except Exception as e:
+                    st.error(f"Error reading Power Query: {e}")
+
+            # --- Schema ---
+            with st.expander("🧱 Data Model Schema"):
+                try:
+                    schema_df = get_pbix_table(tables, "schema")
+                    st.dataframe(schema_df if not schema_df.empty else pd.DataFrame(["No Schema found."]), use_container_width=True)
+                except Exception as e:
+                    st.error(f"Error reading Schema: {e}")
+
+            # --- Relationships ---
+            with st.expander("🔗 Model Relationships", expanded=True):
+                try:
+                    rel_df = get_pbix_table(tables, "relationships")
+                    if rel_df is not None and not rel_df.empty:
+                        st.dataframe(rel_df, use_container_width=True)
+                    else:
+                        st.info("No relationships found in this PBIX model.")
+                except Exception as e:
+                    st.error(f"Error reading relationships: {e}")
 
 
 # =====================================================================
 # 🧮 TAB 3: Firebase Connection And Examination system
 # =====================================================================
 with FireBase:
-  #  load_dotenv()
-
-    # --- Page Configuration & URLs ---
-    st.markdown("<h2 style='text-align:center;'>✏️ ITI Student Exam Portal </h2>", unsafe_allow_html=True)
-    st.markdown("<p style='text-align:center;'>Automatically Generates your ITI Exam.</p>", unsafe_allow_html=True)
-    st.divider()
-
-    # --- Firebase Configuration ---
-    FIREBASE_URL = "https://iti-examination-default-rtdb.firebaseio.com"
-
-
-    if not FIREBASE_URL:
-        st.error("FIREBASE_URL not set in .env")
-        st.stop()
+    if FireBase.open:
+      #  load_dotenv()
+
+        # --- Page Configuration & URLs ---
+        st.markdown("<h2 style='text-align:center;'>✏️ ITI Student Exam Portal </h2>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align:center;'>Automatically Generates your ITI Exam.</p>", unsafe_allow_html=True)
+        st.divider()
+
+        # --- Firebase Configuration ---
+        FIREBASE_URL = os.getenv("FIREBASE_URL", "https://iti-examination-default-rtdb.firebaseio.com")
+        FB_CONNECT_TIMEOUT = float(os.getenv("FB_CONNECT_TIMEOUT", "5"))   # seconds
+        FB_READ_TIMEOUT = float(os.getenv("FB_READ_TIMEOUT", "30"))        # seconds
+        FB_MAX_RETRIES = int(os.getenv("FB_MAX_RETRIES", "3"))
+        FB_POOL_SIZE = int(os.getenv("FB_POOL_SIZE", "20"))                # keep-alive connections per process
+        FB_FETCH_CONCURRENCY = int(os.getenv("FB_FETCH_CONCURRENCY", "4"))  # parallel subtree downloads
+
+
+        if not FIREBASE_URL:
+            st.error("FIREBASE_URL not set in .env")
+            st.stop()
+
+        # --- Shared Firebase Client ---
+        class FirebaseClient:
+            """Keep-alive connection pool to the Firebase REST API, shared by every session.
+
+            Idempotent calls (GET/PUT/PATCH) are retried with exponential backoff; POST is
+            not, since a retried POST would create a second record. Latency and error counts
+            are tracked per top-level path.
+            """
 
-    def fb_url(path):
-        auth ="" # Add auth token if needed: ?auth={token}
-        return f"{FIREBASE_URL.rstrip('/')}/{path}.json{auth}"
-
-    # --- Firebase Helper Functions ---
-    def fb_get(path):
-        url = fb_url(path)
-        try:
-            r = requests.get(url)
-            r.raise_for_status()  # Raise an exception for bad status codes
-            return r.json() or {}
-        except requests.exceptions.RequestException as e:
-            print(f"Error fetching data from Firebase path '{path}': {e}") # Use print for backend errors
-            return {}
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from Firebase path '{path}'. Response was: {r.text}")
-            return {}
+            def __init__(self, base_url, connect_timeout, read_timeout, max_retries, pool_size):
+                self.base_url = base_url.rstrip('/')
+                self.timeout = (connect_timeout, read_timeout)
+                retry = Retry(
+                    total=max_retries,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=frozenset(["GET", "PUT", "PATCH"]),
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+                self.session = requests.Session()
+                self.session.mount("https://", adapter)
+                self.session.mount("http://", adapter)
+                self._stats = {}
+                self._lock = threading.Lock()
+
+            def url(self, path):
+                auth ="" # Add auth token if needed: ?auth={token}
+                return f"{self.base_url}/{path}.json{auth}"
+
+            def request(self, method, path, **kwargs):
+                start = time.perf_counter()
+                ok = False
+                nbytes = 0
+                try:
+                    r = self.session.request(method, self.url(path), timeout=self.timeout, **kwargs)
+                    r.raise_for_status()
+                    ok = True
+                    nbytes = len(r.content)
+                    return r
+                finally:
+                    self._record(path, (time.perf_counter() - start) * 1000, ok, nbytes)
+
+            def _record(self, path, elapsed_ms, ok, nbytes):
+                key = path.split("/")[0] or "/"
+                with self._lock:
+                    s = self._stats.setdefault(key, {"calls": 0, "errors": 0, "bytes": 0, "total_ms": 0.0, "max_ms": 0.0})
+                    s["calls"] += 1
+                    s["errors"] += 0 if ok else 1
+                    s["bytes"] += nbytes
+                    s["total_ms"] += elapsed_ms
+                    s["max_ms"] = max(s["max_ms"], elapsed_ms)
+
+            def stats(self):
+                with self._lock:
+                    rows = [
+                        {"path": key, "calls": s["calls"], "errors": s["errors"], "kb": round(s["bytes"] / 1024, 1),
+                         "avg_ms": round(s["total_ms"] / s["calls"], 1), "max_ms": round(s["max_ms"], 1)}
+                        for key, s in self._stats.items()
+                    ]
+                return pd.DataFrame(rows)
+
+        @st.cache_resource
+        def get_firebase_client():
+            return FirebaseClient(FIREBASE_URL, FB_CONNECT_TIMEOUT, FB_READ_TIMEOUT, FB_MAX_RETRIES, FB_POOL_SIZE)
+
+        fb_client = get_firebase_client()
+
+        # --- Firebase Helper Functions ---
+        def fb_get(path, params=None):
+            try:
+                r = fb_client.request("GET", path, params=params)
+                return r.json() or {}
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON from Firebase path '{path}'. Response was: {r.text}")
+                return {}
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching data from Firebase path '{path}': {e}") # Use print for backend errors
+                return {}
+
+        def fb_post(path, payload):
+            try:
+                return fb_client.request("POST", path, json=payload).json()
+            except requests.exceptions.RequestException as e:
+                print(f"Error posting data to Firebase path '{path}': {e}")
+                return None
 
-    def fb_post(path, payload):
-        url = fb_url(path)
-        try:
-            r = requests.post(url, json=payload)
-            r.raise_for_status()
-            return r.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error posting data to Firebase path '{path}': {e}")
-            return None
+        def fb_put(path, payload):
+            try:
+                return fb_client.request("PUT", path, json=payload).json()
+            except requests.exceptions.RequestException as e:
+                print(f"Error putting data to Firebase path '{path}': {e}")
+                return None
 
-    def fb_put(path, payload):
-        url = fb_url(path)
-        try:
-            r = requests.put(url, json=payload)
-            r.raise_for_status()
-            return r.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Error putting data to Firebase path '{path}': {e}")
-            return None
+        def fb_patch(path, payload):
+            try:
+                return fb_client.request("PATCH", path, json=payload).json()
+            except requests.exceptions.RequestException as e:
+                print(f"Error patching data at Firebase path '{path}': {e}")
+                return None
+
+        # --- Batched Submission ---
+        # Same alphabet Firebase uses for its push IDs, so keys stay chronologically sortable
+        PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+        SUBMIT_BATCH_SIZE = 500 # Max records per multi-location update
+        SUBMIT_MAX_ATTEMPTS = 3
+
+        def generate_push_key():
+            # 8 chars of millisecond timestamp + 12 random chars, like a Firebase push ID
+            now = int(time.time() * 1000)
+            time_chars = []
+            for _ in range(8):
+                time_chars.append(PUSH_CHARS[now % 64])
+                now //= 64
+            rand_chars = [random.choice(PUSH_CHARS) for _ in range(12)]
+            return "".join(reversed(time_chars)) + "".join(rand_chars)
+
+        def fb_submit_batch(path, records, keys=None):
+            """Write all records under `path` with multi-location updates.
+
+            Every record gets a client-generated push key, so a retried write lands on
+            the same key instead of creating a duplicate. A failed chunk is split in half
+            before the next attempt, which narrows retries down to the records that fail.
+            Pass `keys` to write to keys from an earlier call (e.g. a retry from step 4).
+            Returns a list of (push_key, record, ok) tuples in the original order.
+            """
+            keyed = list(zip(keys or [generate_push_key() for _ in records], records))
+            status = {key: False for key, _ in keyed}
+
+            pending = [keyed[i:i + SUBMIT_BATCH_SIZE] for i in range(0, len(keyed), SUBMIT_BATCH_SIZE)]
+            for attempt in range(SUBMIT_MAX_ATTEMPTS):
+                failed = []
+                for chunk in pending:
+                    update = {f"{path}/{key}": rec for key, rec in chunk}
+                    if fb_patch("", update) is None:
+                        failed.append(chunk)
+                    else:
+                        for key, _ in chunk: status[key] = True
+                if not failed or attempt == SUBMIT_MAX_ATTEMPTS - 1:
+                    break
+                pending = []
+                for chunk in failed:
+                    if len(chunk) > 1:
+                        mid = len(chunk) // 2
+                        pending.extend([chunk[:mid], chunk[mid:]])
+                    else:
+                        pending.append(chunk)
+                time.sleep(0.5 * (2 ** attempt))
+
+            return [(key, rec, status[key]) for key, rec in keyed]
+
+        # --- Lookup Indexes ---
+        def build_lookup_indexes(student_courses_map, exams):
+            # Built once per data load so the UI steps never scan the whole institution.
+            # Student_ID has been stored under three spellings; normalize them here.
+            student_course_index = {}
+            for sc in student_courses_map.values():
+                if not isinstance(sc, dict): continue
+                sc_student = sc.get("Student_ID") or sc.get("student_id") or sc.get("StudentID")
+                cid = sc.get("Course_ID")
+                if sc_student is None or cid is None: continue
+                student_course_index.setdefault(str(sc_student), []).append(str(cid))
+
+            course_exam_index = {}
+            for eid, e in exams.items():
+                course_exam_index.setdefault(str(e.get("Course_ID")), []).append(eid)
+
+            return student_course_index, course_exam_index
+
+        # --- Data Loading ---
+        EXAM_DATA_TTL = int(os.getenv("EXAM_DATA_TTL", "300"))  # seconds between staleness checks
+        # Writers bump meta/versions/<subtree> whenever they change that subtree,
+        # so a staleness check is one tiny GET instead of re-downloading the tree.
+        DATA_VERSION_PATH = "meta/versions"
 
-    # --- Data Loading ---
-    @st.cache_resource
-    def load_all_data():
-        # This function runs inside st.spinner, so no need for toasts
         def process_to_id_map(raw_data, id_field_name):
             processed_map = {}
             if isinstance(raw_data, dict):
@@ -412,317 +776,554 @@ with FireBase:
                     else: processed_map[str(idx)] = val
             return processed_map
 
-        courses = process_to_id_map(fb_get("courses"), "Course_ID")
-        exams = process_to_id_map(fb_get("exams"), "Exam_ID")
-        questions = process_to_id_map(fb_get("questions"), "Question_ID")
-
-        student_courses_raw = fb_get("student_courses")
-        student_courses_map = {}
-        if isinstance(student_courses_raw, dict):
-            student_courses_map = student_courses_raw
-        elif isinstance(student_courses_raw, list):
-            for idx, val in enumerate(student_courses_raw):
-                if val: student_courses_map[str(idx)] = val
-        
-        choices = fb_get("choices")
-        
-        def get_as_dict(path):
-            data = fb_get(path)
-            if isinstance(data, dict): return data or {}
-            if isinstance(data, list):
+        def get_as_dict(raw_data, path):
+            if isinstance(raw_data, dict): return raw_data or {}
+            if isinstance(raw_data, list):
                 converted_dict = {}
-                for idx, val in enumerate(data):
+                for idx, val in enumerate(raw_data):
                     if val: converted_dict[str(idx)] = val
                 return converted_dict
-            print(f"Data at path '{path}' was not a dictionary or list. Using empty map.")
+            if raw_data is not None:
+                print(f"Data at path '{path}' was not a dictionary or list. Using empty map.")
             return {}
 
-        exam_questions_grouped = get_as_dict("exam_questions_grouped")
-        choices_by_question = get_as_dict("choices_by_question")
-        
-        return {
-            "courses": courses,
-            "student_courses": student_courses_map,
-            "exams": exams,
-            "questions": questions,
-            "choices": choices,
-            "exam_questions_grouped": exam_questions_grouped,
-            "choices_by_question": choices_by_question
+        # Manifest of the Firebase subtrees the exam UI actually reads.
+        #   keyed_by: "id_map" -> process_to_id_map on id_field, "dict" -> get_as_dict
+        #   load:     "eager" -> part of the process-wide snapshot, "lazy" -> fetched per exam
+        # Anything not listed here (e.g. the flat "choices" tree) is never downloaded.
+        FIREBASE_SUBTREES = {
+            "courses":                {"keyed_by": "id_map", "id_field": "Course_ID",   "load": "eager"},
+            "exams":                  {"keyed_by": "id_map", "id_field": "Exam_ID",     "load": "eager"},
+            "student_courses":        {"keyed_by": "dict",                              "load": "eager"},
+            "exam_questions_grouped": {"keyed_by": "dict",                              "load": "eager"},
+            "questions":              {"keyed_by": "id_map", "id_field": "Question_ID", "load": "lazy"},
+            "choices_by_question":    {"keyed_by": "dict",                              "load": "lazy"},
         }
+        EAGER_SUBTREES = [name for name, spec in FIREBASE_SUBTREES.items() if spec["load"] == "eager"]
+
+        def process_subtree(name, raw_data):
+            spec = FIREBASE_SUBTREES[name]
+            if spec["keyed_by"] == "id_map":
+                return process_to_id_map(raw_data, spec["id_field"])
+            return get_as_dict(raw_data, name)
+
+        def estimate_size(obj, seen=None):
+            # Rough resident size of a JSON-like structure, in bytes
+            seen = set() if seen is None else seen
+            if id(obj) in seen: return 0
+            seen.add(id(obj))
+            size = sys.getsizeof(obj)
+            if isinstance(obj, dict):
+                size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+            elif isinstance(obj, (list, tuple)):
+                size += sum(estimate_size(v, seen) for v in obj)
+            return size
+
+        class ExamDataStore:
+            """Process-wide snapshot of the exam tree with TTL and per-subtree versions.
+
+            Readers always get the last complete snapshot. Once the TTL has passed, the
+            next reader starts a background refresh that refetches only the subtrees whose
+            version changed and then swaps the new snapshot in, so nobody waits on it.
+            """
+
+            def __init__(self, subtrees, process, ttl_seconds):
+                self.subtrees = subtrees
+                self.process = process
+                self.ttl = ttl_seconds
+                self.snapshot = None
+                self.versions = {}
+                self.checked_at = 0.0
+                self.refreshed_at = 0.0
+                self._load_lock = threading.Lock()
+                self._state_lock = threading.Lock()
+                self._refreshing = False
+
+            def get(self):
+                if self.snapshot is None:
+                    with self._load_lock:
+                        if self.snapshot is None:
+                            self._refresh(force=True)
+                elif time.time() - self.checked_at > self.ttl:
+                    self.refresh_in_background()
+                return self.snapshot
+
+            def refresh_in_background(self, force=False):
+                with self._state_lock:
+                    if self._refreshing:
+                        return False
+                    self._refreshing = True
+                threading.Thread(target=self._run_refresh, args=(force,), daemon=True).start()
+                return True
+
+            def is_refreshing(self):
+                return self._refreshing
+
+            def _run_refresh(self, force):
+                try:
+                    with self._load_lock:
+                        self._refresh(force)
+                except Exception as e:
+                    print(f"Background refresh of exam data failed: {e}")
+                finally:
+                    with self._state_lock:
+                        self._refreshing = False
+
+            def _refresh(self, force):
+                remote_versions = fb_get(DATA_VERSION_PATH)
+                if not isinstance(remote_versions, dict): remote_versions = {}
+
+                if force or self.snapshot is None or not remote_versions:
+                    # Without a version node there is no way to tell what changed
+                    changed = list(self.subtrees)
+                else:
+                    changed = [name for name in self.subtrees if remote_versions.get(name) != self.versions.get(name)]
+
+                old = self.snapshot or {}
+                data = dict(old)
+                versions = dict(self.versions)
+                # Subtrees are independent, so download them concurrently on a bounded pool
+                with ThreadPoolExecutor(max_workers=FB_FETCH_CONCURRENCY) as pool:
+                    futures = {name: pool.submit(lambda path: fb_client.request("GET", path).json(), name) for name in changed}
+                for name, future in futures.items():
+                    try:
+                        raw = future.result()
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        print(f"Error fetching data from Firebase path '{name}': {e}")
+                        # Keep serving the previous copy and try again on the next check
+                        data.setdefault(name, self.process(name, None))
+                        versions.pop(name, None)
+                        continue
+                    data[name] = self.process(name, raw)
+                    versions[name] = remote_versions.get(name)
+
+                if "student_courses" in changed or "exams" in changed or not old:
+                    data["student_course_index"], data["course_exam_index"] = build_lookup_indexes(
+                        data["student_courses"], data["exams"])
+
+                self.snapshot = data  # single reference swap; readers see old or new, never half
+                self.versions = versions
+                self.checked_at = time.time()
+                if changed: self.refreshed_at = self.checked_at
+
+        @st.cache_resource
+        def get_exam_data_store():
+            return ExamDataStore(EAGER_SUBTREES, process_subtree, EXAM_DATA_TTL)
+
+        exam_data_store = get_exam_data_store()
+
+        # --- Per-Exam Question Loading ---
+        # The question bank is not part of the snapshot; each attempt only fetches its own questions.
+        EXAM_CACHE_SIZE = int(os.getenv("EXAM_CACHE_SIZE", "64"))  # exams kept in the LRU
+
+        # Unlike fb_get these let request errors through, so a failed fetch is never
+        # cached as a missing question or an empty choice list.
+        def fetch_question(qid):
+            # Indexed query first (needs ".indexOn": ["Question_ID"] in the rules), per-key GET as fallback
+            id_field = FIREBASE_SUBTREES["questions"]["id_field"]
+            value = int(qid) if str(qid).isdigit() else str(qid)
+            try:
+                found = fb_client.request("GET", "questions", params={"orderBy": json.dumps(id_field), "equalTo": json.dumps(value)}).json()
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 400: raise
+                found = None # 400 = no index on the field; the per-key GET still works
+            if isinstance(found, dict):
+                for q in found.values():
+                    if isinstance(q, dict): return q
+            q = fb_client.request("GET", f"questions/{qid}").json()
+            if isinstance(q, dict) and q and str(q.get(id_field, qid)) == str(qid):
+                return q
+            return None
+
+        def fetch_choices(qid):
+            choices = fb_client.request("GET", f"choices_by_question/{qid}").json() or []
+            if isinstance(choices, dict): choices = list(choices.values())
+            return [c for c in choices if c]
+
+        # Same TTL as the snapshot, so edited questions reach new attempts as soon as the exam list does
+        @st.cache_data(ttl=EXAM_DATA_TTL, max_entries=EXAM_CACHE_SIZE, show_spinner=False)
+        def load_exam_content(exam_id, question_ids):
+            """Questions and choices for one exam, shared by every student taking it.
 
-    # --- GUI Styling ---
-    # REMOVED: All CSS from here is now consolidated at the top of the file.
+            Raises if any question or choice list fails to load, so a partial exam is
+            never cached or shown.
+            """
+            with ThreadPoolExecutor(max_workers=FB_FETCH_CONCURRENCY) as pool:
+                questions = dict(zip(question_ids, pool.map(fetch_question, question_ids)))
+                choices = dict(zip(question_ids, pool.map(fetch_choices, question_ids)))
+            if question_ids and not any(questions.values()):
+                raise RuntimeError(f"No questions could be loaded for exam {exam_id}")
+            return {
+                "questions": {qid: q for qid, q in questions.items() if q},
+                "choices_by_question": choices,
+            }
+
+        def subtree_cost_report():
+            # What each manifest entry costs: bytes over the wire and memory held by the snapshot
+            net = {row["path"]: row for row in fb_client.stats().to_dict("records")}
+            snapshot = exam_data_store.snapshot or {}
+            rows = []
+            for name, spec in FIREBASE_SUBTREES.items():
+                rows.append({
+                    "subtree": name,
+                    "load": spec["load"],
+                    "requests": net.get(name, {}).get("calls", 0),
+                    "kb_transferred": net.get(name, {}).get("kb", 0.0),
+                    "resident_kb": round(estimate_size(snapshot[name]) / 1024, 1) if name in snapshot else None,
+                })
+            return pd.DataFrame(rows)
+
+        # --- GUI Styling ---
+        # REMOVED: All CSS from here is now consolidated at the top of the file.
     
-    # --- Load Data with Spinner ---
-    with st.spinner("Connecting to Exam Database..."):
-        data = load_all_data()
-
-    # --- Session State Initialization ---
-    if "step" not in st.session_state: st.session_state.step = 1
-    if "student_id" not in st.session_state: st.session_state.student_id = None
-    if "selected_course_id" not in st.session_state: st.session_state.selected_course_id = None
-    if "exam_id" not in st.session_state: st.session_state.exam_id = None
-    if "exam_questions" not in st.session_state: st.session_state.exam_questions = []
-    if "answers" not in st.session_state: st.session_state.answers = {}
-    if "end_time" not in st.session_state: st.session_state.end_time = None
-    if "duration_minutes" not in st.session_state: st.session_state.duration_minutes = 0
-
-    # --- UI Functions (Steps) ---
-    def step1_ui():
-        st.subheader("Step 1 — Student Authentication")
-        st.write("Please enter your Student ID to find your available exams.")
-        sid = st.text_input("Enter Your Student ID", key="student_id_input", label_visibility="collapsed")
+        # --- Load Data with Spinner ---
+        with st.spinner("Connecting to Exam Database..."):
+            data = exam_data_store.get()
+
+        # --- Session State Initialization ---
+        if "step" not in st.session_state: st.session_state.step = 1
+        if "student_id" not in st.session_state: st.session_state.student_id = None
+        if "selected_course_id" not in st.session_state: st.session_state.selected_course_id = None
+        if "exam_id" not in st.session_state: st.session_state.exam_id = None
+        if "exam_questions" not in st.session_state: st.session_state.exam_questions = []
+        if "exam_content" not in st.session_state: st.session_state.exam_content = None
+        if "answers" not in st.session_state: st.session_state.answers = {}
+        if "end_time" not in st.session_state: st.session_state.end_time = None
+        if "duration_minutes" not in st.session_state: st.session_state.duration_minutes = 0
+
+        # Slack for the browser's auto-submit at zero to reach the server. Answers that arrive later (a hidden
+        # tab can throttle the timer to once a minute) are still saved, but flagged with Submitted_Late.
+        EXAM_SUBMIT_GRACE_SECONDS = int(os.getenv("EXAM_SUBMIT_GRACE_SECONDS", "15"))
+
+        # --- UI Functions (Steps) ---
+        def step1_ui():
+            st.subheader("Step 1 — Student Authentication")
+            st.write("Please enter your Student ID to find your available exams.")
+            sid = st.text_input("Enter Your Student ID", key="student_id_input", label_visibility="collapsed")
         
-        if st.button("Find My Exams"):
-            if not sid:
-                st.warning("Please enter your Student ID.")
-                return
-            st.session_state.student_id = sid
-            st.session_state.step = 2
-            st.rerun()
-
-    def step2_ui():
-        st.subheader("Step 2 — Course Selection")
-        sid = st.session_state.student_id
-        st.info(f"Welcome, Student ID: **{sid}**")
-        st.write("Please select an exam from your available courses.")
-
-        sc_map = data["student_courses"] or {}
-        courses_map = data["courses"] or {}
-
-        available = []
-        if isinstance(sc_map, dict):
-            for key, sc in sc_map.items():
-                try: sc_student = str(sc.get("Student_ID") or sc.get("student_id") or sc.get("StudentID"))
-                except Exception: sc_student = None
-                
-                if sc_student == str(sid):
-                    cid = str(sc.get("Course_ID"))
-                    course = courses_map.get(cid) 
-                    if course:
-                        available.append((cid, course.get("Course_Name")))
-        else:
-            st.error("Student courses data is not in the expected dictionary format.")
+            if st.button("Find My Exams"):
+                if not sid:
+                    st.warning("Please enter your Student ID.")
+                    return
+                st.session_state.student_id = sid
+                st.session_state.step = 2
+                st.rerun()
+
+        def step2_ui():
+            st.subheader("Step 2 — Course Selection")
+            sid = st.session_state.student_id
+            st.info(f"Welcome, Student ID: **{sid}**")
+            st.write("Please select an exam from your available courses.")
+
+            courses_map = data["courses"] or {}
 
-        if not available:
-            st.error("No courses found for this Student ID. Please contact your administrator.")
-            return
+            available = []
+            for cid in data["student_course_index"].get(str(sid), []):
+                course = courses_map.get(cid)
+                if course:
+                    available.append((cid, course.get("Course_Name")))
+
+            if not available:
+                st.error("No courses found for this Student ID. Please contact your administrator.")
+                return
 
-        options = {name: cid for cid, name in available if name}
-        if not options:
-            st.error("Courses found, but they have no names. Please contact your administrator.")
-            return
+            options = {name: cid for cid, name in available if name}
+            if not options:
+                st.error("Courses found, but they have no names. Please contact your administrator.")
+                return
             
-        choice = st.selectbox("Select an Available Exam", options=list(options.keys()))
+            choice = st.selectbox("Select an Available Exam", options=list(options.keys()))
         
-        if st.button("Start Selected Exam"):
-            st.session_state.selected_course_id = options[choice]
-            st.session_state.step = 3
-            st.rerun()
-
-    def start_exam_for_course(course_id):
-        exams_map = data["exams"]
-        matching = [eid for eid, e in exams_map.items() if str(e.get("Course_ID")) == str(course_id)]
-        if not matching: return None
-        chosen = random.choice(matching)
-        return chosen
-
-    def step3_ui():
-        st.subheader("Step 3 — Exam In Progress")
-        course_id = st.session_state.selected_course_id
-
-        if not st.session_state.exam_id:
-            exam_id = start_exam_for_course(course_id)
-            if not exam_id:
-                st.error("No exam found for this course.")
-                return
-            st.session_state.exam_id = exam_id
-            exam_info = data["exams"].get(str(exam_id), {})
+            if st.button("Start Selected Exam"):
+                st.session_state.selected_course_id = options[choice]
+                st.session_state.step = 3
+                st.rerun()
+
+        def start_exam_for_course(course_id):
+            matching = data["course_exam_index"].get(str(course_id), [])
+            if not matching: return None
+            chosen = random.choice(matching)
+            return chosen
+
+        def render_countdown(remaining):
+            # The countdown ticks in the browser, so an exam in progress costs the server nothing
+            # between interactions. At zero it presses "Submit Exam", which sends the current answers.
+            components.html(
+                f"""
+            <div id="exam-timer" style="color:#FFFFFF; font-family:'Source Sans Pro', sans-serif; font-weight:700; font-size:1rem;"></div>
+            <script>
+            const endTime = Date.now() + {remaining} * 1000;
+            const timer = document.getElementById("exam-timer");
+            let submitted = false;
+            function tick() {{
+                const left = Math.max(0, Math.round((endTime - Date.now()) / 1000));
+                const minutes = String(Math.floor(left / 60)).padStart(2, "0");
+                const seconds = String(left % 60).padStart(2, "0");
+                timer.textContent = `Time remaining: ${{minutes}}:${{seconds}}`;
+                if (left === 0 && !submitted) {{
+                    submitted = true;
+                    const button = window.parent.document.querySelector('[data-testid="stFormSubmitButton"] button');
+                    if (button) button.click();
+                }}
+            }}
+            tick();
+            setInterval(tick, 1000);
+            </script>
+            """,
+                height=35,
+            )
+
+        def collect_form_answers():
+            # Widget values reach session state on submit even when the form body isn't rendered
+            for qid_s in st.session_state.answers:
+                key = f"q_{qid_s}"
+                if key in st.session_state:
+                    st.session_state.answers[qid_s] = st.session_state[key]
+
+        def step3_ui():
+            st.subheader("Step 3 — Exam In Progress")
+            course_id = st.session_state.selected_course_id
+
+            if not st.session_state.exam_id:
+                exam_id = start_exam_for_course(course_id)
+                if not exam_id:
+                    st.error("No exam found for this course.")
+                    return
+                exam_questions = data["exam_questions_grouped"].get(str(exam_id), [])
+                try:
+                    with st.spinner("Loading exam questions..."):
+                        exam_content = load_exam_content(str(exam_id), tuple(str(qid) for qid in exam_questions))
+                except Exception as e:
+                    print(f"Error loading questions for exam '{exam_id}': {e}")
+                    st.error("Could not load the exam questions. Please try again in a moment.")
+                    return
+                st.session_state.exam_id = exam_id
+                st.session_state.exam_content = exam_content
+                exam_info = data["exams"].get(str(exam_id), {})
             
-            dur = exam_info.get("Exam_Duration_Minutes") or exam_info.get("Exam_Duration")
-            try: dur = int(dur)
-            except (ValueError, TypeError): dur = 30 # Default
+                dur = exam_info.get("Exam_Duration_Minutes") or exam_info.get("Exam_Duration")
+                try: dur = int(dur)
+                except (ValueError, TypeError): dur = 30 # Default
             
-            st.session_state.duration_minutes = dur
-            st.session_state.end_time = time.time() + dur * 60
-            st.session_state.exam_questions = data["exam_questions_grouped"].get(str(exam_id), [])
-            st.session_state.answers = {str(qid): None for qid in st.session_state.exam_questions}
-
-        if st.session_state.exam_id:
-            st.caption(f"Student ID: {st.session_state.student_id} | Exam ID: {st.session_state.exam_id}")
-
-        remaining = int(st.session_state.end_time - time.time())
-        if remaining <= 0:
-            st.warning("Time is up. Submitting...")
-            st.toast("Time's up! Automatically submitting your exam.", icon="⏰")
-            submit_answers()
-            st.rerun() 
-            return
+                st.session_state.duration_minutes = dur
+                st.session_state.end_time = time.time() + dur * 60
+                st.session_state.exam_questions = exam_questions
+                st.session_state.answers = {str(qid): None for qid in st.session_state.exam_questions}
+
+            if st.session_state.exam_id:
+                st.caption(f"Student ID: {st.session_state.student_id} | Exam ID: {st.session_state.exam_id}")
+
+            # Server-side deadline check; runs on every real interaction, including the submit itself
+            remaining = int(st.session_state.end_time - time.time())
+            if remaining <= 0:
+                st.warning("Time is up. Submitting...")
+                st.toast("Time's up! Automatically submitting your exam.", icon="⏰")
+                collect_form_answers() # The answers arrive with the submit that triggered this rerun
+                submit_answers()
+                st.rerun() 
+                return
             
-        minutes = remaining // 60
-        seconds = remaining % 60
-        st.markdown(f"**Time remaining: {minutes:02d}:{seconds:02d}**")
-
-        questions_map = data["questions"]
-        choices_by_q = data["choices_by_question"]
-
-        st.write("---")
-        with st.form(key="exam_form"):
-            for idx, qid in enumerate(st.session_state.exam_questions, start=1):
-                qid_s = str(qid)
-                q = questions_map.get(qid_s)
-                if not q:
-                    st.error(f"Question {qid_s} not found.")
-                    continue
+            render_countdown(remaining)
+
+            questions_map = st.session_state.exam_content["questions"]
+            choices_by_q = st.session_state.exam_content["choices_by_question"]
+
+            st.write("---")
+            with st.form(key="exam_form"):
+                for idx, qid in enumerate(st.session_state.exam_questions, start=1):
+                    qid_s = str(qid)
+                    q = questions_map.get(qid_s)
+                    if not q:
+                        st.error(f"Question {qid_s} not found.")
+                        continue
                 
-                st.write(f"**Q{idx}. {q.get('Question_Description')}**")
-                qtype = q.get("Question_Type")
-                key = f"q_{qid_s}"
+                    st.write(f"**Q{idx}. {q.get('Question_Description')}**")
+                    qtype = q.get("Question_Type")
+                    key = f"q_{qid_s}"
                 
-                current_val = st.session_state.answers.get(qid_s)
+                    current_val = st.session_state.answers.get(qid_s)
                 
-                if qtype == "MCQ":
-                    choices_list = choices_by_q.get(qid_s) or []
-                    labels = [c.get("Choice_Text") for c in choices_list if c]
-                    if not labels:
-                        st.warning(f"No choices found for question {qid_s}")
-                        continue
+                    if qtype == "MCQ":
+                        choices_list = choices_by_q.get(qid_s) or []
+                        labels = [c.get("Choice_Text") for c in choices_list if c]
+                        if not labels:
+                            st.warning(f"No choices found for question {qid_s}")
+                            continue
                     
-                    try: default_index = labels.index(current_val)
-                    except ValueError: default_index = None
+                        try: default_index = labels.index(current_val)
+                        except ValueError: default_index = None
                         
-                    sel = st.radio("Select one", labels, index=default_index, key=key,label_visibility="collapsed")
-                    st.session_state.answers[qid_s] = sel
+                        sel = st.radio("Select one", labels, index=default_index, key=key,label_visibility="collapsed")
+                        st.session_state.answers[qid_s] = sel
                     
-                elif qtype == "True/False":
-                    opts = ["True", "False"]
-                    try: default_index = opts.index(current_val)
-                    except ValueError: default_index = None
+                    elif qtype == "True/False":
+                        opts = ["True", "False"]
+                        try: default_index = opts.index(current_val)
+                        except ValueError: default_index = None
 
-                    sel = st.radio("Select one", opts, index=default_index, key=key,label_visibility="collapsed")
-                    st.session_state.answers[qid_s] = sel
+                        sel = st.radio("Select one", opts, index=default_index, key=key,label_visibility="collapsed")
+                        st.session_state.answers[qid_s] = sel
                     
-                else: # fallback: free text
-                    txt = st.text_input("Answer", value=current_val if current_val else "", key=key)
-                    st.session_state.answers[qid_s] = txt
-                st.write("---")
+                    else: # fallback: free text
+                        txt = st.text_input("Answer", value=current_val if current_val else "", key=key)
+                        st.session_state.answers[qid_s] = txt
+                    st.write("---")
             
-            submitted = st.form_submit_button("Submit Exam")
-            if submitted:
-                submit_answers()
-                st.rerun()
-                return
-
-        time.sleep(1)
-        st.rerun()
-
-    def submit_answers():
-        st.toast("Submitting your answers...")
-        sid = st.session_state.student_id
-        exam_id = st.session_state.exam_id
-        answers = st.session_state.answers
+                submitted = st.form_submit_button("Submit Exam")
+                if submitted:
+                    submit_answers()
+                    st.rerun()
+                    return
+
+        def submit_answers():
+            st.toast("Submitting your answers...")
+            sid = st.session_state.student_id
+            exam_id = st.session_state.exam_id
+            answers = st.session_state.answers
         
-        all_answered = all(ans is not None and ans != "" for ans in answers.values())
-        if not all_answered:
-            st.warning("You have not answered all questions, but submitting anyway.")
-
-        payloads = []
-        for qid, ans in answers.items():
-            record = {
-                "Exam_ID": int(exam_id) if str(exam_id).isdigit() else exam_id,
-                "Question_ID": int(qid) if str(qid).isdigit() else qid,
-                "Student_ID": int(sid) if str(sid).isdigit() else sid,
-                "Student_Answer": ans if ans is not None else "N/A",
-                "Submitted_At": int(time.time())
-            }
-            payloads.append(record)
-
-        results = []
-        with st.spinner("Submitting your answers to the database..."):
-            for rec in payloads:
-                res = fb_post("student_answers", rec)
-                if res: results.append(res.get("name"))
-                else: st.error(f"Failed to submit answer for Question ID: {rec['Question_ID']}")
-
-        st.session_state.step = 4
-        st.session_state.submitted_results = results
-
-    def step4_ui():
-        st.subheader("Step 4 — Submission Complete")
-        st.success("Your answers have been submitted successfully. You may now close this window.")
-        st.balloons()
+            all_answered = all(ans is not None and ans != "" for ans in answers.values())
+            if not all_answered:
+                st.warning("You have not answered all questions, but submitting anyway.")
+
+            submitted_at = time.time()
+            late = submitted_at > st.session_state.end_time + EXAM_SUBMIT_GRACE_SECONDS
+            if late:
+                print(f"Answers arrived {int(submitted_at - st.session_state.end_time)}s after the deadline (student {sid}, exam {exam_id})")
+
+            payloads = []
+            for qid, ans in answers.items():
+                record = {
+                    "Exam_ID": int(exam_id) if str(exam_id).isdigit() else exam_id,
+                    "Question_ID": int(qid) if str(qid).isdigit() else qid,
+                    "Student_ID": int(sid) if str(sid).isdigit() else sid,
+                    "Student_Answer": ans if ans is not None else "N/A",
+                    "Submitted_At": int(submitted_at),
+                    "Submitted_Late": late
+                }
+                payloads.append(record)
+
+            with st.spinner("Submitting your answers to the database..."):
+                outcome = fb_submit_batch("student_answers", payloads)
+
+            st.session_state.step = 4
+            st.session_state.submitted_results = [key for key, rec, ok in outcome if ok]
+            # Kept with their push keys, so a retry from step 4 overwrites instead of duplicating
+            st.session_state.failed_records = [(key, rec) for key, rec, ok in outcome if not ok]
+
+        def retry_failed_answers():
+            failed = st.session_state.failed_records
+            with st.spinner("Retrying the answers that were not saved..."):
+                outcome = fb_submit_batch("student_answers", [rec for _, rec in failed], keys=[key for key, _ in failed])
+            st.session_state.submitted_results += [key for key, rec, ok in outcome if ok]
+            st.session_state.failed_records = [(key, rec) for key, rec, ok in outcome if not ok]
+
+        def step4_ui():
+            failed = st.session_state.get("failed_records") or []
+            if failed:
+                st.subheader("Step 4 — Submission Incomplete")
+                saved = len(st.session_state.get("submitted_results") or [])
+                st.error(f"{len(failed)} of {saved + len(failed)} answers could not be saved. Please retry before closing this window.")
+                st.write("Not saved yet: " + ", ".join(f"Question ID {rec['Question_ID']}" for _, rec in failed))
+                if st.button("🔁 Retry Failed Answers"):
+                    retry_failed_answers()
+                    st.rerun()
+            else:
+                st.subheader("Step 4 — Submission Complete")
+                st.success("Your answers have been submitted successfully. You may now close this window.")
+                st.balloons()
         
-        # Clear sensitive session state
-        st.session_state.student_id = None
-        st.session_state.selected_course_id = None
-        st.session_state.exam_id = None
-        st.session_state.exam_questions = []
-        st.session_state.answers = {}
-        st.session_state.end_time = None
+            # Clear sensitive session state
+            st.session_state.student_id = None
+            st.session_state.selected_course_id = None
+            st.session_state.exam_id = None
+            st.session_state.exam_questions = []
+            st.session_state.exam_content = None
+            st.session_state.answers = {}
+            st.session_state.end_time = None
         
-        st.info("If you need to take another exam, please REFRESH the page to log in again.")
+            st.info("If you need to take another exam, please REFRESH the page to log in again.")
         
-        res = st.session_state.get("submitted_results", None)
-        if res:
-            with st.expander("View Submission Summary (Technical Details)"):
-                st.json(res)
-
-    # --- Main App Flow ---
-    if "step" in st.session_state:
-        if st.session_state.step == 1: step1_ui()
-        elif st.session_state.step == 2: step2_ui()
-        elif st.session_state.step == 3: step3_ui()
-        elif st.session_state.step == 4: step4_ui()
-    else:
-        step1_ui() # Default
+            res = st.session_state.get("submitted_results", None)
+            if res:
+                with st.expander("View Submission Summary (Technical Details)"):
+                    st.json(res)
+
+        # --- Main App Flow ---
+        if "step" in st.session_state:
+            if st.session_state.step == 1: step1_ui()
+            elif st.session_state.step == 2: step2_ui()
+            elif st.session_state.step == 3: step3_ui()
+            elif st.session_state.step == 4: step4_ui()
+        else:
+            step1_ui() # Default
+
+        # --- Admin Tools (only shown when EXAM_ADMIN_KEY is configured) ---
+        EXAM_ADMIN_KEY = os.getenv("EXAM_ADMIN_KEY")
+        if EXAM_ADMIN_KEY:
+            with st.expander("🛠️ Admin Tools"):
+                admin_key = st.text_input("Admin Key", type="password", key="exam_admin_key")
+                if admin_key == EXAM_ADMIN_KEY:
+                    refreshed = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(exam_data_store.refreshed_at))
+                    st.caption(f"Exam data last refreshed: {refreshed} | Staleness check every {EXAM_DATA_TTL}s")
+                    if st.button("🔄 Refresh Exam Data"):
+                        if exam_data_store.refresh_in_background(force=True):
+                            st.success("Refresh started in the background. Students keep the current data until it finishes.")
+                        else:
+                            st.info("A refresh is already running.")
+                    st.markdown("**Firebase subtrees**")
+                    st.dataframe(subtree_cost_report(), use_container_width=True)
+                    st.markdown("**Firebase calls**")
+                    st.dataframe(fb_client.stats(), use_container_width=True)
+                    st.markdown("**Rerun timings**")
+                    st.dataframe(rerun_timing_report(), use_container_width=True)
 
 # =====================================================================
 # 🧮 TAB 4: SSRS Reporting (Optimized + No Sidebar)
 # =====================================================================
 with SSRS_Report:
-    # --- PAGE TITLE ---
-    st.markdown("<h2 style='text-align:center;'>📝 SSRS Reporting</h2>", unsafe_allow_html=True)
-    st.markdown("<p style='text-align:center;'>Explore cloud-hosted SSRS reports for the ITI Examination System.</p>", unsafe_allow_html=True)
-    st.divider()
-
-    # --- STYLING ---
-    # REMOVED: All CSS from here is now consolidated at the top of the file.
-    # The unified CSS will make all text white.
-
-
-    # --- REPORT LINKS ---
-    REPORTS = {
-        "Course Topics": "https://app.powerbi.com/rdlEmbed?reportId=c415569d-8ceb-4aae-bbcd-69de90e9ff1e&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-        "Instructor Courses & Number of Students": "https://app.powerbi.com/rdlEmbed?reportId=8ca9c034-34f4-4a44-9b72-e6958dae8e33&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-        "Exam Questions": "https://app.powerbi.com/rdlEmbed?reportId=499f71c2-4480-43b5-8051-5d2ab9690c9f&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-        "Student Exam Answers": "https://app.powerbi.com/rdlEmbed?reportId=51d593f5-6d84-448a-870c-fc87c6ac9226&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-        "Student Grades": "https://app.powerbi.com/rdlEmbed?reportId=04d7f8b2-14e4-4d20-b8f8-36b2aea2657d&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-        "Student Details by Track": "https://app.powerbi.com/rdlEmbed?reportId=7d2cf478-032e-4428-abdd-2bd31d4e43cc&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
-    }
+    if SSRS_Report.open:
+        # --- PAGE TITLE ---
+        st.markdown("<h2 style='text-align:center;'>📝 SSRS Reporting</h2>", unsafe_allow_html=True)
+        st.markdown("<p style='text-align:center;'>Explore cloud-hosted SSRS reports for the ITI Examination System.</p>", unsafe_allow_html=True)
+        st.divider()
+
+        # --- STYLING ---
+        # REMOVED: All CSS from here is now consolidated at the top of the file.
+        # The unified CSS will make all text white.
+
+
+        # --- REPORT LINKS ---
+        REPORTS = {
+            "Course Topics": "https://app.powerbi.com/rdlEmbed?reportId=c415569d-8ceb-4aae-bbcd-69de90e9ff1e&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+            "Instructor Courses & Number of Students": "https://app.powerbi.com/rdlEmbed?reportId=8ca9c034-34f4-4a44-9b72-e6958dae8e33&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+            "Exam Questions": "https://app.powerbi.com/rdlEmbed?reportId=499f71c2-4480-43b5-8051-5d2ab9690c9f&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+            "Student Exam Answers": "https://app.powerbi.com/rdlEmbed?reportId=51d593f5-6d84-448a-870c-fc87c6ac9226&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+            "Student Grades": "https://app.powerbi.com/rdlEmbed?reportId=04d7f8b2-14e4-4d20-b8f8-36b2aea2657d&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+            "Student Details by Track": "https://app.powerbi.com/rdlEmbed?reportId=7d2cf478-032e-4428-abdd-2bd31d4e43cc&autoAuth=true&ctid=0ffeb7b8-177f-48b0-809f-2499efab9107&experience=power-bi&rs:embed=true",
+        }
 
-    # --- CENTERED SELECT BOX ---
-    st.markdown("<h4 style='text-align:center;'>Select a Report:</h4>", unsafe_allow_html=True)
-    selected_report = st.selectbox(
-        "Select a Report", # Label for accessibility
-        options=list(REPORTS.keys()),
-        index=0,
-        key="ssrs_report_select",
-        label_visibility="collapsed" # Hide label as we have a header
-    )
+        # --- CENTERED SELECT BOX ---
+        st.markdown("<h4 style='text-align:center;'>Select a Report:</h4>", unsafe_allow_html=True)
+        selected_report = st.selectbox(
+            "Select a Report", # Label for accessibility
+            options=list(REPORTS.keys()),
+            index=0,
+            key="ssrs_report_select",
+            label_visibility="collapsed" # Hide label as we have a header
+        )
 
-    # --- DISPLAY SELECTED REPORT ---
-    report_url = REPORTS[selected_report]
-    st.markdown(f"<h4 style='text-align:center;'>Currently Viewing: {selected_report}</h4>", unsafe_allow_html=True)
+        # --- DISPLAY SELECTED REPORT ---
+        report_url = REPORTS[selected_report]
+        st.markdown(f"<h4 style='text-align:center;'>Currently Viewing: {selected_report}</h4>", unsafe_allow_html=True)
 
-    iframe_html = f"""
+        iframe_html = f"""
     <div style="width:1300px; height:850px; margin:0 auto; border-radius:12px; overflow:hidden;">
         <iframe src="{report_url}" width="100%" height="100%" frameborder="0" style="border-radius:12px;"></iframe>
     </div>
     """
-    components.html(iframe_html, height=870)
-
-    st.info("This SSRS report is embedded directly from the Power BI Service (Paginated Report).")
-
+        components.html(iframe_html, height=870)
 
+        st.info("This SSRS report is embedded directly from the Power BI Service (Paginated Report).")
 
 
+record_rerun_timing(st.session_state.get("main_tab", "").strip())
@@ -0,0 +1,806 @@
+"""Benchmark code paths of the Streamlit pages against local stand-ins.
+
+App.py and AI_Local.py define their helpers inside the tab blocks, so they can't
+be imported. Instead the named functions, classes and constants are compiled
+straight from the page source (decorators such as @st.cache_data are dropped),
+so the benchmarks measure the shipped code with no network or credentials.
+
+Benchmarks:
+
+- submit: exam submission latency at 10, 40 and 100 questions against a local
+  stub of the Firebase REST API, one POST per answer vs fb_submit_batch
+- cold-start: time for ExamDataStore to load the exam data snapshot from empty,
+  fetching its subtrees one after another (FB_FETCH_CONCURRENCY=1) vs
+  concurrently, against the Firebase stub with a simulated round-trip
+- indexes: course and exam lookups over 100k enrollments, scanning every
+  enrollment/exam per rerun vs the indexes from build_lookup_indexes
+- exam-cpu: server CPU per concurrent examinee. Streamlit AppTest sessions sit
+  in step 3 of App.py; "before" reruns each one every second, as the old
+  ``time.sleep(1); st.rerun()`` timer did, "after" leaves the countdown to the
+  browser, so the server only sees the start and the submit
+- exam-late: submits an App.py exam before the deadline, within
+  EXAM_SUBMIT_GRACE_SECONDS of it and well after it (as from a hidden tab's
+  throttled timer), and checks every answer given is saved, with Submitted_Late
+  set only on the last. Exits 1 if a check fails.
+- pbix-download: time and peak Python memory to fetch a large file from a local
+  HTTP server, ``requests.get(url).content`` vs download_pbix, plus resuming a
+  half-downloaded ``.part`` and finishing one that is already complete
+- sql-pool: queries/sec through AI_Local.py's ConnectionPool vs a new connection
+  per query, on SQLite with a simulated connect handshake. Then checks that
+  borrowers never exceed the pool size and that results abandoned early, or
+  whose consumer raises, still return their connection. Exits 1 if a check fails.
+- sql-truncation: runs AI_Local.py's run_sql_query on SQLite around the
+  SQL_MAX_ROWS limit and checks df.attrs["truncated"] and that every truncated
+  read returned its pooled connection. Exits 1 if a check fails.
+
+Usage:
+    python app_benchmark.py submit
+    python app_benchmark.py submit --questions 10 40 100 --latency-ms 80 --repeat 5
+    python app_benchmark.py cold-start --latency-ms 300 --concurrency 1 2 4
+    python app_benchmark.py indexes --enrollments 100000 --lookups 2000
+    python app_benchmark.py exam-cpu --examinees 5 10 20 --seconds 30
+    python app_benchmark.py exam-late
+    python app_benchmark.py pbix-download --size-mb 200
+    python app_benchmark.py sql-pool --connect-ms 20 --queries 500
+    python app_benchmark.py sql-truncation
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import random
+import statistics
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+APP_DIR = Path(__file__).parent
+APP_PAGE = APP_DIR / "App.py"
+AI_PAGE = APP_DIR / "AI_Local.py"
+
+
+def page_namespace(page, names, **namespace):
+    """Compile the top-level or tab-level definitions `names` from `page` into a namespace.
+
+    `names` are compiled in order, so constants should come before the code that
+    uses them. `namespace` supplies anything else they need (e.g. fb_client).
+    """
+    tree = ast.parse(Path(page).read_text(encoding="utf-8"))
+    found = {}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in names:
+            node.decorator_list = [] # The Streamlit caches aren't part of what is measured
+            found.setdefault(node.name, node)
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in names:
+                    found.setdefault(target.id, node)
+    missing = [name for name in names if name not in found]
+    if missing:
+        raise LookupError(f"{Path(page).name} no longer defines: {', '.join(missing)}")
+
+    scope = {"os": os, "time": time, "json": json, "random": random, "threading": threading, "hashlib": hashlib,
+             "requests": requests, "HTTPAdapter": HTTPAdapter, "Retry": Retry, "pd": pd, "Path": Path}
+    scope.update(namespace)
+    for name in names:
+        exec(compile(ast.Module(body=[found[name]], type_ignores=[]), str(page), "exec"), scope)
+    return scope
+
+
+# ==============================================================================
+# 🔥 Firebase REST Stub
+# ==============================================================================
+class FirebaseStub(ThreadingHTTPServer):
+    """In-memory stand-in for the Firebase Realtime Database REST API.
+
+    Supports GET (with orderBy/equalTo), POST (push), PUT and PATCH
+    (multi-location update) on ``/<path>.json`` and sleeps `latency` seconds per
+    request to stand in for the round-trip to Firebase. Requests are counted per
+    method.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, latency, tree=None):
+        super().__init__(("127.0.0.1", 0), FirebaseStubHandler)
+        self.latency = latency
+        self.tree = tree or {}
+        self.counts = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def node(self, path, create=False):
+        node = self.tree
+        for part in [p for p in path.split("/") if p]:
+            if isinstance(node, list):
+                node = node[int(part)] if part.isdigit() and int(part) < len(node) else None
+            elif create:
+                node = node.setdefault(part, {})
+            else:
+                node = node.get(part) if isinstance(node, dict) else None
+            if node is None:
+                return None
+        return node
+
+    def set(self, path, value):
+        parent, _, key = path.strip("/").rpartition("/")
+        self.node(parent, create=True)[key] = value
+
+
+class FirebaseStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True # Otherwise delayed ACKs add ~40 ms to every keep-alive request
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_request(self, method):
+        time.sleep(self.server.latency)
+        path, _, query = self.path.partition("?")
+        path = path.removesuffix(".json").strip("/")
+        query = parse_qs(query)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.loads(body) if body else None
+        with self.server.lock:
+            self.server.counts[method] = self.server.counts.get(method, 0) + 1
+            if method == "GET":
+                result = self.server.node(path)
+                if "orderBy" in query and isinstance(result, dict):
+                    field, value = json.loads(query["orderBy"][0]), json.loads(query["equalTo"][0])
+                    result = {k: v for k, v in result.items() if isinstance(v, dict) and v.get(field) == value}
+            elif method == "POST":
+                key = "-" + "".join(random.choices("0123456789abcdefghijklmnopqrstuvwxyz", k=19))
+                self.server.set(f"{path}/{key}", payload)
+                result = {"name": key}
+            elif method == "PUT":
+                self.server.set(path, payload)
+                result = payload
+            else: # PATCH: every key is a path below `path`
+                for key, value in payload.items():
+                    self.server.set(f"{path}/{key}", value)
+                result = payload
+        self.send_json(result)
+
+    def do_GET(self): self.handle_request("GET")
+    def do_POST(self): self.handle_request("POST")
+    def do_PUT(self): self.handle_request("PUT")
+    def do_PATCH(self): self.handle_request("PATCH")
+
+
+# ==============================================================================
+# ✏️ Exam Submission (App.py)
+# ==============================================================================
+def answer_records(questions, student_id=1, exam_id=1):
+    return [{"Exam_ID": exam_id, "Question_ID": qid, "Student_ID": student_id,
+             "Student_Answer": random.choice(["A", "B", "True", "False"]), "Submitted_At": int(time.time())}
+            for qid in range(1, questions + 1)]
+
+
+def bench_submit(args):
+    stub = FirebaseStub(args.latency_ms / 1000)
+    client = page_namespace(APP_PAGE, ["FirebaseClient"])["FirebaseClient"](stub.url, 5, 30, 3, 20)
+    fb = page_namespace(APP_PAGE, ["fb_post", "fb_patch", "PUSH_CHARS", "SUBMIT_BATCH_SIZE", "SUBMIT_MAX_ATTEMPTS",
+                                   "generate_push_key", "fb_submit_batch"], fb_client=client)
+
+    def per_answer_post(records):
+        # What submit_answers() did before batching: one round-trip per answer, in sequence
+        return [fb["fb_post"]("student_answers", rec) is not None for rec in records]
+
+    def batched(records):
+        return [ok for _, _, ok in fb["fb_submit_batch"]("student_answers", records)]
+
+    fb["fb_patch"]("warmup", {"a": 1}) # Open the keep-alive connection before timing
+
+    print(f"Exam submission against a Firebase stub with {args.latency_ms:g} ms per request (median of {args.repeat})")
+    print(f"  {'questions':>9}  {'POST each ms':>12}  {'requests':>8}  {'batched ms':>10}  {'requests':>8}  {'speedup':>7}")
+    for questions in args.questions:
+        row = []
+        for submit in (per_answer_post, batched):
+            times, requests_made = [], 0
+            for _ in range(args.repeat):
+                records = answer_records(questions)
+                before = sum(stub.counts.values())
+                started = time.perf_counter()
+                saved = submit(records)
+                times.append(time.perf_counter() - started)
+                requests_made = sum(stub.counts.values()) - before
+                if not all(saved):
+                    raise RuntimeError(f"{submit.__name__} failed to save {saved.count(False)} of {questions} answers")
+            row.append((statistics.median(times) * 1000, requests_made))
+        (post_ms, post_requests), (batch_ms, batch_requests) = row
+        print(f"  {questions:>9}  {post_ms:>12.1f}  {post_requests:>8}  {batch_ms:>10.1f}  {batch_requests:>8}  {post_ms / batch_ms:>6.1f}x")
+    stub.shutdown()
+    return 0
+
+
+# ==============================================================================
+# 🧊 Exam Data Cold Start (App.py)
+# ==============================================================================
+def bench_cold_start(args):
+    student_courses, exams = synthetic_enrollments(args.enrollments, args.enrollments // 5, 500, 2000)
+    tree = {
+        "courses": {str(cid): {"Course_ID": cid, "Course_Name": f"Course {cid}"} for cid in range(500)},
+        "exams": exams,
+        "student_courses": student_courses,
+        "exam_questions_grouped": {eid: list(range(1, 41)) for eid in exams},
+    }
+    stub = FirebaseStub(args.latency_ms / 1000, tree)
+    client = page_namespace(APP_PAGE, ["FirebaseClient"])["FirebaseClient"](stub.url, 5, 30, 3, 20)
+    app = page_namespace(APP_PAGE, ["FB_FETCH_CONCURRENCY", "EXAM_DATA_TTL", "DATA_VERSION_PATH", "fb_get",
+                                    "build_lookup_indexes", "process_to_id_map", "get_as_dict", "FIREBASE_SUBTREES",
+                                    "EAGER_SUBTREES", "process_subtree", "ExamDataStore"],
+                         fb_client=client, ThreadPoolExecutor=ThreadPoolExecutor)
+    client.request("GET", "warmup") # Open a keep-alive connection before timing
+
+    print(f"Cold load of the exam data snapshot ({', '.join(app['EAGER_SUBTREES'])}; {args.enrollments:,} enrollments) "
+          f"against a Firebase stub with {args.latency_ms:g} ms per request (median of {args.repeat})")
+    print(f"  App.py default: FB_FETCH_CONCURRENCY={app['FB_FETCH_CONCURRENCY']}")
+    print(f"  {'concurrency':>14}  {'cold load ms':>12}  {'requests':>8}  {'speedup':>7}")
+    sequential_ms, expected = None, None
+    for concurrency in args.concurrency:
+        app["FB_FETCH_CONCURRENCY"] = concurrency
+        times = []
+        for _ in range(args.repeat):
+            store = app["ExamDataStore"](app["EAGER_SUBTREES"], app["process_subtree"], app["EXAM_DATA_TTL"])
+            before = sum(stub.counts.values())
+            started = time.perf_counter()
+            snapshot = store.get()
+            times.append(time.perf_counter() - started)
+            requests_made = sum(stub.counts.values()) - before
+        sizes = {name: len(value) for name, value in snapshot.items()}
+        if expected is None:
+            expected = sizes
+        elif sizes != expected: # Same snapshot however it was fetched
+            raise RuntimeError(f"Concurrency {concurrency} loaded {sizes}, expected {expected}")
+        ms = statistics.median(times) * 1000
+        sequential_ms = sequential_ms or ms
+        label = f"{concurrency} (sequential)" if concurrency == 1 else str(concurrency)
+        print(f"  {label:>14}  {ms:>12.1f}  {requests_made:>8}  {sequential_ms / ms:>6.1f}x")
+    stub.shutdown()
+    return 0
+
+
+# ==============================================================================
+# 🗂️ Lookup Indexes (App.py)
+# ==============================================================================
+def synthetic_enrollments(enrollments, students, courses, exams, seed=0):
+    """student_courses and exams trees shaped like Firebase's, with all three Student_ID spellings."""
+    rng = random.Random(seed)
+    spellings = ["Student_ID", "student_id", "StudentID"]
+    student_courses = {
+        f"sc{i}": {spellings[i % 3]: rng.randrange(students), "Course_ID": rng.randrange(courses)}
+        for i in range(enrollments)
+    }
+    exams_map = {str(eid): {"Exam_ID": eid, "Course_ID": rng.randrange(courses)} for eid in range(exams)}
+    return student_courses, exams_map
+
+
+def scan_courses(student_courses, sid):
+    # step2_ui before the index: every enrollment on every rerun
+    found = []
+    for sc in student_courses.values():
+        sc_student = str(sc.get("Student_ID") or sc.get("student_id") or sc.get("StudentID"))
+        if sc_student == str(sid):
+            found.append(str(sc.get("Course_ID")))
+    return found
+
+
+def scan_exams(exams, course_id):
+    # start_exam_for_course before the index: every exam per attempt
+    return [eid for eid, e in exams.items() if str(e.get("Course_ID")) == str(course_id)]
+
+
+def bench_indexes(args):
+    build_lookup_indexes = page_namespace(APP_PAGE, ["build_lookup_indexes"])["build_lookup_indexes"]
+    student_courses, exams = synthetic_enrollments(args.enrollments, args.students, args.courses, args.exams)
+    rng = random.Random(1)
+    sids = [str(rng.randrange(args.students)) for _ in range(args.lookups)]
+    cids = [str(rng.randrange(args.courses)) for _ in range(args.lookups)]
+
+    started = time.perf_counter()
+    student_course_index, course_exam_index = build_lookup_indexes(student_courses, exams)
+    build_s = time.perf_counter() - started
+
+    for sid, cid in zip(sids[:50], cids[:50]): # Same answers both ways
+        if sorted(scan_courses(student_courses, sid)) != sorted(student_course_index.get(sid, [])):
+            raise RuntimeError(f"Index and scan disagree on the courses of student {sid}")
+        if scan_exams(exams, cid) != course_exam_index.get(cid, []):
+            raise RuntimeError(f"Index and scan disagree on the exams of course {cid}")
+
+    scan_lookups = min(args.lookups, args.scan_lookups)
+    rows = [
+        ("student -> courses", lambda i: scan_courses(student_courses, sids[i]), lambda i: student_course_index.get(sids[i], [])),
+        ("course -> exams", lambda i: scan_exams(exams, cids[i]), lambda i: course_exam_index.get(cids[i], [])),
+    ]
+    print(f"Lookups over {args.enrollments:,} enrollments ({args.students:,} students, {args.courses:,} courses, {args.exams:,} exams)")
+    print(f"  Index build (once per data load): {build_s * 1000:.1f} ms")
+    print(f"  {'lookup':<20} {'scan us':>12} {'index us':>10} {'speedup':>10}")
+    for name, scan, lookup in rows:
+        started = time.perf_counter()
+        for i in range(scan_lookups): scan(i)
+        scan_us = (time.perf_counter() - started) / scan_lookups * 1e6
+        started = time.perf_counter()
+        for i in range(args.lookups): lookup(i)
+        index_us = (time.perf_counter() - started) / args.lookups * 1e6
+        print(f"  {name:<20} {scan_us:>12,.1f} {index_us:>10.2f} {scan_us / index_us:>9,.0f}x")
+    return 0
+
+
+# ==============================================================================
+# ⏱️ Exam Timer CPU (App.py)
+# ==============================================================================
+def exam_tree(questions):
+    """Firebase tree for one course with one exam of `questions` MCQs, shared by all examinees."""
+    return {
+        "courses": {"1": {"Course_ID": 1, "Course_Name": "Python"}},
+        "exams": {"1": {"Exam_ID": 1, "Course_ID": 1, "Exam_Duration_Minutes": 60}},
+        "student_courses": {f"sc{sid}": {"Student_ID": sid, "Course_ID": 1} for sid in range(1, 1001)},
+        "exam_questions_grouped": {"1": list(range(1, questions + 1))},
+        "questions": {str(qid): {"Question_ID": qid, "Question_Type": "MCQ", "Question_Description": f"Question {qid}"}
+                      for qid in range(1, questions + 1)},
+        "choices_by_question": {str(qid): [{"Choice_Text": c} for c in "ABCD"] for qid in range(1, questions + 1)},
+    }
+
+
+def start_examinees(count, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    sessions = []
+    for sid in range(1, count + 1):
+        at = AppTest.from_file(str(APP_PAGE), default_timeout=timeout)
+        at.session_state["step"] = 3
+        at.session_state["student_id"] = str(sid)
+        at.session_state["selected_course_id"] = "1"
+        at.run()
+        if at.exception or at.session_state["step"] != 3:
+            raise RuntimeError(f"Examinee {sid} did not reach the exam: {[e.value for e in at.exception]}")
+        sessions.append(at)
+    return sessions
+
+
+def bench_exam_cpu(args):
+    stub = FirebaseStub(0, exam_tree(args.questions))
+    os.environ["FIREBASE_URL"] = stub.url
+    os.chdir(APP_DIR) # App.py reads its assets relative to the working directory
+
+    start_examinees(1, args.timeout) # Warm the process-wide caches (exam snapshot, exam content)
+    print(f"Server CPU per examinee over {args.seconds:g}s in step 3 ({args.questions} questions, "
+          f"{os.cpu_count()} CPU core(s))")
+    print(f"  {'mode':<7} {'examinees':>9} {'reruns':>7} {'reruns/s each':>14} {'CPU s':>7} {'% core each':>12}")
+    for count in args.examinees:
+        for mode in ("before", "after"):
+            cpu, wall = time.process_time(), time.perf_counter()
+            sessions = start_examinees(count, args.timeout)
+            reruns = count
+            deadline = time.monotonic() + args.seconds
+            while time.monotonic() < deadline:
+                tick = time.monotonic()
+                if mode == "before":
+                    for at in sessions: # One rerun per examinee per second, as the server-side timer did
+                        at.run()
+                        reruns += 1
+                time.sleep(max(0.0, 1 - (time.monotonic() - tick)))
+            for at in sessions:
+                next(b for b in at.button if b.label == "Submit Exam").click().run()
+                reruns += 1
+                if at.session_state["step"] != 4:
+                    raise RuntimeError(f"Submission failed: {[e.value for e in at.exception]}")
+            cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+            print(f"  {mode:<7} {count:>9} {reruns:>7} {reruns / count / wall:>14.2f} {cpu:>7.1f} {cpu / wall / count * 100:>11.1f}%")
+    stub.shutdown()
+    return 0
+
+
+def check_exam_late(args):
+    stub = FirebaseStub(0, exam_tree(args.questions))
+    os.environ["FIREBASE_URL"] = stub.url
+    os.chdir(APP_DIR)
+    grace = page_namespace(APP_PAGE, ["EXAM_SUBMIT_GRACE_SECONDS"])["EXAM_SUBMIT_GRACE_SECONDS"]
+    cases = [ # (seconds past the deadline when the submit arrives, None = before it; expect Submitted_Late)
+        (None, False),
+        (grace / 3, False),              # The browser's auto-submit, a little behind
+        (grace + args.late_seconds, True),  # A throttled timer in a hidden tab
+    ]
+    failures = []
+    print(f"Exam submits around the deadline ({args.questions} questions, EXAM_SUBMIT_GRACE_SECONDS={grace})")
+    for past, expected_late in cases:
+        label = "before the deadline" if past is None else f"{past:g}s after the deadline"
+        stub.tree.pop("student_answers", None)
+        at = start_examinees(1, args.timeout)[0]
+        chosen = {}
+        for radio in at.radio:
+            answer = chosen[radio.key.removeprefix("q_")] = random.choice(radio.options)
+            radio.set_value(answer)
+        if past is not None:
+            at.session_state["end_time"] = time.time() - past
+        next(b for b in at.button if b.label == "Submit Exam").click().run()
+        if at.exception or at.session_state["step"] != 4:
+            failures.append(f"{label}: the exam was not submitted {[e.value for e in at.exception]}")
+            continue
+        saved = {str(rec["Question_ID"]): rec for rec in (stub.tree.get("student_answers") or {}).values()}
+        wrong = [qid for qid, answer in chosen.items() if saved.get(qid, {}).get("Student_Answer") != answer]
+        flagged = {rec.get("Submitted_Late") for rec in saved.values()}
+        if wrong:
+            failures.append(f"{label}: {len(wrong)} of {len(chosen)} answers not saved as given (e.g. question {wrong[0]})")
+        if flagged != {expected_late}:
+            failures.append(f"{label}: Submitted_Late was {sorted(flagged)}, expected {expected_late}")
+        print(f"  {label:<28} {len(chosen) - len(wrong):>3}/{len(chosen)} answers saved, Submitted_Late={sorted(flagged)}")
+    stub.shutdown()
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print("OK: every submit kept the student's answers and only the one after the grace period was flagged late")
+    return 1 if failures else 0
+
+
+# ==============================================================================
+# 📥 PBIX Download (App.py)
+# ==============================================================================
+class FileServer(ThreadingHTTPServer):
+    """Serves one file with ETag and single-range (``bytes=N-``) support, counting body bytes sent."""
+    daemon_threads = True
+
+    def __init__(self, path):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.path = Path(path)
+        self.bytes_sent = 0
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/model.pbix"
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        size = self.server.path.stat().st_size
+        start = int(self.headers.get("Range", "bytes=0-").removeprefix("bytes=").split("-")[0] or 0)
+        if start >= size and "Range" in self.headers:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(206 if "Range" in self.headers else 200)
+        if "Range" in self.headers:
+            self.send_header("Content-Range", f"bytes {start}-{size - 1}/{size}")
+        self.send_header("ETag", '"benchmark"')
+        self.send_header("Content-Length", str(size - start))
+        self.end_headers()
+        if not send_body:
+            return
+        with open(self.server.path, "rb") as f:
+            f.seek(start)
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                self.wfile.write(chunk)
+                self.server.bytes_sent += len(chunk)
+
+
+def measure(fn):
+    """(seconds, peak traced MB) of fn(); timed on an untraced run, since tracing slows allocation."""
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def bench_pbix_download(args):
+    pbix = page_namespace(APP_PAGE, ["PBIX_CHUNK_SIZE", "PBIX_SHA256", "download_pbix"])
+    download_pbix = pbix["download_pbix"]
+    size = int(args.size_mb * 2**20)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "source.pbix"
+        with open(source, "wb") as f:
+            for _ in range(0, size, 2**20):
+                f.write(os.urandom(min(2**20, size - f.tell())))
+        server = FileServer(source)
+        target = tmp / "model.pbix"
+        part = target.with_suffix(".pbix.part")
+
+        def buffered():
+            # auto_load_pbix before streaming: the whole file in memory, then written
+            response = requests.get(server.url, timeout=60)
+            response.raise_for_status()
+            target.write_bytes(response.content)
+
+        def streamed():
+            target.unlink(missing_ok=True)
+            download_pbix(server.url, target, size)
+
+        def check():
+            if target.stat().st_size != size or part.exists():
+                raise RuntimeError(f"Bad download: {target.stat().st_size} bytes, .part left: {part.exists()}")
+
+        print(f"PBIX download of {args.size_mb:g} MB from a local HTTP server")
+        print(f"  {'case':<46} {'seconds':>8} {'peak MB':>8} {'MB sent':>8}")
+        for name, fn in [("requests.get(url).content (before)", buffered), ("download_pbix, streamed", streamed)]:
+            sent = server.bytes_sent
+            elapsed, peak = measure(fn)
+            check()
+            print(f"  {name:<46} {elapsed:>8.2f} {peak:>8.1f} {(server.bytes_sent - sent) / 2 / 2**20:>8.1f}")
+
+        for name, keep, expected_size in [
+            ("download_pbix, resume from a half .part", size // 2, size),
+            ("download_pbix, complete .part, size unknown", size, None), # The server answers 416
+        ]:
+            target.unlink(missing_ok=True)
+            with open(source, "rb") as src, open(part, "wb") as dst:
+                dst.write(src.read(keep))
+            sent = server.bytes_sent
+            started = time.perf_counter()
+            download_pbix(server.url, target, expected_size)
+            elapsed = time.perf_counter() - started
+            check()
+            print(f"  {name:<46} {elapsed:>8.2f} {'':>8} {(server.bytes_sent - sent) / 2**20:>8.1f}")
+        server.shutdown()
+    return 0
+
+
+# ==============================================================================
+# 🗃️ SQL Connection Pool (AI_Local.py)
+# ==============================================================================
+class CountingConnection(sqlite3.Connection):
+    """SQLite connection that tracks how many are open at once."""
+    lock = threading.Lock()
+    created = open = peak = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        with self.lock:
+            CountingConnection.created += 1
+            CountingConnection.open += 1
+            CountingConnection.peak = max(CountingConnection.peak, CountingConnection.open)
+
+    def close(self):
+        with self.lock:
+            CountingConnection.open -= 1
+        super().close()
+
+
+def sqlite_connector(path, connect_seconds):
+    def connect(database):
+        time.sleep(connect_seconds) # Stands in for the Windows-auth handshake
+        return sqlite3.connect(path, factory=CountingConnection, check_same_thread=False)
+    return connect
+
+
+def run_query(conn, query):
+    cursor = conn.cursor()
+    cursor.execute(query)
+    rows = cursor.fetchall()
+    cursor.close()
+    return rows
+
+
+def student_db(folder, rows=1000):
+    path = str(Path(folder) / "bench.db")
+    with closing(sqlite3.connect(path)) as conn:
+        conn.execute("CREATE TABLE student (id INTEGER PRIMARY KEY, name TEXT, grade REAL)")
+        conn.executemany("INSERT INTO student VALUES (?, ?, ?)", [(i, f"student {i}", i % 100) for i in range(rows)])
+        conn.commit()
+    return path
+
+
+def bench_sql_pool(args):
+    ConnectionPool = page_namespace(AI_PAGE, ["ConnectionPool"], contextmanager=contextmanager)["ConnectionPool"]
+    query = "SELECT id, name, grade FROM student WHERE id % 7 = 0"
+    with tempfile.TemporaryDirectory() as tmp:
+        connect = sqlite_connector(student_db(tmp), args.connect_ms / 1000)
+
+        def unpooled():
+            # read_sql_query before the pool: connect, query, close
+            conn = connect("ITIExaminationSystem")
+            try:
+                return run_query(conn, query)
+            finally:
+                conn.close()
+
+        pool = ConnectionPool(connect, args.pool_size, 300, 30, 5)
+
+        def pooled():
+            with pool.connection("ITIExaminationSystem") as conn:
+                return run_query(conn, query)
+
+        print(f"SQL queries/sec on SQLite with a {args.connect_ms:g} ms simulated connect ({args.queries} queries)")
+        print(f"  {'mode':<10} {'threads':>7} {'queries/s':>10} {'connects':>9}")
+        for threads in args.threads:
+            for name, fn in [("unpooled", unpooled), ("pooled", pooled)]:
+                connects = CountingConnection.created
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(lambda _: fn(), range(args.queries)))
+                elapsed = time.perf_counter() - started
+                print(f"  {name:<10} {threads:>7} {args.queries / elapsed:>10,.0f} {CountingConnection.created - connects:>9,}")
+
+        failures = []
+        CountingConnection.open = CountingConnection.peak = 0
+        pool = ConnectionPool(connect, 3, 300, 30, 1)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: pooled(), range(200)))
+        if CountingConnection.peak > 3:
+            failures.append(f"8 threads on a pool of 3 opened {CountingConnection.peak} connections at once")
+
+        def rows(database):
+            # Shaped like iter_sql_chunks: the connection is held while the caller reads
+            with pool.connection(database) as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT id FROM student")
+                    while batch := cursor.fetchmany(10):
+                        yield batch
+                finally:
+                    cursor.close()
+
+        try:
+            for _ in range(3 * 3): # Three times the pool size; a leaked slot would time out
+                with closing(rows("ITIExaminationSystem")) as result:
+                    next(result) # Stop after the first chunk, as run_sql_query does when truncating
+                try:
+                    with closing(rows("ITIExaminationSystem")) as result:
+                        for _ in result:
+                            raise ValueError("scoring failed") # A batch consumer that raises
+                except ValueError:
+                    pass
+        except TimeoutError as e:
+            failures.append(f"Abandoned results leaked connections: {e}")
+        stats = pool.stats().set_index("database").loc["ITIExaminationSystem"]
+        if stats["open"] != stats["idle"]:
+            failures.append(f"{stats['open'] - stats['idle']} connection(s) still borrowed after every caller finished")
+
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if not failures:
+            print(f"OK: at most {CountingConnection.peak} of 3 connections open under 8 threads; early-closed and "
+                  f"failed readers returned theirs ({stats['open']} open, {stats['idle']} idle)")
+    return 1 if failures else 0
+
+
+def check_sql_truncation(args):
+    ConnectionPool = page_namespace(AI_PAGE, ["ConnectionPool"], contextmanager=contextmanager)["ConnectionPool"]
+    os.environ.update(SQL_FETCH_ROWS=str(args.fetch_rows), SQL_MAX_ROWS=str(args.max_rows), SQL_CACHE_TTL="0")
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = ConnectionPool(sqlite_connector(student_db(tmp), 0), 2, 300, 30, 1)
+        sql = page_namespace(AI_PAGE, ["SQL_FETCH_ROWS", "SQL_MAX_ROWS", "SQL_MAX_MB", "SQL_CACHE_TTL",
+                                       "iter_sql_chunks", "run_sql_query"],
+                             get_sql_pool=lambda: pool, get_query_cache=None, closing=closing)
+        limit, step = args.max_rows, args.fetch_rows
+        cases = [ # (rows in the result, expect truncated)
+            (limit - 1, False),
+            (limit, False),
+            (limit + 1, True),           # The last chunk is cut
+            (limit + step, True),        # Stops on a chunk boundary with more left
+        ]
+        print(f"run_sql_query with SQL_MAX_ROWS={limit}, SQL_FETCH_ROWS={step}, pool of 2")
+        for _ in range(3): # Over the pool size, so a leaked connection would time out
+            for result_rows, expected in cases:
+                try:
+                    df = sql["run_sql_query"](f"SELECT id FROM student WHERE id < {result_rows}", "ITIExaminationSystem")
+                except TimeoutError as e:
+                    failures.append(f"{result_rows} rows: {e}")
+                    break
+                if (len(df), df.attrs["truncated"]) != (min(result_rows, limit), expected):
+                    failures.append(f"{result_rows} rows: got {len(df)} rows, truncated={df.attrs['truncated']}, "
+                                    f"expected {min(result_rows, limit)} rows, truncated={expected}")
+        stats = pool.stats().set_index("database").loc["ITIExaminationSystem"]
+        if stats["open"] != stats["idle"]:
+            failures.append(f"{stats['open'] - stats['idle']} connection(s) still borrowed after every query finished")
+
+    for failure in sorted(set(failures)):
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: {3 * len(cases)} queries flagged truncation correctly and returned their connections "
+              f"({stats['open']} open, {stats['idle']} idle)")
+    return 1 if failures else 0
+
+
+BENCHMARKS = {
+    "submit": bench_submit,
+    "cold-start": bench_cold_start,
+    "indexes": bench_indexes,
+    "exam-cpu": bench_exam_cpu,
+    "exam-late": check_exam_late,
+    "pbix-download": bench_pbix_download,
+    "sql-pool": bench_sql_pool,
+    "sql-truncation": check_sql_truncation,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="benchmark", required=True)
+
+    submit = commands.add_parser("submit", help="Exam submission latency vs number of questions")
+    submit.add_argument("--questions", type=int, nargs="+", default=[10, 40, 100], help="Questions per exam")
+    submit.add_argument("--latency-ms", type=float, default=50, help="Simulated round-trip per Firebase request")
+    submit.add_argument("--repeat", type=int, default=5, help="Submissions per size (median is reported)")
+
+    cold_start = commands.add_parser("cold-start", help="Exam data cold load, sequential vs concurrent subtree fetches")
+    cold_start.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4], help="FB_FETCH_CONCURRENCY values (1 = sequential)")
+    cold_start.add_argument("--latency-ms", type=float, default=300, help="Simulated round-trip per Firebase request")
+    cold_start.add_argument("--enrollments", type=int, default=20000, help="student_courses records")
+    cold_start.add_argument("--repeat", type=int, default=3, help="Cold loads per setting (median is reported)")
+
+    indexes = commands.add_parser("indexes", help="Course/exam lookups with and without the prebuilt indexes")
+    indexes.add_argument("--enrollments", type=int, default=100000, help="student_courses records")
+    indexes.add_argument("--students", type=int, default=20000)
+    indexes.add_argument("--courses", type=int, default=500)
+    indexes.add_argument("--exams", type=int, default=2000)
+    indexes.add_argument("--lookups", type=int, default=2000, help="Indexed lookups to time")
+    indexes.add_argument("--scan-lookups", type=int, default=50, help="Full scans to time (each walks every record)")
+
+    exam_cpu = commands.add_parser("exam-cpu", help="Server CPU per examinee, server-side vs browser exam timer")
+    exam_cpu.add_argument("--examinees", type=int, nargs="+", default=[5, 10, 20], help="Concurrent examinees")
+    exam_cpu.add_argument("--seconds", type=float, default=30, help="Time each examinee spends in the exam")
+    exam_cpu.add_argument("--questions", type=int, default=40, help="Questions per exam")
+    exam_cpu.add_argument("--timeout", type=float, default=120, help="AppTest timeout per rerun, in seconds")
+
+    exam_late = commands.add_parser("exam-late", help="Check that late exam submits keep their answers, flagged late")
+    exam_late.add_argument("--questions", type=int, default=10, help="Questions per exam")
+    exam_late.add_argument("--late-seconds", type=float, default=60, help="How far past the grace period the late submit is")
+    exam_late.add_argument("--timeout", type=float, default=120, help="AppTest timeout per rerun, in seconds")
+
+    pbix_download = commands.add_parser("pbix-download", help="Buffered vs streamed PBIX download, and resume")
+    pbix_download.add_argument("--size-mb", type=float, default=200, help="Size of the served file")
+
+    sql_pool = commands.add_parser("sql-pool", help="Pooled vs unpooled SQL queries/sec, and pool leak checks")
+    sql_pool.add_argument("--connect-ms", type=float, default=20, help="Simulated connection handshake")
+    sql_pool.add_argument("--queries", type=int, default=500, help="Queries per measurement")
+    sql_pool.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Concurrent callers")
+    sql_pool.add_argument("--pool-size", type=int, default=8, help="SQL_POOL_MAX_SIZE for the measurement")
+
+    sql_truncation = commands.add_parser("sql-truncation", help="Check run_sql_query truncation and connection release")
+    sql_truncation.add_argument("--max-rows", type=int, default=250, help="SQL_MAX_ROWS for the check")
+    sql_truncation.add_argument("--fetch-rows", type=int, default=100, help="SQL_FETCH_ROWS for the check")
+
+    args = parser.parse_args()
+    return BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Batch scoring for the CatBoost employment model (catboost_employment_model.pkl).
+
+Features are mapped over whole columns and each batch is scored with a single
+``predict_proba`` call; the predicted label is derived from those probabilities.
+Input can be a CSV or Parquet file with one row per student and (any case) the
+columns the model was trained on:
+
+- student_faculty_grade: Excellent / Very Good / Good / Pass (or the mapped 0-3 code)
+- student_iti_status: Graduated / Failed to Graduate (or the mapped 0/1 code)
+- total_grade: number
+- grade_bucket: Low / Medium / High / Top
+
+Other columns (e.g. student_id) are passed through to the output unchanged.
+
+Usage:
+    python employment_predictor.py students.csv --out scored.csv
+    python employment_predictor.py intake.parquet --out scored.parquet
+    python employment_predictor.py --benchmark --rows 1000 100000 1000000
+"""
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import predictor_common
+from predictor_common import FACULTY_GRADE_MAP, map_codes, match_columns, read_batches
+
+APP_DIR = Path(__file__).parent
+MODEL_PATH = Path(os.getenv("EMPLOYMENT_MODEL_PATH", APP_DIR / "catboost_employment_model.pkl"))
+BATCH_ROWS = int(os.getenv("EMPLOYMENT_BATCH_ROWS", "100000")) # rows per Pool / predict_proba call
+
+ITI_STATUS_MAP = {'Failed to Graduate': 1, 'Graduated': 0}
+GRADE_BUCKETS = ['Low', 'Medium', 'High', 'Top']
+CODE_MAPS = {
+    "student_faculty_grade": FACULTY_GRADE_MAP,
+    "student_iti_status": ITI_STATUS_MAP,
+    "grade_bucket": {bucket: bucket for bucket in GRADE_BUCKETS}, # Categorical; only checked and cleaned
+}
+PROBABILITY_COLUMN = "employed_probability"
+LABEL_COLUMN = "predicted_employed"
+
+
+def load_model(path=MODEL_PATH):
+    return predictor_common.load_model(path)
+
+
+def build_features(df, model):
+    """Model input for `df`, built column-wise.
+
+    Column names are matched case-insensitively. Label columns are mapped with
+    FACULTY_GRADE_MAP / ITI_STATUS_MAP; columns that are already numeric are taken
+    as the mapped codes. Raises ValueError on missing columns or values the model
+    has never seen.
+    """
+    columns = match_columns(df, model.feature_names_)
+    features, problems = {}, []
+    for name in model.feature_names_:
+        col = df[columns[name]]
+        if name in CODE_MAPS:
+            col, problem = map_codes(col, CODE_MAPS[name], name)
+            if problem:
+                problems.append(problem)
+            if name == "grade_bucket":
+                col = col.astype(object)
+        else:
+            col = pd.to_numeric(col, errors="coerce")
+        features[name] = col.to_numpy()
+    if problems:
+        raise ValueError("; ".join(problems))
+    return pd.DataFrame(features)
+
+
+def score_frame(model, df):
+    """`df` with PROBABILITY_COLUMN and LABEL_COLUMN added, from one predict_proba call."""
+    from catboost import Pool
+
+    features = build_features(df, model)
+    cat_features = [model.feature_names_[i] for i in model.get_cat_feature_indices()]
+    proba = model.predict_proba(Pool(features, cat_features=cat_features))
+    classes = np.asarray(model.classes_)
+    scored = df.copy()
+    scored[PROBABILITY_COLUMN] = proba[:, list(classes).index(1)]
+    scored[LABEL_COLUMN] = classes[proba.argmax(axis=1)] # Same label model.predict() would give
+    return scored
+
+
+def iter_scored(model, batches, batch_rows=BATCH_ROWS):
+    """Score an iterable of DataFrames, yielding scored chunks of at most `batch_rows` rows."""
+    for batch in batches:
+        for start in range(0, len(batch), batch_rows):
+            yield score_frame(model, batch.iloc[start:start + batch_rows])
+
+
+def synthetic_students(rows, seed=0):
+    return predictor_common.synthetic_students(rows, {
+        "student_faculty_grade": list(FACULTY_GRADE_MAP),
+        "student_iti_status": list(ITI_STATUS_MAP),
+        "total_grade": lambda rng, n: rng.uniform(0, 100, n).round(1),
+        "grade_bucket": GRADE_BUCKETS,
+    }, seed)
+
+
+def benchmark(model, sizes, repeat=3):
+    predictor_common.benchmark(f"Employment model batch scoring with {MODEL_PATH.name}", sizes,
+                               {"seconds": lambda df: list(iter_scored(model, [df]))}, synthetic_students, repeat)
+
+
+def main():
+    return predictor_common.main(__doc__, MODEL_PATH, score_frame, benchmark, "_scored", BATCH_ROWS)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Extract the PBIX Inspector tables into a Parquet sidecar.
+
+Runs PBIXRay once, offline, and writes the four tables the inspector shows
+(DAX measures, Power Query, schema, relationships) to ``pbix_metadata/``.
+When that folder exists, App.py loads it directly and never imports pbixray.
+
+Usage:
+    python extract_pbix_metadata.py                      # default GitHub PBIX
+    python extract_pbix_metadata.py path/to/model.pbix
+    python extract_pbix_metadata.py <url> --out pbix_metadata
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+import requests
+from pbixray import PBIXRay
+
+DEFAULT_PBIX_URL = (
+    "https://github.com/Ahmed-Arab95734/Graduation-Project-ITI-Examination-System/"
+    "raw/main/Ibrahim/Streamlit%20Application/ITI_Dashboard_Graduaton_Project.pbix"
+)
+DEFAULT_OUT_DIR = Path(__file__).parent / "pbix_metadata"
+PBIX_TABLES = ["dax_measures", "power_query", "schema", "relationships"]
+
+
+def download(url, dest):
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(dest, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+        return response.headers.get("ETag", "")
+
+
+def to_parquet_friendly(df):
+    # PBIXRay returns object columns that can mix str/None/numbers; store them as strings
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def extract(source, out_dir):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        etag = ""
+        if source.startswith(("http://", "https://")):
+            pbix_path = Path(tmp) / "model.pbix"
+            print(f"Downloading {source} ...")
+            etag = download(source, pbix_path)
+        else:
+            pbix_path = Path(source)
+
+        print(f"Parsing {pbix_path} ...")
+        model = PBIXRay(str(pbix_path))
+        for name in PBIX_TABLES:
+            df = getattr(model, name)
+            if df is None:
+                df = pd.DataFrame()
+            to_parquet_friendly(df).to_parquet(out_dir / f"{name}.parquet", index=False)
+            print(f"  {name}: {len(df)} rows")
+
+    manifest = {"source": source, "etag": etag, "extracted_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    (out_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    print(f"Wrote sidecar to {out_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("source", nargs="?", default=DEFAULT_PBIX_URL, help="PBIX file path or URL")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="Output folder for the Parquet sidecar")
+    args = parser.parse_args()
+    extract(args.source, args.out)
@@ -0,0 +1,124 @@
+"""Batch grade prediction with the scikit-learn pipeline (iti_grade_predictor_pipeline.pkl).
+
+Features are built over whole columns (faculty -> faculty group is a dict lookup)
+and each DataFrame (or --batch-rows batch of a file) is predicted in one call,
+clamped to 0-120 with NumPy.
+Input is one row per student with (any case) these columns:
+
+- student_faculty: e.g. Faculty of Engineering (or faculty_group: STEM / Business / Arts / Applied)
+- student_faculty_grade: Excellent / Very Good / Good / Pass (or the mapped 0-3 code)
+- student_gender: Male / Female
+- student_marital_status: Single / Married
+- branch_name: e.g. Smart Village
+- year: intake year, e.g. 2024
+
+Other columns (e.g. student_id) are passed through to the output unchanged.
+
+Usage:
+    python grade_predictor.py students.csv --out predicted.csv
+    python grade_predictor.py intake.parquet --out predicted.parquet
+    python grade_predictor.py --benchmark                    # 1k, 100k and 1M rows
+"""
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import predictor_common
+from predictor_common import FACULTY_GRADE_MAP, map_codes, match_columns, read_students
+
+APP_DIR = Path(__file__).parent
+MODEL_PATH = Path(os.getenv("GRADE_MODEL_PATH", APP_DIR / "iti_grade_predictor_pipeline.pkl"))
+BATCH_ROWS = int(os.getenv("GRADE_BATCH_ROWS", "100000")) # rows per predict call on the command line
+
+MIN_GRADE = 0.0
+MAX_GRADE = 120.0 # 12 subjects * 10 marks
+
+FACULTY_GROUPS = {
+    faculty: group
+    for group, faculties in {
+        'STEM': ['Faculty of Computers Sciences', 'Faculty of Engineering', 'Faculty of Information Systems', 'Faculty of Science'],
+        'Business': ['Faculty of Business Administration', 'Faculty of Commerce', 'Faculty of Economics and Political Science'],
+        'Arts': ['Faculty of Fine Arts', 'Faculty of Applied Arts', 'Faculty of Arts'],
+        'Applied': ['Faculty of Agriculture', 'Faculty of Education'],
+    }.items()
+    for faculty in faculties
+}
+BRANCH_NAMES = ['Sohag', 'Smart Village', 'Zagazig', 'Damanhour', 'Qena', 'Tanta',
+                'El Menoufia', 'El Mansoura', 'Aswan', 'El Minia',
+                'Cairo University', 'Ismailia', 'New Capital', 'Beni Sweif',
+                'El Fayoum', 'Alexandria', 'Assiut', 'Port Said', 'New Valley',
+                'Benha', 'Al Arish']
+FEATURES = ["student_faculty_grade", "student_gender", "student_marital_status", "branch_name", "year", "faculty_group"]
+
+
+def load_model(path=MODEL_PATH):
+    return predictor_common.load_model(path)
+
+
+def build_features(df):
+    """Pipeline input for `df`, built column-wise.
+
+    Column names are matched case-insensitively. faculty_group is looked up from
+    student_faculty unless given; faculty grade labels are mapped with
+    FACULTY_GRADE_MAP and year is made an integer, as in training. Raises
+    ValueError on missing columns or unknown faculty grades.
+    """
+    columns = match_columns(df, FEATURES[:-1], optional=["faculty_group", "student_faculty"])
+    if "faculty_group" in columns:
+        group = df[columns["faculty_group"]].astype(object)
+    elif "student_faculty" in columns:
+        group = df[columns["student_faculty"]].map(FACULTY_GROUPS).fillna('Other')
+    else:
+        raise ValueError("Missing column(s): student_faculty")
+
+    grade, problem = map_codes(df[columns["student_faculty_grade"]], FACULTY_GRADE_MAP, "student_faculty_grade")
+    if problem:
+        raise ValueError(problem)
+
+    return pd.DataFrame({
+        "student_faculty_grade": grade.to_numpy(dtype=np.int64),
+        "student_gender": df[columns["student_gender"]].to_numpy(dtype=object),
+        "student_marital_status": df[columns["student_marital_status"]].to_numpy(dtype=object),
+        "branch_name": df[columns["branch_name"]].to_numpy(dtype=object),
+        "year": pd.to_numeric(df[columns["year"]], errors="coerce").to_numpy(), # The encoder was fitted on integer years
+        "faculty_group": group.to_numpy(dtype=object),
+    })
+
+
+def predict_grades(model, df):
+    """`df` with raw_grade, predicted_grade (clamped to MIN_GRADE-MAX_GRADE) and predicted_percentage added."""
+    raw = np.asarray(model.predict(build_features(df)), dtype=float)
+    predicted = np.clip(raw, MIN_GRADE, MAX_GRADE)
+    scored = df.copy()
+    scored["raw_grade"] = raw
+    scored["predicted_grade"] = predicted
+    scored["predicted_percentage"] = predicted / MAX_GRADE * 100
+    return scored
+
+
+def synthetic_students(rows, seed=0):
+    return predictor_common.synthetic_students(rows, {
+        "student_faculty": list(FACULTY_GROUPS),
+        "student_faculty_grade": list(FACULTY_GRADE_MAP),
+        "student_gender": ['Male', 'Female'],
+        "student_marital_status": ['Single', 'Married'],
+        "branch_name": BRANCH_NAMES,
+        "year": [2023, 2024],
+    }, seed)
+
+
+def benchmark(model, sizes, repeat=3):
+    predictor_common.benchmark(f"Grade pipeline batch prediction with {MODEL_PATH.name}", sizes,
+                               {"features s": build_features, "total s": lambda df: predict_grades(model, df)},
+                               synthetic_students, repeat)
+
+
+def main():
+    return predictor_common.main(__doc__, MODEL_PATH, predict_grades, benchmark, "_predicted", BATCH_ROWS)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
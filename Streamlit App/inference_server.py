@@ -0,0 +1,293 @@
+"""Local inference server for the employment and grade models, shared by all Streamlit workers.
+
+Loads catboost_employment_model.pkl and iti_grade_predictor_pipeline.pkl once
+and answers scoring calls over HTTP. Concurrent requests for the same model are
+micro-batched: the first request waits up to --batch-wait-ms for others, and
+then they are all scored with one predict call.
+
+Endpoints (JSON, DataFrames in pandas "split" orientation):
+    POST /predict/employment   {"columns": [...], "data": [[...], ...]}
+    POST /predict/grade        -> {"columns": [prediction columns], "data": [...]}
+    GET  /health               -> loaded models and batching stats
+
+Bad input is answered with 400 and {"error": ...}; a model that failed to
+load is answered with 503, so the app falls back to scoring in-process.
+
+Usage:
+    python inference_server.py                           # serve on 127.0.0.1:8502
+    python inference_server.py --port 9000 --batch-wait-ms 2
+    python inference_server.py --load-test --concurrency 32 --requests 2000
+    python inference_server.py --load-test --url http://127.0.0.1:8502
+"""
+import argparse
+import json
+import os
+import queue
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import employment_predictor
+import grade_predictor
+
+HOST = os.getenv("INFERENCE_HOST", "127.0.0.1")
+PORT = int(os.getenv("INFERENCE_PORT", "8502"))
+BATCH_WAIT_MS = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))        # how long a request waits for company
+MAX_BATCH_ROWS = int(os.getenv("INFERENCE_MAX_BATCH_ROWS", "100000"))   # rows per predict call
+REQUEST_TIMEOUT = float(os.getenv("INFERENCE_REQUEST_TIMEOUT", "60"))   # seconds a request may wait for its result
+
+
+class MicroBatcher:
+    """Scores the requests for one model on a single thread, many requests per predict call.
+
+    submit() queues a request's columns and rows and returns a Future for its
+    (prediction columns, prediction rows). The worker takes the first queued
+    request, waits up to `wait_seconds` for more (up to `max_rows` rows), and
+    builds one DataFrame from all their rows to score together. If the batch
+    fails, each request is scored on its own so one bad request can't fail the
+    others.
+    """
+
+    def __init__(self, name, predict, wait_seconds=BATCH_WAIT_MS / 1000, max_rows=MAX_BATCH_ROWS):
+        self.name = name
+        self.predict = predict
+        self.wait_seconds = wait_seconds
+        self.max_rows = max_rows
+        self.queue = queue.Queue()
+        self.batches = self.requests = self.rows = 0
+        threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True).start()
+
+    def submit(self, columns, rows):
+        future = Future()
+        self.queue.put(((tuple(columns), rows), future))
+        return future
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            rows = len(items[0][0][1])
+            deadline = time.monotonic() + self.wait_seconds
+            while rows < self.max_rows:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic())) if self.wait_seconds else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                rows += len(item[0][1])
+            self.batches += 1
+            self.requests += len(items)
+            self.rows += rows
+            # Requests are batched with others that send the same columns (normally all of them)
+            groups = {}
+            for (columns, data), future in items:
+                groups.setdefault(columns, []).append((data, future))
+            for columns, group in groups.items():
+                self._score(columns, group)
+
+    def _score(self, columns, group):
+        try:
+            results = self._predict(columns, [row for data, _ in group for row in data])
+        except Exception:
+            for data, future in group:
+                try:
+                    future.set_result(self._predict(columns, data))
+                except Exception as e:
+                    future.set_exception(e)
+            return
+        output_columns, output_rows = results
+        start = 0
+        for data, future in group:
+            future.set_result((output_columns, output_rows[start:start + len(data)]))
+            start += len(data)
+
+    def _predict(self, columns, rows):
+        scored = self.predict(pd.DataFrame(rows, columns=list(columns)))
+        # Only the prediction columns go back; the client already has the rest
+        output_columns = [c for c in scored.columns if c not in columns]
+        return output_columns, scored[output_columns].to_numpy(dtype=object).tolist()
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "rows": self.rows,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0,
+            "queued": self.queue.qsize(),
+        }
+
+
+def load_batchers(wait_seconds, max_rows):
+    """One MicroBatcher per model that loads; a model that fails to load is reported and skipped."""
+    batchers = {}
+    for name, module, predict in [
+        ("employment", employment_predictor, employment_predictor.score_frame),
+        ("grade", grade_predictor, grade_predictor.predict_grades),
+    ]:
+        try:
+            model = module.load_model()
+        except Exception as e:
+            print(f"Could not load the {name} model from {module.MODEL_PATH}: {e}")
+            continue
+        batchers[name] = MicroBatcher(name, lambda df, model=model, predict=predict: predict(model, df), wait_seconds, max_rows)
+        print(f"Loaded the {name} model from {module.MODEL_PATH}")
+    return batchers
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so each client session reuses its connection
+    batchers = {}
+
+    def log_message(self, format, *args):
+        pass # One line per scoring call is too noisy
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self.send_json(404, {"error": f"Unknown path {self.path}"})
+        self.send_json(200, {"models": sorted(self.batchers), "stats": {n: b.stats() for n, b in self.batchers.items()}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        name = self.path.removeprefix("/predict/")
+        if not self.path.startswith("/predict/") or name not in ("employment", "grade"):
+            return self.send_json(404, {"error": f"Unknown path {self.path}"})
+        if name not in self.batchers:
+            return self.send_json(503, {"error": f"The {name} model is not loaded"})
+        try:
+            payload = json.loads(body)
+            columns, rows = list(payload["columns"]), list(payload["data"])
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_json(400, {"error": f"Bad request body: {e}"})
+        try:
+            output_columns, output_rows = self.batchers[name].submit(columns, rows).result(timeout=REQUEST_TIMEOUT)
+        except ValueError as e:
+            return self.send_json(400, {"error": str(e)})
+        except Exception as e:
+            return self.send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        self.send_json(200, {"columns": output_columns, "data": output_rows})
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128 # Many Streamlit sessions may connect at once; the default backlog of 5 resets them
+
+
+def make_server(host, port, wait_seconds, max_rows):
+    handler = type("Handler", (InferenceHandler,), {"batchers": load_batchers(wait_seconds, max_rows)})
+    return InferenceServer((host, port), handler)
+
+
+def wait_until_up(url, process, timeout=120):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The inference server exited with code {process.returncode}")
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f"The inference server at {url} did not come up within {timeout}s")
+
+
+def load_test(url, concurrency, requests_count, rows_per_request, model):
+    """Fire `requests_count` scoring calls from `concurrency` threads and report latency percentiles."""
+    import requests
+
+    samples = {
+        "employment": employment_predictor.synthetic_students(rows_per_request),
+        "grade": grade_predictor.synthetic_students(rows_per_request),
+    }
+    names = ["employment", "grade"] if model == "both" else [model]
+    bodies = {n: samples[n].to_json(orient="split", index=False) for n in names}
+    local = threading.local()
+
+    def call(i):
+        if not hasattr(local, "session"):
+            local.session = requests.Session() # One keep-alive connection per client thread
+        name = names[i % len(names)]
+        started = time.perf_counter()
+        response = local.session.post(f"{url}/predict/{name}", data=bodies[name], headers={"Content-Type": "application/json"}, timeout=60)
+        response.raise_for_status()
+        return name, time.perf_counter() - started
+
+    for i in range(len(names)):
+        call(i) # Warm up the model code paths
+    before = requests.get(f"{url}/health", timeout=10).json()["stats"]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(call, range(requests_count)))
+    elapsed = time.perf_counter() - started
+    after = requests.get(f"{url}/health", timeout=10).json()["stats"]
+
+    print(f"Load test: {requests_count:,} requests x {rows_per_request} row(s), {concurrency} concurrent, against {url}")
+    print(f"  Throughput: {requests_count / elapsed:,.0f} requests/sec ({elapsed:.2f}s)")
+    print(f"  {'model':<11} {'p50 ms':>8} {'p90 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'req/batch':>10}")
+    for name in names:
+        latencies = sorted(seconds * 1000 for n, seconds in results if n == name)
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        batches = after[name]["batches"] - before[name]["batches"]
+        per_batch = (after[name]["requests"] - before[name]["requests"]) / batches if batches else 0
+        print(f"  {name:<11} {cuts[49]:>8.1f} {cuts[89]:>8.1f} {cuts[94]:>8.1f} {cuts[98]:>8.1f} {latencies[-1]:>8.1f} {per_batch:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--batch-wait-ms", type=float, default=BATCH_WAIT_MS, help="Max wait for more requests to batch (0 = no waiting)")
+    parser.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS, help="Rows per predict call")
+    parser.add_argument("--load-test", action="store_true", help="Measure latency under concurrent load instead of serving")
+    parser.add_argument("--url", help="Server to load test (default: start one in-process on a free port)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent clients in the load test")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests in the load test")
+    parser.add_argument("--rows", type=int, default=1, help="Rows per load test request")
+    parser.add_argument("--model", choices=["employment", "grade", "both"], default="both", help="Model(s) to load test")
+    args = parser.parse_args()
+
+    if args.load_test and args.url:
+        load_test(args.url.rstrip("/"), args.concurrency, args.requests, args.rows, args.model)
+        return 0
+    if args.load_test:
+        # The server runs in its own process, as in production, so the load generator doesn't share its GIL
+        with socket.socket() as s:
+            s.bind((args.host, 0))
+            port = s.getsockname()[1]
+        server = subprocess.Popen([sys.executable, __file__, "--host", args.host, "--port", str(port),
+                                   "--batch-wait-ms", str(args.batch_wait_ms), "--max-batch-rows", str(args.max_batch_rows)])
+        try:
+            url = f"http://{args.host}:{port}"
+            wait_until_up(url, server)
+            load_test(url, args.concurrency, args.requests, args.rows, args.model)
+        finally:
+            server.terminate()
+            server.wait()
+        return 0
+
+    server = make_server(args.host, args.port, args.batch_wait_ms / 1000, args.max_batch_rows)
+    print(f"Serving {', '.join(sorted(server.RequestHandlerClass.batchers)) or 'no models'} on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
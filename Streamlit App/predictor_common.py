@@ -0,0 +1,132 @@
+"""Shared pieces of the batch predictors (employment_predictor.py and grade_predictor.py).
+
+Both take one row per student from a CSV or Parquet file, match column names
+case-insensitively, map label columns to the codes their model was trained on,
+and have the same command line: score a file batch by batch, or --benchmark on
+synthetic students.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FACULTY_GRADE_MAP = {'Excellent': 0, 'Very Good': 1, 'Good': 2, 'Pass': 3}
+
+
+def load_model(path):
+    import joblib
+    return joblib.load(path)
+
+
+def match_columns(df, required, optional=()):
+    """{name: column of `df`} for the `required` and any present `optional` names.
+
+    Names are matched case-insensitively (pypyodbc returns them in lower case).
+    Raises ValueError if a required column is missing.
+    """
+    columns = {str(c).strip().lower(): c for c in df.columns}
+    missing = [name for name in required if name not in columns]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return {name: columns[name] for name in [*required, *optional] if name in columns}
+
+
+def map_codes(col, mapping, name):
+    """(`col` mapped through `mapping`, problem or None). Numeric columns are taken as the codes already."""
+    if pd.api.types.is_numeric_dtype(col):
+        return col, None
+    mapped = col.map(mapping)
+    if mapped.isna().any(): # Only pay for string cleanup when something didn't match
+        mapped = col.astype("string").str.strip().map(mapping)
+        unknown = col[mapped.isna()].unique()
+        if len(unknown):
+            return mapped, f"{name}: unknown value(s) {', '.join(map(str, unknown[:5]))}"
+    return mapped, None
+
+
+def read_batches(source, batch_rows):
+    """Yield DataFrames of up to `batch_rows` rows from a CSV or Parquet path / uploaded file."""
+    name = str(getattr(source, "name", source)).lower()
+    if name.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_rows):
+            yield batch.to_pandas()
+    elif name.endswith(".csv"):
+        yield from pd.read_csv(source, chunksize=batch_rows)
+    else:
+        raise ValueError(f"Unsupported file type: {name} (expected .csv or .parquet)")
+
+
+def read_students(source):
+    """DataFrame from a CSV or Parquet path / uploaded file."""
+    name = str(getattr(source, "name", source)).lower()
+    if name.endswith(".parquet"):
+        return pd.read_parquet(source)
+    if name.endswith(".csv"):
+        return pd.read_csv(source)
+    raise ValueError(f"Unsupported file type: {name} (expected .csv or .parquet)")
+
+
+def synthetic_students(rows, columns, seed=0):
+    """`rows` students with a student_id and, per `columns` entry, values drawn from a list or made by fn(rng, rows)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"student_id": np.arange(rows)})
+    for name, values in columns.items():
+        df[name] = values(rng, rows) if callable(values) else rng.choice(values, rows)
+    return df
+
+
+def benchmark(title, sizes, steps, make_students, repeat=3):
+    """Print the best of `repeat` seconds for each of `steps` ({label: fn(df)}); rows/sec is for the last one."""
+    print(f"{title} (best of {repeat})")
+    print(f"  {'rows':>10}" + "".join(f"  {label:>10}" for label in steps) + f"  {'rows/sec':>12}")
+    for rows in sizes:
+        df = make_students(rows)
+        times = [min(_timed(lambda: step(df)) for _ in range(repeat)) for step in steps.values()]
+        print(f"  {rows:>10,}" + "".join(f"  {seconds:>10.3f}" for seconds in times) + f"  {rows / times[-1]:>12,.0f}")
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main(doc, model_path, score, run_benchmark, out_suffix, batch_rows):
+    """Command line shared by the predictors: score(model, df) each batch of a file into --out, or --benchmark."""
+    parser = argparse.ArgumentParser(description=doc.splitlines()[0])
+    parser.add_argument("source", nargs="?", help="CSV or Parquet file of students")
+    parser.add_argument("--out", help=f"Output .csv or .parquet (default: <source>{out_suffix}.csv)")
+    parser.add_argument("--model", default=model_path, help="Path to the model file")
+    parser.add_argument("--batch-rows", type=int, default=batch_rows, help="Rows per predict call")
+    parser.add_argument("--benchmark", action="store_true", help="Measure rows/sec on synthetic students")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 100000, 1000000], help="Benchmark sizes")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    if args.benchmark:
+        run_benchmark(model, args.rows)
+        return 0
+    if not args.source:
+        parser.error("a source file is required unless --benchmark is given")
+
+    out = Path(args.out or Path(args.source).with_name(Path(args.source).stem + f"{out_suffix}.csv"))
+    started, rows, writer = time.perf_counter(), 0, None
+    for i, batch in enumerate(read_batches(args.source, args.batch_rows)):
+        scored = score(model, batch)
+        if out.suffix == ".parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(scored, preserve_index=False)
+            writer = writer or pq.ParquetWriter(out, table.schema)
+            writer.write_table(table)
+        else:
+            scored.to_csv(out, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        rows += len(scored)
+    if writer is not None:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"Scored {rows:,} students in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec) -> {out}")
+    return 0
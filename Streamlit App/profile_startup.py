@@ -0,0 +1,128 @@
+"""Profile the cold start of a Streamlit page and fail if it is over budget.
+
+Each run starts a fresh interpreter with ``-X importtime`` and renders the page
+once with Streamlit's AppTest. Streamlit itself is already imported before the
+clock starts, as it is in a server worker. The report shows:
+
+- time to first render (median over the runs)
+- the slowest imports the page triggered, from the ``-X importtime`` output
+- which heavy libraries the page imported at startup
+
+The exit code is 1 if the page raises in any run (a page that crashes early
+renders fast) or the median first render is over ``--budget`` seconds, so the
+script can be used as a benchmark/CI gate.
+
+Usage:
+    python profile_startup.py                              # AI_Local.py, 3 runs
+    python profile_startup.py App.py --budget 2
+    python profile_startup.py --tab "⚙️ Employment Predictor" --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent
+DEFAULT_APP = APP_DIR / "AI_Local.py"
+DEFAULT_BUDGET = float(os.getenv("STARTUP_BUDGET_S", "3.0"))
+HEAVY_MODULES = ["google.generativeai", "catboost", "joblib", "plotly", "pypyodbc", "pbixray", "sklearn"]
+MARKER = "--- app start ---"
+
+
+def child(app, tab, timeout):
+    # Runs inside the profiled interpreter: everything imported after MARKER is the page's own cost
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(app), default_timeout=timeout)
+    if tab:
+        at.session_state["main_tab"] = tab
+    already_loaded = set(sys.modules)
+    sys.stderr.write(MARKER + "\n")
+    sys.stderr.flush()
+    started = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "first_render_s": elapsed,
+        "exception": [e.value for e in at.exception],
+        "heavy_loaded": [m for m in HEAVY_MODULES if m in sys.modules and m not in already_loaded],
+    }))
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative_us} for the top-level imports made after MARKER."""
+    lines = stderr.splitlines()
+    if MARKER in lines:
+        lines = lines[lines.index(MARKER) + 1:]
+    imports = {}
+    for line in lines:
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|", 2)
+        if name.startswith("  ") or not cumulative.strip().isdigit():
+            continue # Nested import; its cost is already in its parent's cumulative time
+        imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def run_once(app, tab, timeout):
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "profile-startup") # Render past the API key prompt; no call is made
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, str(app), "--child", "--timeout", str(timeout)]
+        + (["--tab", tab] if tab else []),
+        capture_output=True, text=True, cwd=Path(app).parent, env=env,
+    )
+    if proc.returncode != 0 or not proc.stdout.strip():
+        raise RuntimeError(f"Profiling run failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("app", nargs="?", default=DEFAULT_APP, help="Streamlit script to profile")
+    parser.add_argument("--runs", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Max median first render, in seconds")
+    parser.add_argument("--tab", default="", help="Tab label to open (default: the first tab)")
+    parser.add_argument("--top", type=int, default=15, help="Imports to list")
+    parser.add_argument("--timeout", type=float, default=120, help="AppTest timeout per run, in seconds")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.app, args.tab, args.timeout)
+        return 0
+
+    results = [run_once(args.app, args.tab, args.timeout) for _ in range(args.runs)]
+    renders = [r["first_render_s"] for r in results]
+    median = statistics.median(renders)
+    last = results[-1]
+    raised = [(i, r["exception"]) for i, r in enumerate(results, start=1) if r["exception"]]
+
+    print(f"Startup profile: {Path(args.app).name}" + (f" [{args.tab}]" if args.tab else ""))
+    print(f"  First render: median {median:.2f}s, min {min(renders):.2f}s, max {max(renders):.2f}s over {len(renders)} runs")
+    for run, exception in raised:
+        print(f"  Page raised in run {run}: {exception[0][:200]}")
+    print(f"  Heavy libraries imported at startup: {', '.join(last['heavy_loaded']) or 'none'}")
+    print("  Slowest imports (cumulative, last run):")
+    for name, us in sorted(last["imports"].items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"    {us / 1000:9.1f} ms  {name}")
+
+    if raised:
+        print(f"FAIL: the page raised in {len(raised)} of {len(results)} runs")
+        return 1
+    if median > args.budget:
+        print(f"FAIL: median first render {median:.2f}s is over the {args.budget:.2f}s budget")
+        return 1
+    print(f"OK: median first render {median:.2f}s is within the {args.budget:.2f}s budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())